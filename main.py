@@ -1,29 +1,194 @@
-import logging
+import argparse
 import os
+from collections import defaultdict
 from src.config import Config
-from src.resource_query import query_resources
-from src.balance_query import query_balance
 from src.notification import WeworkNotification
 from src.email_notification import EmailNotification
 from src.db import Database
 from src.logger import logger
 from dotenv import load_dotenv
 from src.yunzhijia_notification import YunzhijiaNotification
-from src.bill_query import query_bills
 from datetime import datetime
-from src.stored_card_query import query_stored_cards
-from src.certificate_query import query_certificates
+from src.collector import collect_accounts
+from src.rate_limiter import rate_limiter
+from src.checkpoint import BatchCheckpoint
+from src.db_writer import AsyncDBWriter
+from src.retention import ensure_partitions, apply_retention
+from src.backfill import parse_cycle_range, backfill_bills
+from src.notification_dispatcher import dispatch_notifications
+from src.http_session import webhook_sessions
+from src.notification_queue import notification_outbox
+from src.alert_state import alert_state
+from src.alert_view import build_report
+from src.utils import CERTIFICATE_SERVICE_TYPE
 
 # 加载环境变量
 load_dotenv()
 
-def main():
+def _result_data(results, query_name):
+    """取出查询成功的数据，失败或未执行时返回None"""
+    result = results.get(query_name)
+    return result["data"] if result and result["success"] else None
+
+def _build_account_data(account_name, results):
+    """将账号的采集结果整理为入库和通知使用的数据"""
+    resources = _result_data(results, "resources")
+    certificates = _result_data(results, "certificates")
+    
+    # 如果有证书数据，将其添加到resources中
+    if certificates:
+        resources = dict(resources) if resources else {}
+        resources[CERTIFICATE_SERVICE_TYPE] = certificates
+    
+    return {
+        "account_name": account_name,
+        "resources": resources,
+        "balance": _result_data(results, "balance"),
+        "bills": _result_data(results, "bills"),
+        "stored_cards": _result_data(results, "stored_cards")
+    }
+
+# 写入失败的表对应的查询，这些查询在检查点中记为失败，重跑时重新查询并写入
+TABLE_QUERIES = {
+    'resources': ('resources', 'certificates'),
+    'resources_current_prune': ('resources', 'certificates'),
+    'account_balances': ('balance',),
+    'account_bills': ('bills',),
+    'account_bills_pending': ('bills',),
+    'account_bills_commit': ('bills',),
+    'stored_cards': ('stored_cards',),
+    'stored_cards_current_prune': ('stored_cards',)
+}
+
+def _write_failed(result):
+    """Database 返回的写入结果是否整体写入失败（单条记录校验失败不算），AsyncDBWriter 异步写入时结果为None"""
+    return bool(result) and any(error["item"] is None for error in result["errors"])
+
+def _persist_account(store, account_name, results, batch_number, cycle, streaming_failed=()):
+    """保存账号的采集结果，store 为 Database 或 AsyncDBWriter，cycle 为批次的账单周期
+
+    streaming_failed 为采集过程中逐页写入失败的查询名（resources / bills）。
+    返回写入失败的表；AsyncDBWriter 的写入结果在 close 之后由 failed_writes 获取。
+    """
+    account_data = _build_account_data(account_name, results)
+    balance = account_data["balance"]
+    bills = account_data["bills"]
+    stored_cards = account_data["stored_cards"]
+    failed_tables = set()
+    
+    # 逐页写入的资源已在采集时入库，这里只写入SSL证书
+    resources_result = results.get("resources")
+    resources = account_data["resources"]
+    if resources_result and resources_result.get("streamed"):
+        certificates = _result_data(results, "certificates")
+        resources = {CERTIFICATE_SERVICE_TYPE: certificates} if certificates else None
+        if "resources" in streaming_failed:
+            failed_tables.add('resources')
+    
+    if resources:
+        resource_rows = []
+        for service_type, resource_list in resources.items():
+            for resource in resource_list:
+                if 'project' not in resource or not resource['project']:
+                    resource['project'] = 'default'
+                resource_rows.append(resource)
+        if _write_failed(store.save_resources_bulk(account_name, resource_rows, batch_number)):
+            failed_tables.add('resources')
+    
+    # 查询完整成功且写入成功时，清理当前状态表中已释放的资源；查询失败时保留原有数据
+    prune_results = []
+    if 'resources' not in failed_tables and _result_data(results, "resources") is not None:
+        prune_results.append(store.prune_resources_current(account_name, batch_number))
+    certificates_result = results.get("certificates")
+    if 'resources' not in failed_tables and certificates_result and certificates_result["success"] \
+            and not certificates_result.get("region_errors"):
+        prune_results.append(store.prune_resources_current(account_name, batch_number, certificates=True))
+    if any(_write_failed(result) for result in prune_results):
+        failed_tables.add('resources_current_prune')
+    
+    if balance and _write_failed(store.save_balance(account_name, balance, batch_number)):
+        failed_tables.add('account_balances')
+    
+    # 流式汇总模式下明细已在采集时暂存，查询成功后合并到账单表，失败时丢弃本次运行的暂存行
+    if bills and bills.get('aggregated') and "bills" in streaming_failed:
+        store.discard_staged_bills(account_name, batch_number)
+        failed_tables.add('account_bills_pending')
+    elif bills and bills.get('aggregated'):
+        if _write_failed(store.commit_staged_bills(account_name, bills['cycle'], batch_number)):
+            failed_tables.add('account_bills_commit')
+    elif bills:
+        if _write_failed(store.save_bills_bulk(account_name, bills['records'], cycle, batch_number)):
+            failed_tables.add('account_bills')
+    elif Config.BILL_STREAMING_AGGREGATION:
+        store.discard_staged_bills(account_name, batch_number)
+    
+    if stored_cards:
+        if _write_failed(store.save_stored_cards_bulk(account_name, stored_cards['cards'], batch_number)):
+            failed_tables.add('stored_cards')
+        elif _write_failed(store.prune_stored_cards_current(account_name, batch_number)):
+            failed_tables.add('stored_cards_current_prune')
+    return failed_tables
+
+def _record_outcomes(checkpoint, run_outcomes, account_name, results, failed_tables):
+    """记录账号各查询的状态，查询成功但写入失败的记为失败，重跑时重新查询"""
+    checkpoint.record_results(account_name, results)
+    outcomes = {name: BatchCheckpoint.query_status(result) for name, result in results.items()}
+    for table in failed_tables:
+        for query_name in TABLE_QUERIES.get(table, ()):
+            if outcomes.get(query_name) == "success":
+                logger.error(f"账号 {account_name} {query_name} 查询结果写入数据库失败，检查点记为失败")
+                checkpoint.record(account_name, query_name, "failed")
+                outcomes[query_name] = "failed"
+    run_outcomes[account_name] = outcomes
+
+def _make_resource_sink(store, batch_number, streaming_failed):
+    """资源逐页写入数据库，写入失败的账号记入 streaming_failed"""
+    def resource_sink(account_name, resources):
+        if _write_failed(store.save_resources_bulk(account_name, resources, batch_number)):
+            streaming_failed[account_name].add("resources")
+    return resource_sink
+
+def _make_bill_record_sink(store, batch_number, streaming_failed):
+    """账单明细逐页写入暂存表，写入失败的账号记入 streaming_failed"""
+    def bill_record_sink(account_name, records, cycle):
+        if _write_failed(store.stage_bills_bulk(account_name, records, cycle, batch_number)):
+            streaming_failed[account_name].add("bills")
+    return bill_record_sink
+
+def _make_account_complete(writer, batch_number, cycle):
+    """账号采集完成即将结果入队写库"""
+    def on_account_complete(account, results):
+        _persist_account(writer, account["name"], results, batch_number, cycle)
+    return on_account_complete
+
+def _load_accounts():
+    """读取所有华为云账号配置"""
+    accounts = []
+    index = 1
+    while True:
+        account_name = os.getenv(f'ACCOUNT{index}_NAME')
+        ak = os.getenv(f'ACCOUNT{index}_AK')
+        sk = os.getenv(f'ACCOUNT{index}_SK')
+        
+        if not account_name or not ak or not sk:
+            break
+        
+        accounts.append({"name": account_name, "ak": ak, "sk": sk})
+        index += 1
+    return accounts
+
+def main(resume_batch=None):
     # 检查是否启用数据库
     enable_database = os.getenv('ENABLE_DATABASE', 'false').lower() == 'true'
     
     if enable_database:
         db = Database()
         logger.info("数据库功能已启用")
+        try:
+            ensure_partitions(db)
+        except Exception as e:
+            # 分区维护失败时数据写入 p_future 分区，不影响采集
+            logger.error(f"历史表分区维护失败: {str(e)}")
     else:
         db = None
         logger.info("数据库功能未启用")
@@ -39,120 +204,154 @@ def main():
     logger.info(f"云之家通知状态: {'启用' if yunzhijia.enabled else '未启用'}")
     
     # 获取所有华为云账号配置
-    accounts = []
-    index = 1
-    while True:
-        account_name = os.getenv(f'ACCOUNT{index}_NAME')
-        ak = os.getenv(f'ACCOUNT{index}_AK')
-        sk = os.getenv(f'ACCOUNT{index}_SK')
-        
-        if not account_name or not ak or not sk:
-            break
-        
-        accounts.append({"name": account_name, "ak": ak, "sk": sk})
-        index += 1
-    
+    accounts = _load_accounts()
     logger.info(f"共发现 {len(accounts)} 个华为云账号配置")
     all_account_data = []
+    run_outcomes = {}
     
     # 在主函数中添加批次号生成
     batch_number = datetime.now().strftime('%Y%m%d%H%M%S')
     
-    for account in accounts:
-        account_name = account["name"]
-        ak = account["ak"]
-        sk = account["sk"]
+    if resume_batch:
+        # 重跑模式：只执行检查点中失败的查询，作为一次新的采集运行入库，结果记录到原批次的检查点
+        checkpoint = BatchCheckpoint.load(resume_batch)
+        if not checkpoint:
+            logger.error(f"未找到批次 {resume_batch} 的检查点文件")
+            return
+        queries_by_account = checkpoint.failed_pairs()
+        missing_accounts = set(queries_by_account) - {account["name"] for account in accounts}
+        if missing_accounts:
+            logger.warning(f"以下账号已不在配置中，无法重跑: {', '.join(sorted(missing_accounts))}")
+        accounts = [account for account in accounts if account["name"] in queries_by_account]
+        if not accounts:
+            logger.info(f"批次 {resume_batch} 没有需要重跑的查询")
+            return
+        logger.info(f"重跑批次 {resume_batch}: {len(accounts)} 个账号，"
+                    f"{sum(len(queries_by_account[account['name']]) for account in accounts)} 个失败的查询")
+    else:
+        checkpoint = BatchCheckpoint(batch_number, cycle=datetime.now().strftime('%Y-%m'))
+        queries_by_account = None
+    
+    # 重跑时沿用原批次的账单周期
+    cycle = checkpoint.cycle
+    
+    if db:
+        db.start_run(batch_number, resume_of=resume_batch)
+    
+    # 开启后台写入时，账号采集完成即入队写库，与其它账号的采集并行
+    writer = AsyncDBWriter(db) if db and Config.DB_ASYNC_WRITER else None
+    store = writer or db
+    
+    # 逐页写入失败的 {账号: {查询名}}
+    streaming_failed = defaultdict(set)
+    
+    # 资源逐页写入数据库，内存中只保留到期提醒范围内的资源
+    resource_sink = _make_resource_sink(store, batch_number, streaming_failed) if store else None
+    
+    # 账单流式汇总时，明细在采集过程中写入暂存表，账单查询成功后再合并到账单表
+    bill_record_sink = (_make_bill_record_sink(store, batch_number, streaming_failed)
+                        if store and Config.BILL_STREAMING_AGGREGATION else None)
+    
+    on_account_complete = _make_account_complete(writer, batch_number, cycle) if writer else None
+    
+    # 并发查询所有账号的资源、余额、账单、储值卡和证书信息
+    collected = collect_accounts(
+        accounts,
+        bill_record_sink=bill_record_sink,
+        resource_sink=resource_sink,
+        queries_by_account=queries_by_account,
+        on_account_complete=on_account_complete,
+        bill_cycle=cycle
+    )
+    
+    for item in collected:
+        account_name = item["account"]["name"]
+        results = item["results"]
         
         logger.info(f"开始处理账号: {account_name}")
+        account_data = _build_account_data(account_name, results)
         
-        # 查询资源、余额、账单、储值卡和证书信息
-        resource_result = query_resources(ak, sk, account_name)
-        balance_result = query_balance(ak, sk, account_name)
-        bill_result = query_bills(ak, sk, account_name)
-        stored_cards_result = query_stored_cards(ak, sk, account_name)
-        certificates_result = query_certificates(ak, sk, account_name)
-        
-        resources = resource_result["data"] if resource_result["success"] else None
-        balance = balance_result["data"] if balance_result["success"] else None
-        bills = bill_result["data"] if bill_result["success"] else None
-        stored_cards = stored_cards_result["data"] if stored_cards_result["success"] else None
-        certificates = certificates_result["data"] if certificates_result["success"] else None
-        
-        # 如果有证书数据，将其添加到resources中
-        if certificates:
-            if not resources:
-                resources = {}
-            resources['SSL证书'] = certificates
-        
-        # 保存到数据库
-        if db and resources:
-            for service_type, resource_list in resources.items():
-                for resource in resource_list:
-                    try:
-                        if 'project' not in resource or not resource['project']:
-                            resource['project'] = 'default'
-                        db.save_resource(account_name, resource, batch_number)
-                    except Exception as e:
-                        logger.error(f"保存资源失败: {account_name} - {resource.get('name', '')}")
+        # 保存到数据库，已在采集完成回调中入队的账号不再重复写入
+        failed_tables = set()
+        if writer:
+            if not item["completed_early"]:
+                _persist_account(writer, account_name, results, batch_number, cycle)
+        elif db:
+            # 同一账号的写入复用一个连接
+            with db.unit_of_work():
+                failed_tables = _persist_account(db, account_name, results, batch_number, cycle,
+                                                 streaming_failed[account_name])
         
-        if db and balance:
-            db.save_balance(account_name, balance, batch_number)
-        
-        if db and bills:
-            current_month = datetime.now().strftime('%Y-%m')
-            for record in bills['records']:
-                try:
-                    db.save_bill(account_name, record, current_month, batch_number)
-                except Exception as e:
-                    logger.error(f"保存账单失败: {account_name} - {record.get('service_type', '')}")
-        
-        if db and stored_cards:
-            for card in stored_cards['cards']:
-                try:
-                    db.save_stored_card(account_name, card, batch_number)
-                except Exception as e:
-                    logger.error(f"保存储值卡失败: {account_name} - {card.get('card_name', '')}")
+        _record_outcomes(checkpoint, run_outcomes, account_name, results, failed_tables)
+        if not writer:
+            # 数据入库后再记录检查点
+            checkpoint.save()
         
         # 收集账号数据
-        all_account_data.append({
-            "account_name": account_name,
-            "resources": resources,
-            "balance": balance,
-            "bills": bills,
-            "stored_cards": stored_cards
-        })
-    
-    # 发送通知
+        all_account_data.append(account_data)
+    
+    if writer:
+        # 等待后台写入完成后再记录检查点
+        writer.close()
+        results_by_account = {item["account"]["name"]: item["results"] for item in collected}
+        for account_name, failed_tables in writer.failed_writes().items():
+            if account_name in results_by_account:
+                _record_outcomes(checkpoint, run_outcomes, account_name, results_by_account[account_name], failed_tables)
+        checkpoint.save()
+    
+    if db:
+        run_failed = any(status != "success" for queries in run_outcomes.values() for status in queries.values())
+        db.finish_run(batch_number, "partial" if run_failed else "completed", run_outcomes)
+    
+    rate_limiter.log_stats()
+    
+    failed_pairs = checkpoint.failed_pairs()
+    if failed_pairs:
+        logger.warning(f"批次 {checkpoint.batch_number} 有 {sum(len(queries) for queries in failed_pairs.values())} 个查询未成功，"
+                       f"可执行 python main.py --resume {checkpoint.batch_number} 重跑")
+    
+    if resume_batch:
+        logger.info("重跑模式不发送通知")
+        return
+    
+    # 各渠道共用同一份报告：到期资源筛选排序、账单按项目分组只计算一次
+    report = build_report(all_account_data)
+    
+    # 机器人只提醒进入新档位或到期时间变化的资源，邮件仍发送完整报告
+    bot_report = report
+    if Config.ALERT_SUPPRESSION and (wework.enabled or yunzhijia.enabled):
+        bot_report = alert_state.filter_report(report)
+    
+    # 发送通知：各渠道、各机器人、各账号的消息并发发送
+    notification_tasks = []
     if wework.enabled:
         logger.info("开始发送企业微信通知...")
-        wework.send_balance_notification(all_account_data)
-        wework.send_bill_notification(all_account_data)
-        for account_data in all_account_data:
-            if account_data.get('resources'):
-                wework.send_resource_notification(
-                    account_data['account_name'],
-                    account_data['resources']
-                )
+        notification_tasks.extend(wework.notification_tasks(bot_report))
     
     if email.enabled:
         logger.info("开始发送邮件通知...")
-        email_content = email.format_all_accounts_message(all_account_data)
+        email_content = email.format_all_accounts_message(report)
         if email_content:
-            if email.send_email(None, email_content):
-                logger.info("邮件通知发送成功")
-            else:
-                logger.error("邮件通知发送失败")
+            notification_tasks.append(("邮件通知", lambda: email.send_email(None, email_content)))
     
     if yunzhijia.enabled:
         logger.info("开始发送云之家通知...")
-        yunzhijia.send_balance_notification(all_account_data)
-        yunzhijia.send_bill_notification(all_account_data)
-        for account_data in all_account_data:
-            if account_data.get('resources'):
-                yunzhijia.send_resource_notification(
-                    account_data['account_name'],
-                    account_data['resources']
-                )
+        notification_tasks.extend(yunzhijia.notification_tasks(bot_report))
+    
+    # 上次运行发送失败落盘的消息随本次通知一起重新投递
+    notification_bots = {
+        (notification.channel, bot.name): bot
+        for notification in (wework, yunzhijia) if notification.enabled
+        for bot in notification.bots.values()
+    }
+    try:
+        notification_outbox.redeliver_spooled(notification_bots)
+        dispatch_notifications(notification_tasks)
+    finally:
+        notification_outbox.close()
+        webhook_sessions.close()
+    # 发送失败的消息已落盘待重发，告警状态照常保存
+    alert_state.save()
 
 def process_resources(client, account_name):
     """处理单个账号的资源信息"""
@@ -178,5 +377,53 @@ def process_resources(client, account_name):
         logger.error(f"处理账号 {account_name} 资源时出错: {str(e)}")
         return None
 
+def run_retention():
+    """汇总并删除过期的历史分区"""
+    if os.getenv('ENABLE_DATABASE', 'false').lower() != 'true':
+        logger.error("数据保留任务需要启用数据库")
+        return
+    db = Database()
+    try:
+        ensure_partitions(db)
+        apply_retention(db)
+    finally:
+        db.close()
+
+def run_backfill(cycle_range, account_names=None):
+    """回填指定账单周期范围内的历史账单"""
+    if os.getenv('ENABLE_DATABASE', 'false').lower() != 'true':
+        logger.error("账单回填需要启用数据库")
+        return
+    cycles = parse_cycle_range(cycle_range)
+    accounts = _load_accounts()
+    if account_names:
+        missing_accounts = set(account_names) - {account["name"] for account in accounts}
+        if missing_accounts:
+            logger.warning(f"以下账号不在配置中: {', '.join(sorted(missing_accounts))}")
+        accounts = [account for account in accounts if account["name"] in account_names]
+    if not accounts:
+        logger.error("没有需要回填的账号")
+        return
+
+    db = Database()
+    try:
+        ensure_partitions(db)
+        backfill_bills(db, accounts, cycles)
+        rate_limiter.log_stats()
+    finally:
+        db.close()
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="华为云资源监控")
+    parser.add_argument('--resume', metavar='BATCH_NUMBER', help="只重跑指定批次中失败的查询")
+    parser.add_argument('--retention', action='store_true', help="汇总并删除过期的历史分区后退出")
+    parser.add_argument('--backfill', metavar='START:END', help="回填账单周期范围内的历史账单，如 2024-01:2024-12")
+    parser.add_argument('--accounts', help="回填的账号名称（逗号分隔），默认全部账号")
+    args = parser.parse_args()
+    if args.retention:
+        run_retention()
+    elif args.backfill:
+        account_names = [name.strip() for name in args.accounts.split(',') if name.strip()] if args.accounts else None
+        run_backfill(args.backfill, account_names)
+    else:
+        main(resume_batch=args.resume) 
\ No newline at end of file
@@ -1,12 +1,16 @@
 CREATE TABLE IF NOT EXISTS account_balances (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     account_name VARCHAR(100) NOT NULL,
     total_amount DECIMAL(10,2) NOT NULL,
     currency VARCHAR(10) NOT NULL,
-    batch_number VARCHAR(20) NOT NULL,  -- 数据批次号，格式：YYYYMMDDHHmmss
+    run_id INT NOT NULL,  -- 采集运行ID，对应 collection_runs.id
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_account_name (account_name),
-    INDEX idx_batch_number (batch_number),
-    INDEX idx_created_at (created_at)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci; 
\ No newline at end of file
+    INDEX idx_account_run (account_name, run_id),
+    INDEX idx_created_at (created_at),
+    INDEX idx_run_id (run_id),
+    PRIMARY KEY (id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE  -- 按月分区由 src/retention.py 自动拆分
+);
@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS account_bill_changes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    cycle VARCHAR(7) NOT NULL,  -- 账单周期，格式：YYYY-MM
+    line_key CHAR(40) NOT NULL,  -- 对应 account_bills.line_key
+    project_name VARCHAR(100) NOT NULL,
+    service_type VARCHAR(100) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    resource_name VARCHAR(255) NOT NULL DEFAULT '',
+    old_amount DECIMAL(10,2) NULL,  -- 变化前金额，新增账单行为NULL
+    new_amount DECIMAL(10,2) NOT NULL,
+    run_id INT NOT NULL,  -- 产生变化的采集运行ID，对应 collection_runs.id
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_run_line (run_id, account_name, cycle, line_key),
+    INDEX idx_account_cycle (account_name, cycle),
+    INDEX idx_created_at (created_at),
+    CONSTRAINT fk_account_bill_changes_run FOREIGN KEY (run_id) REFERENCES collection_runs (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
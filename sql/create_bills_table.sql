@@ -1,18 +1,26 @@
 CREATE TABLE IF NOT EXISTS account_bills (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     account_name VARCHAR(100) NOT NULL,
     project_name VARCHAR(100) NOT NULL,
     service_type VARCHAR(100) NOT NULL,
     region VARCHAR(50) NOT NULL,
+    resource_id VARCHAR(100) NOT NULL DEFAULT '',
+    resource_name VARCHAR(255) NOT NULL DEFAULT '',
+    line_key CHAR(40) NOT NULL,  -- 账单行标识，项目、服务类型、区域和资源的SHA1
     amount DECIMAL(10,2) NOT NULL,
     currency VARCHAR(10) NOT NULL,
     cycle VARCHAR(7) NOT NULL,  -- 账单周期，格式：YYYY-MM
-    batch_number VARCHAR(20) NOT NULL,  -- 数据批次号，格式：YYYYMMDDHHmmss
+    run_id INT NOT NULL,  -- 最近一次更新该行的采集运行ID，对应 collection_runs.id
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_account_name (account_name),
+    UNIQUE KEY uk_account_cycle_line (account_name, cycle, line_key),
     INDEX idx_project_name (project_name),
     INDEX idx_cycle (cycle),
-    INDEX idx_batch_number (batch_number),
-    INDEX idx_created_at (created_at)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci; 
\ No newline at end of file
+    INDEX idx_account_run (account_name, run_id),
+    INDEX idx_created_at (created_at),
+    INDEX idx_run_id (run_id),
+    PRIMARY KEY (id, cycle)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE COLUMNS (cycle) (
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)  -- 按账单周期分区由 src/retention.py 自动拆分
+);
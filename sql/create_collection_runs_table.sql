@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS collection_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    batch_number VARCHAR(20) NOT NULL,  -- 批次号，格式：YYYYMMDDHHmmss，对应检查点文件
+    resume_of VARCHAR(20) NULL,  -- 重跑时为原批次号
+    status VARCHAR(20) NOT NULL DEFAULT 'running',  -- running / completed / partial
+    account_outcomes JSON NULL,  -- 各账号各查询的执行状态
+    started_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uk_batch_number (batch_number),
+    INDEX idx_started_at (started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
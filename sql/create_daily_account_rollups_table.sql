@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS daily_account_rollups (
+    account_name VARCHAR(100) NOT NULL,
+    day DATE NOT NULL,
+    run_count INT NULL,  -- 当天的采集次数
+    balance_min DECIMAL(10,2) NULL,
+    balance_max DECIMAL(10,2) NULL,
+    balance_avg DECIMAL(10,2) NULL,
+    resource_changes INT NULL,  -- 当天写入资源历史的资源数
+    min_remaining_days INT NULL,
+    stored_card_changes INT NULL,  -- 当天写入储值卡历史的储值卡数
+    stored_card_balance_min DECIMAL(10,2) NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (account_name, day),
+    INDEX idx_day (day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
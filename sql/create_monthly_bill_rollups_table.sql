@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS monthly_bill_rollups (
+    account_name VARCHAR(100) NOT NULL,
+    cycle VARCHAR(7) NOT NULL,  -- 账单周期，格式：YYYY-MM
+    project_name VARCHAR(100) NOT NULL,
+    service_type VARCHAR(100) NOT NULL,
+    amount DECIMAL(14,2) NOT NULL,
+    line_count INT NOT NULL,  -- 汇总的账单行数
+    currency VARCHAR(10) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (account_name, cycle, project_name, service_type),
+    INDEX idx_cycle (cycle)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
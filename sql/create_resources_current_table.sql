@@ -0,0 +1,19 @@
+CREATE TABLE IF NOT EXISTS resources_current (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    resource_name VARCHAR(255) NOT NULL,
+    resource_id VARCHAR(100) NOT NULL,
+    service_type VARCHAR(50) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    expire_time DATETIME NOT NULL,
+    project_name VARCHAR(100),
+    remaining_days INT NOT NULL,
+    remaining_days_bucket INT NULL,  -- 剩余天数所在档位，超出所有档位时为NULL
+    run_id INT NOT NULL,  -- 最近一次采集到该资源的运行ID，对应 collection_runs.id
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_account_resource (account_name, resource_id),
+    INDEX idx_expire_time (expire_time),
+    INDEX idx_account_run (account_name, run_id),
+    CONSTRAINT fk_resources_current_run FOREIGN KEY (run_id) REFERENCES collection_runs (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS schema_version (
+    id TINYINT PRIMARY KEY,
+    version INT NOT NULL,  -- 当前表结构版本，对应 src/db_backends.py 中的 SCHEMA_VERSION
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS stored_cards_current (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    card_id VARCHAR(100) NOT NULL,
+    card_name VARCHAR(255) NOT NULL,
+    face_value DECIMAL(10,2) NOT NULL,
+    balance DECIMAL(10,2) NOT NULL,
+    effective_time DATETIME NOT NULL,
+    expire_time DATETIME NOT NULL,
+    run_id INT NOT NULL,  -- 最近一次采集到该储值卡的运行ID，对应 collection_runs.id
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_account_card (account_name, card_id),
+    INDEX idx_expire_time (expire_time),
+    INDEX idx_account_run (account_name, run_id),
+    CONSTRAINT fk_stored_cards_current_run FOREIGN KEY (run_id) REFERENCES collection_runs (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,36 @@
+-- 版本2新增资源和储值卡当前状态表
+CREATE TABLE IF NOT EXISTS resources_current (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    resource_name VARCHAR(255) NOT NULL,
+    resource_id VARCHAR(100) NOT NULL,
+    service_type VARCHAR(50) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    expire_time DATETIME NOT NULL,
+    project_name VARCHAR(100),
+    remaining_days INT NOT NULL,
+    remaining_days_bucket INT NULL,  -- 剩余天数所在档位，超出所有档位时为NULL
+    batch_number VARCHAR(20) NOT NULL,  -- 最近一次采集到该资源的批次号
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_account_resource (account_name, resource_id),
+    INDEX idx_expire_time (expire_time),
+    INDEX idx_batch_number (batch_number)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS stored_cards_current (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    card_id VARCHAR(100) NOT NULL,
+    card_name VARCHAR(255) NOT NULL,
+    face_value DECIMAL(10,2) NOT NULL,
+    balance DECIMAL(10,2) NOT NULL,
+    effective_time DATETIME NOT NULL,
+    expire_time DATETIME NOT NULL,
+    batch_number VARCHAR(20) NOT NULL,  -- 最近一次采集到该储值卡的批次号
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_account_card (account_name, card_id),
+    INDEX idx_expire_time (expire_time),
+    INDEX idx_batch_number (batch_number)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
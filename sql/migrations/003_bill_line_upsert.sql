@@ -0,0 +1,56 @@
+-- 账单表改为按账单行更新：旧表保留为 account_bills_legacy，确认无误后可手动删除
+RENAME TABLE account_bills TO account_bills_legacy;
+
+CREATE TABLE account_bills (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    project_name VARCHAR(100) NOT NULL,
+    service_type VARCHAR(100) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    resource_id VARCHAR(100) NOT NULL DEFAULT '',
+    resource_name VARCHAR(255) NOT NULL DEFAULT '',
+    line_key CHAR(40) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    cycle VARCHAR(7) NOT NULL,
+    batch_number VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_account_cycle_line (account_name, cycle, line_key),
+    INDEX idx_project_name (project_name),
+    INDEX idx_cycle (cycle),
+    INDEX idx_batch_number (batch_number),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 旧数据没有资源信息，每个账号每个周期只保留最新批次，按项目、服务类型和区域汇总
+INSERT INTO account_bills
+    (account_name, project_name, service_type, region, resource_id, resource_name, line_key, amount, currency, cycle, batch_number)
+SELECT b.account_name, b.project_name, b.service_type, b.region, '', '',
+    SHA1(CONCAT_WS('|', b.project_name, b.service_type, b.region, '')),
+    SUM(b.amount), MAX(b.currency), b.cycle, b.batch_number
+FROM account_bills_legacy b
+JOIN (
+    SELECT account_name, cycle, MAX(batch_number) AS batch_number
+    FROM account_bills_legacy
+    GROUP BY account_name, cycle
+) latest ON latest.account_name = b.account_name AND latest.cycle = b.cycle AND latest.batch_number = b.batch_number
+GROUP BY b.account_name, b.cycle, b.batch_number, b.project_name, b.service_type, b.region;
+
+CREATE TABLE IF NOT EXISTS account_bill_changes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    cycle VARCHAR(7) NOT NULL,  -- 账单周期，格式：YYYY-MM
+    line_key CHAR(40) NOT NULL,  -- 对应 account_bills.line_key
+    project_name VARCHAR(100) NOT NULL,
+    service_type VARCHAR(100) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    resource_name VARCHAR(255) NOT NULL DEFAULT '',
+    old_amount DECIMAL(10,2) NULL,  -- 变化前金额，新增账单行为NULL
+    new_amount DECIMAL(10,2) NOT NULL,
+    batch_number VARCHAR(20) NOT NULL,  -- 产生变化的批次号
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_batch_line (batch_number, account_name, cycle, line_key),
+    INDEX idx_account_cycle (account_name, cycle),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,97 @@
+-- 批次号改为引用 collection_runs 的整数ID：先按已有批次号生成采集运行记录，再回填各表的 run_id
+CREATE TABLE IF NOT EXISTS collection_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    batch_number VARCHAR(20) NOT NULL,  -- 批次号，格式：YYYYMMDDHHmmss，对应检查点文件
+    resume_of VARCHAR(20) NULL,  -- 重跑时为原批次号
+    status VARCHAR(20) NOT NULL DEFAULT 'running',  -- running / completed / partial
+    account_outcomes JSON NULL,  -- 各账号各查询的执行状态
+    started_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uk_batch_number (batch_number),
+    INDEX idx_started_at (started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO collection_runs (batch_number, status, started_at, finished_at)
+SELECT batch_number, 'completed', STR_TO_DATE(batch_number, '%Y%m%d%H%i%s'), MAX(created_at)
+FROM (
+    SELECT batch_number, created_at FROM resources
+    UNION ALL
+    SELECT batch_number, created_at FROM account_balances
+    UNION ALL
+    SELECT batch_number, created_at FROM account_bills
+    UNION ALL
+    SELECT batch_number, created_at FROM stored_cards
+    UNION ALL
+    SELECT batch_number, created_at FROM resources_current
+    UNION ALL
+    SELECT batch_number, created_at FROM stored_cards_current
+    UNION ALL
+    SELECT batch_number, created_at FROM account_bill_changes
+) batches
+GROUP BY batch_number;
+
+ALTER TABLE resources ADD COLUMN run_id INT NULL AFTER remaining_days;
+UPDATE resources t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE resources
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP INDEX idx_account_name,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_resources_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE account_balances ADD COLUMN run_id INT NULL AFTER currency;
+UPDATE account_balances t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE account_balances
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP INDEX idx_account_name,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_account_balances_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE account_bills ADD COLUMN run_id INT NULL AFTER cycle;
+UPDATE account_bills t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE account_bills
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_account_bills_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE stored_cards ADD COLUMN run_id INT NULL AFTER expire_time;
+UPDATE stored_cards t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE stored_cards
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP INDEX idx_account_name,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_stored_cards_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE resources_current ADD COLUMN run_id INT NULL AFTER remaining_days_bucket;
+UPDATE resources_current t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE resources_current
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_resources_current_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE stored_cards_current ADD COLUMN run_id INT NULL AFTER expire_time;
+UPDATE stored_cards_current t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE stored_cards_current
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX idx_batch_number,
+    DROP COLUMN batch_number,
+    ADD INDEX idx_account_run (account_name, run_id),
+    ADD CONSTRAINT fk_stored_cards_current_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
+
+ALTER TABLE account_bill_changes ADD COLUMN run_id INT NULL AFTER new_amount;
+UPDATE account_bill_changes t JOIN collection_runs r ON r.batch_number = t.batch_number SET t.run_id = r.id;
+ALTER TABLE account_bill_changes
+    MODIFY run_id INT NOT NULL,
+    DROP INDEX uk_batch_line,
+    DROP COLUMN batch_number,
+    ADD UNIQUE KEY uk_run_line (run_id, account_name, cycle, line_key),
+    ADD CONSTRAINT fk_account_bill_changes_run FOREIGN KEY (run_id) REFERENCES collection_runs (id);
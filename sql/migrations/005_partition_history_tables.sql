@@ -0,0 +1,32 @@
+-- 历史表按月分区：分区表不支持外键，且主键需包含分区列。初始只有 p_future 一个分区，由 src/retention.py 按月拆分
+ALTER TABLE resources DROP FOREIGN KEY fk_resources_run;
+ALTER TABLE resources
+    RENAME INDEX fk_resources_run TO idx_run_id,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at);
+ALTER TABLE resources
+    PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (PARTITION p_future VALUES LESS THAN MAXVALUE);
+
+ALTER TABLE account_balances DROP FOREIGN KEY fk_account_balances_run;
+ALTER TABLE account_balances
+    RENAME INDEX fk_account_balances_run TO idx_run_id,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at);
+ALTER TABLE account_balances
+    PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (PARTITION p_future VALUES LESS THAN MAXVALUE);
+
+ALTER TABLE stored_cards DROP FOREIGN KEY fk_stored_cards_run;
+ALTER TABLE stored_cards
+    RENAME INDEX fk_stored_cards_run TO idx_run_id,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at);
+ALTER TABLE stored_cards
+    PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (PARTITION p_future VALUES LESS THAN MAXVALUE);
+
+ALTER TABLE account_bills DROP FOREIGN KEY fk_account_bills_run;
+ALTER TABLE account_bills
+    RENAME INDEX fk_account_bills_run TO idx_run_id,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, cycle);
+ALTER TABLE account_bills
+    PARTITION BY RANGE COLUMNS (cycle) (PARTITION p_future VALUES LESS THAN (MAXVALUE));
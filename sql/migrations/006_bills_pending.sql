@@ -0,0 +1,18 @@
+-- 版本6新增流式账单暂存表：分页明细先写入暂存表，账单查询全部成功后再合并到账单表
+CREATE TABLE IF NOT EXISTS account_bills_pending (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    account_name VARCHAR(100) NOT NULL,
+    project_name VARCHAR(100) NOT NULL,
+    service_type VARCHAR(100) NOT NULL,
+    region VARCHAR(50) NOT NULL,
+    resource_id VARCHAR(100) NOT NULL DEFAULT '',
+    resource_name VARCHAR(255) NOT NULL DEFAULT '',
+    line_key CHAR(40) NOT NULL,  -- 对应 account_bills.line_key
+    amount DECIMAL(10,2) NOT NULL,  -- 本次运行已获取分页的累计金额
+    currency VARCHAR(10) NOT NULL,
+    cycle VARCHAR(7) NOT NULL,  -- 账单周期，格式：YYYY-MM
+    run_id INT NOT NULL,  -- 写入该行的采集运行ID，对应 collection_runs.id
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_run_line (run_id, account_name, cycle, line_key),
+    INDEX idx_account_run (account_name, run_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,168 @@
+-- SQLite 表结构，与 sql/create_*_table.sql 对应（不含分区和汇总表），表结构版本记录在 PRAGMA user_version
+CREATE TABLE IF NOT EXISTS collection_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_number TEXT NOT NULL UNIQUE,  -- 批次号，格式：YYYYMMDDHHmmss，对应检查点文件
+    resume_of TEXT NULL,  -- 重跑时为原批次号
+    status TEXT NOT NULL DEFAULT 'running',  -- running / completed / partial
+    account_outcomes TEXT NULL,  -- 各账号各查询的执行状态（JSON）
+    started_at TEXT NOT NULL,
+    finished_at TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_collection_runs_started_at ON collection_runs (started_at);
+
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    resource_name TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    expire_time TEXT NOT NULL,
+    project_name TEXT,
+    remaining_days INTEGER NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_resources_resource_id ON resources (resource_id);
+CREATE INDEX IF NOT EXISTS idx_resources_account_run ON resources (account_name, run_id);
+CREATE INDEX IF NOT EXISTS idx_resources_created_at ON resources (created_at);
+
+CREATE TABLE IF NOT EXISTS account_balances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_account_balances_account_run ON account_balances (account_name, run_id);
+CREATE INDEX IF NOT EXISTS idx_account_balances_created_at ON account_balances (created_at);
+
+CREATE TABLE IF NOT EXISTS account_bills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_id TEXT NOT NULL DEFAULT '',
+    resource_name TEXT NOT NULL DEFAULT '',
+    line_key TEXT NOT NULL,  -- 账单行标识，项目、服务类型、区域和资源的SHA1
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL,
+    cycle TEXT NOT NULL,  -- 账单周期，格式：YYYY-MM
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (account_name, cycle, line_key)
+);
+CREATE INDEX IF NOT EXISTS idx_account_bills_project_name ON account_bills (project_name);
+CREATE INDEX IF NOT EXISTS idx_account_bills_cycle ON account_bills (cycle);
+CREATE INDEX IF NOT EXISTS idx_account_bills_account_run ON account_bills (account_name, run_id);
+CREATE INDEX IF NOT EXISTS idx_account_bills_created_at ON account_bills (created_at);
+
+CREATE TABLE IF NOT EXISTS account_bill_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    cycle TEXT NOT NULL,
+    line_key TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_name TEXT NOT NULL DEFAULT '',
+    old_amount REAL NULL,  -- 变化前金额，新增账单行为NULL
+    new_amount REAL NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (run_id, account_name, cycle, line_key)
+);
+CREATE INDEX IF NOT EXISTS idx_account_bill_changes_account_cycle ON account_bill_changes (account_name, cycle);
+CREATE INDEX IF NOT EXISTS idx_account_bill_changes_created_at ON account_bill_changes (created_at);
+
+CREATE TABLE IF NOT EXISTS account_bills_pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_id TEXT NOT NULL DEFAULT '',
+    resource_name TEXT NOT NULL DEFAULT '',
+    line_key TEXT NOT NULL,
+    amount REAL NOT NULL,  -- 本次运行已获取分页的累计金额
+    currency TEXT NOT NULL,
+    cycle TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (run_id, account_name, cycle, line_key)
+);
+CREATE INDEX IF NOT EXISTS idx_account_bills_pending_account_run ON account_bills_pending (account_name, run_id);
+
+CREATE TABLE IF NOT EXISTS stored_cards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    card_name TEXT NOT NULL,
+    face_value REAL NOT NULL,
+    balance REAL NOT NULL,
+    effective_time TEXT NOT NULL,
+    expire_time TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_stored_cards_card_id ON stored_cards (card_id);
+CREATE INDEX IF NOT EXISTS idx_stored_cards_account_run ON stored_cards (account_name, run_id);
+CREATE INDEX IF NOT EXISTS idx_stored_cards_created_at ON stored_cards (created_at);
+
+CREATE TABLE IF NOT EXISTS resources_current (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    resource_name TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    expire_time TEXT NOT NULL,
+    project_name TEXT,
+    remaining_days INTEGER NOT NULL,
+    remaining_days_bucket INTEGER NULL,  -- 剩余天数所在档位，超出所有档位时为NULL
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (account_name, resource_id)
+);
+CREATE INDEX IF NOT EXISTS idx_resources_current_expire_time ON resources_current (expire_time);
+CREATE INDEX IF NOT EXISTS idx_resources_current_account_run ON resources_current (account_name, run_id);
+
+CREATE TABLE IF NOT EXISTS stored_cards_current (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_name TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    card_name TEXT NOT NULL,
+    face_value REAL NOT NULL,
+    balance REAL NOT NULL,
+    effective_time TEXT NOT NULL,
+    expire_time TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES collection_runs (id),
+    created_at TEXT DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (account_name, card_id)
+);
+CREATE INDEX IF NOT EXISTS idx_stored_cards_current_expire_time ON stored_cards_current (expire_time);
+CREATE INDEX IF NOT EXISTS idx_stored_cards_current_account_run ON stored_cards_current (account_name, run_id);
+
+-- SQLite 没有 ON UPDATE CURRENT_TIMESTAMP，原地更新的表用触发器维护 updated_at
+CREATE TRIGGER IF NOT EXISTS trg_account_bills_updated_at AFTER UPDATE ON account_bills
+BEGIN
+    UPDATE account_bills SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resources_current_updated_at AFTER UPDATE ON resources_current
+BEGIN
+    UPDATE resources_current SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stored_cards_current_updated_at AFTER UPDATE ON stored_cards_current
+BEGIN
+    UPDATE stored_cards_current SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
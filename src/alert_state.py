@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from src.config import Config
+from src.logger import logger
+from src.utils import remaining_days_bucket
+from src.alert_view import with_services
+
+class AlertStateStore:
+    """记录每个资源上次提醒时所在的剩余天数档位和到期时间，只在状态变化时再次提醒
+
+    资源跨入新的档位（如 65 → 30 → 15 → 7 → 1 天）或到期时间变化时提醒，
+    其余情况不重复发送。开启定期汇总时，每隔 digest_days 天发送一次全部待提醒资源。
+    """
+
+    def __init__(self, path=None, digest_days=None):
+        self.path = path or os.path.join(Config.CACHE_DIR, 'alert_state.json')
+        self.digest_days = Config.ALERT_DIGEST_DAYS if digest_days is None else digest_days
+        self._lock = threading.Lock()
+        self._state = None
+
+    @staticmethod
+    def _key(account_name, resource_id):
+        return f"{account_name}|{resource_id}"
+
+    def _load_locked(self):
+        if self._state is not None:
+            return
+        self._state = {"resources": {}, "digest_at": 0}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self._state.update(json.load(file))
+        except Exception as e:
+            logger.warning(f"读取告警状态失败，将重新提醒全部资源: {str(e)}")
+
+    def _digest_due_locked(self):
+        return self.digest_days > 0 and time.time() - self._state["digest_at"] >= self.digest_days * 86400
+
+    def _changed_locked(self, account_name, resource):
+        """判断资源是否需要提醒，并更新其告警状态"""
+        key = self._key(account_name, resource['id'])
+        bucket = remaining_days_bucket(resource['remaining_days'])
+        previous = self._state["resources"].get(key)
+        self._state["resources"][key] = {
+            "bucket": bucket,
+            "expire_time": resource['expire_time'],
+            "updated_at": time.time()
+        }
+        if previous is None or previous["expire_time"] != resource['expire_time']:
+            return True
+        # 剩余天数进入更小的档位时提醒
+        return bucket is not None and (previous["bucket"] is None or bucket < previous["bucket"])
+
+    def filter_report(self, report):
+        """返回只包含需要提醒资源的报告副本（见 alert_view.build_report），不修改原报告
+
+        只处理资源查询成功的账号，这些账号中已不存在或不再需要提醒的资源从状态中移除。
+        需要发送全量汇总时返回原报告。
+        """
+        with self._lock:
+            self._load_locked()
+            digest = self._digest_due_locked()
+            if digest:
+                self._state["digest_at"] = time.time()
+
+            services_by_account = {}
+            alerted = 0
+            for account in report['accounts']:
+                if not account['resources_collected']:
+                    continue
+
+                account_name = account['account_name']
+                prefix = self._key(account_name, '')
+                seen = set()
+                changed_services = []
+                for service_type, resources in account['services']:
+                    changed = []
+                    for resource in resources:
+                        seen.add(self._key(account_name, resource['id']))
+                        if self._changed_locked(account_name, resource) or digest:
+                            changed.append(resource)
+                    if changed:
+                        changed_services.append((service_type, changed))
+                        alerted += len(changed)
+
+                for key in [key for key in self._state["resources"] if key.startswith(prefix) and key not in seen]:
+                    del self._state["resources"][key]
+                services_by_account[account_name] = changed_services
+
+        if digest:
+            logger.info(f"发送资源到期全量汇总: {alerted} 个资源")
+            return report
+        logger.info(f"资源到期提醒: {alerted} 个资源进入新的档位或到期时间变化，其余未变化的资源不重复提醒")
+        return with_services(report, services_by_account)
+
+    def save(self):
+        """写入告警状态文件，通知发送后调用"""
+        with self._lock:
+            if self._state is None:
+                return
+            try:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as file:
+                    json.dump(self._state, file, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                logger.error(f"保存告警状态失败: {str(e)}")
+
+# 全局共享的告警状态
+alert_state = AlertStateStore()
@@ -0,0 +1,92 @@
+from datetime import datetime
+from src.config import Config
+
+# 剩余天数告警等级的上限天数，超过 medium 的为 low
+ALERT_LEVELS = (('high', 15), ('medium', 30))
+
+def format_time(value):
+    """接口返回的 ISO 时间（2024-01-01T00:00:00Z）转为展示格式"""
+    return value.replace('T', ' ').replace('Z', '') if value else value
+
+def alert_level(remaining_days):
+    """剩余天数对应的告警等级: high / medium / low"""
+    for level, days in ALERT_LEVELS:
+        if remaining_days <= days:
+            return level
+    return 'low'
+
+def _resource_view(resource):
+    return {
+        "id": resource['id'],
+        "name": resource['name'],
+        "region": resource['region'],
+        "project": resource['project'],
+        "expire_time": resource['expire_time'],
+        "expire_display": format_time(resource['expire_time']),
+        "remaining_days": resource['remaining_days'],
+        "level": alert_level(resource['remaining_days'])
+    }
+
+def _expiring_services(services, alert_days):
+    """筛选 alert_days 天内到期的资源，按剩余天数升序，返回 [(服务类型, [资源])]"""
+    expiring = []
+    for service_type, resources in (services or {}).items():
+        views = sorted(
+            (_resource_view(resource) for resource in resources if resource['remaining_days'] <= alert_days),
+            key=lambda view: view['remaining_days']
+        )
+        if views:
+            expiring.append((service_type, views))
+    return expiring
+
+def _bill_view(bills):
+    """按项目分组的账单，返回 None 表示没有账单明细"""
+    if not bills or not bills.get('records'):
+        return None
+    projects = {}
+    for record in bills['records']:
+        projects.setdefault(record['project_name'] or 'default', []).append(record)
+    return {
+        "total_amount": bills['total_amount'],
+        "currency": bills['currency'],
+        "projects": list(projects.items())
+    }
+
+def _stored_card_views(stored_cards):
+    if not stored_cards or not stored_cards.get('cards'):
+        return []
+    return [
+        dict(card, expire_display=format_time(card['expire_time']))
+        for card in stored_cards['cards']
+    ]
+
+def build_report(accounts_data, alert_days=None):
+    """由采集结果构建各通知渠道共用的报告，每次运行只构建一次
+
+    返回 {"generated_at": 生成时间, "accounts": [账号视图]}，账号视图包含:
+    balance（现金余额）、stored_cards（储值卡）、bill（按项目分组的账单）、
+    services（alert_days 天内到期的资源，按服务类型分组、剩余天数升序）。
+    """
+    alert_days = Config.RESOURCE_ALERT_DAYS if alert_days is None else alert_days
+    return {
+        "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "accounts": [
+            {
+                "account_name": account_data['account_name'],
+                "balance": account_data.get('balance'),
+                "stored_cards": _stored_card_views(account_data.get('stored_cards')),
+                "bill": _bill_view(account_data.get('bills')),
+                "services": _expiring_services(account_data.get('resources'), alert_days),
+                # 资源查询失败时为False，不能据此认为资源已全部续费
+                "resources_collected": account_data.get('resources') is not None
+            }
+            for account_data in accounts_data
+        ]
+    }
+
+def with_services(report, services_by_account):
+    """返回替换了各账号到期资源的报告副本，services_by_account 为 {账号: [(服务类型, [资源])]}"""
+    return dict(report, accounts=[
+        dict(account, services=services_by_account.get(account['account_name'], []))
+        for account in report['accounts']
+    ])
@@ -0,0 +1,15 @@
+import time
+from src.circuit_breaker import circuit_breaker
+from src.rate_limiter import rate_limiter
+
+class DeadlineExceeded(Exception):
+    """已超过运行截止时间，分页查询不再获取后续分页"""
+
+def check_deadline(deadline):
+    """deadline 为 time.monotonic() 的截止时间，已超过时抛出 DeadlineExceeded"""
+    if deadline and time.monotonic() >= deadline:
+        raise DeadlineExceeded("已超过运行截止时间")
+
+def call_api(ak, account_name, api_name, func, *args, **kwargs):
+    """依次经过熔断和限流调用SDK接口"""
+    return circuit_breaker.call(account_name, api_name, rate_limiter.call, ak, api_name, func, *args, **kwargs)
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from src.config import Config
+from src.logger import logger
+from src.checkpoint import BatchCheckpoint
+from src.circuit_breaker import CircuitOpenError
+from src.bill_query import iter_bill_records
+
+def parse_cycle_range(value):
+    """解析 START:END 格式的账单周期范围，返回从早到晚的周期列表"""
+    start, _, end = value.partition(':')
+    start_date = datetime.strptime(start.strip(), '%Y-%m')
+    end_date = datetime.strptime((end or start).strip(), '%Y-%m')
+    if start_date > end_date:
+        raise ValueError(f"账单周期范围起始晚于结束: {value}")
+
+    cycles = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        cycles.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return cycles
+
+def _backfill_pair(db, account, cycle, batch_number):
+    """拉取一个账号一个账单周期的明细并批量导入"""
+    start_time = time.monotonic()
+    records = iter_bill_records(account["ak"], account["sk"], account["name"], cycle)
+    result = db.load_bills(account["name"], records, cycle, batch_number)
+    logger.info(f"账号 {account['name']} {cycle} 账单回填完成: {result['saved']} 条，"
+                f"失败 {len(result['errors'])} 条，耗时 {time.monotonic() - start_time:.2f} 秒")
+    return result
+
+def backfill_bills(db, accounts, cycles, max_workers=None):
+    """并发回填多个账号多个账单周期的账单，已完成的 (账号, 周期) 记录在检查点中，重复执行时跳过
+
+    所有接口调用共享限流器和熔断器，返回 {账号: {周期: 状态}}。
+    """
+    max_workers = max_workers or Config.COLLECT_MAX_WORKERS
+    checkpoint_id = f"backfill_{cycles[0]}_{cycles[-1]}"
+    checkpoint = BatchCheckpoint.load(checkpoint_id) or BatchCheckpoint(checkpoint_id)
+    completed = {
+        (account_name, cycle)
+        for account_name, statuses in checkpoint.accounts.items()
+        for cycle, status in statuses.items() if status == "success"
+    }
+
+    # 按周期轮转账号，使同一时刻的请求分散到不同AK
+    pairs = [
+        (account, cycle)
+        for cycle in cycles
+        for account in accounts
+        if (account["name"], cycle) not in completed
+    ]
+    if not pairs:
+        logger.info(f"账单回填 {cycles[0]} ~ {cycles[-1]} 已全部完成")
+        return {}
+
+    logger.info(f"开始回填账单 {cycles[0]} ~ {cycles[-1]}: {len(pairs)} 个 (账号, 周期)，"
+                f"已完成 {len(completed)} 个，并发 {max_workers}")
+    batch_number = datetime.now().strftime('%Y%m%d%H%M%S')
+    db.start_run(batch_number)
+
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backfill") as executor:
+        futures = {
+            executor.submit(_backfill_pair, db, account, cycle, batch_number): (account["name"], cycle)
+            for account, cycle in pairs
+        }
+        for future in as_completed(futures):
+            account_name, cycle = futures[future]
+            try:
+                result = future.result()
+                status = "failed" if any(error["item"] is None for error in result["errors"]) else "success"
+            except CircuitOpenError as e:
+                logger.warning(f"账号 {account_name} {cycle} 账单回填已跳过: {str(e)}")
+                status = "skipped"
+            except Exception as e:
+                logger.error(f"账号 {account_name} {cycle} 账单回填失败: {str(e)}")
+                status = "failed"
+            outcomes.setdefault(account_name, {})[cycle] = status
+            checkpoint.record(account_name, cycle, status)
+            checkpoint.save()
+
+    failed = [f"{account_name}/{cycle}" for account_name, statuses in outcomes.items()
+              for cycle, status in statuses.items() if status != "success"]
+    db.finish_run(batch_number, "partial" if failed else "completed", outcomes)
+    if failed:
+        logger.warning(f"账单回填有 {len(failed)} 个 (账号, 周期) 未完成，重新执行相同命令即可继续: {', '.join(failed)}")
+    else:
+        logger.info(f"账单回填 {cycles[0]} ~ {cycles[-1]} 全部完成")
+    return outcomes
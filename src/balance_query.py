@@ -1,22 +1,18 @@
-from huaweicloudsdkcore.auth.credentials import GlobalCredentials
-from huaweicloudsdkbss.v2.region.bss_region import BssRegion
 from huaweicloudsdkcore.exceptions import exceptions
 from huaweicloudsdkbss.v2 import *
 from src.logger import logger
+from src.client_registry import client_registry
+from src.api_guard import call_api
 
 def query_balance(ak, sk, account_name):
     """查询华为云账号的余额信息"""
     try:
-        # 使用AK/SK创建认证凭证
-        credentials = GlobalCredentials(ak, sk)
-        client = BssClient.new_builder() \
-            .with_credentials(credentials) \
-            .with_region(BssRegion.value_of("cn-north-1")) \
-            .build()
+        # 复用账号的BSS客户端
+        client = client_registry.get_bss_client(ak, sk)
 
         # 创建请求对象并发送请求
         request = ShowCustomerAccountBalancesRequest()
-        response = client.show_customer_account_balances(request)
+        response = call_api(ak, account_name, 'show_customer_account_balances', client.show_customer_account_balances, request)
         
         # 处理返回数据
         balance_info = {
@@ -0,0 +1,32 @@
+class BillAggregator:
+    """按 (账号, 项目, 服务类型, 区域) 累加账单金额，只保留汇总结果"""
+
+    def __init__(self):
+        self._totals = {}
+        self.record_count = 0
+        self.total_amount = 0
+
+    def add(self, record):
+        """累加一条账单明细"""
+        key = (record["account_name"], record["project_name"], record["service_type"], record["region"])
+        total = self._totals.get(key)
+        if total is None:
+            total = self._totals[key] = {"amount": 0, "record_count": 0}
+        total["amount"] += record["amount"]
+        total["record_count"] += 1
+        self.record_count += 1
+        self.total_amount += record["amount"]
+
+    def records(self):
+        """返回与明细记录字段一致的汇总记录，供通知格式化使用"""
+        return [
+            {
+                "account_name": account_name,
+                "project_name": project_name,
+                "service_type": service_type,
+                "region": region,
+                "amount": total["amount"],
+                "record_count": total["record_count"]
+            }
+            for (account_name, project_name, service_type, region), total in self._totals.items()
+        ]
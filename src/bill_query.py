@@ -1,60 +1,143 @@
-from huaweicloudsdkcore.auth.credentials import GlobalCredentials
-from huaweicloudsdkbss.v2.region.bss_region import BssRegion
 from huaweicloudsdkcore.exceptions import exceptions
 from huaweicloudsdkbss.v2 import *
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import time
+from src.config import Config
 from src.logger import logger
+from src.client_registry import client_registry
+from src.api_guard import call_api, check_deadline
+from src.bill_aggregation import BillAggregator
 
-def query_bills(ak, sk, account_name):
-    """查询华为云账号的按需计费账单信息"""
+def _fetch_bill_page(ak, account_name, client, cycle, offset, limit):
+    """查询一页按需计费账单明细，返回响应和耗时"""
+    request = ListCustomerselfResourceRecordDetailsRequest()
+    request.body = QueryResRecordsDetailReq(
+        cycle=cycle,
+        charge_mode=3,  # 按需计费
+        include_zero_record=False,  # 不包含金额为0的记录
+        method="oneself",  # 只查询自己的账单，不包含子客户
+        limit=limit,
+        offset=offset
+    )
+    start_time = time.monotonic()
+    response = call_api(ak, account_name, 'list_customerself_resource_record_details',
+                        client.list_customerself_resource_record_details, request)
+    return response, time.monotonic() - start_time
+
+def iter_bill_pages(ak, account_name, client, cycle, page_size=None, concurrency=None, deadline=None):
+    """按顺序返回账单明细的每一页 (response, 耗时秒数)，首页之后的分页并发获取
+
+    deadline 为运行截止时间（time.monotonic()），超过后不再请求后续分页，抛出 DeadlineExceeded。
+    """
+    page_size = page_size or Config.BILL_PAGE_SIZE
+    concurrency = concurrency or Config.BILL_PAGE_CONCURRENCY
+
+    first_response, first_elapsed = _fetch_bill_page(ak, account_name, client, cycle, 0, page_size)
+    yield first_response, first_elapsed
+
+    total_count = first_response.total_count or 0
+    offsets = list(range(page_size, total_count, page_size))
+    if not offsets:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bill-page")
     try:
-        # 使用AK/SK创建认证凭证
-        credentials = GlobalCredentials(ak, sk)
-        client = BssClient.new_builder() \
-            .with_credentials(credentials) \
-            .with_region(BssRegion.value_of("cn-north-1")) \
-            .build()
+        pending = deque()
+        next_index = 0
+        while next_index < len(offsets) or pending:
+            check_deadline(deadline)
+            # 在途分页数不超过并发数，消费方较慢时不会堆积分页
+            while next_index < len(offsets) and len(pending) < concurrency:
+                pending.append(executor.submit(_fetch_bill_page, ak, account_name, client, cycle, offsets[next_index], page_size))
+                next_index += 1
+            yield pending.popleft().result()
+    finally:
+        # 超过截止时间或提前结束时取消未开始的分页，不等待在途请求
+        executor.shutdown(wait=False, cancel_futures=True)
 
-        # 创建请求对象
-        request = ListCustomerselfResourceRecordDetailsRequest()
-        
-        # 获取当前月份
-        current_month = datetime.now().strftime('%Y-%m')
-        
-        # 设置请求体
-        request.body = QueryResRecordsDetailReq(
-            cycle=current_month,
-            charge_mode=3,  # 按需计费
-            include_zero_record=False,  # 不包含金额为0的记录
-            method="oneself",  # 只查询自己的账单，不包含子客户
-            limit=1000,  # 设置较大的limit以获取所有记录
-            offset=0
-        )
+def _bill_record(account_name, record):
+    """只保留账单明细中需要的字段"""
+    return {
+        "account_name": account_name,
+        "project_name": record.enterprise_project_name,
+        "service_type": record.cloud_service_type_name,
+        "resource_id": record.res_instance_id,
+        "resource_name": record.resource_name or record.product_spec_desc,
+        "region": record.region_name,
+        "amount": record.consume_amount
+    }
 
-        # 发送请求
-        response = client.list_customerself_resource_record_details(request)
+def iter_bill_records(ak, sk, account_name, cycle):
+    """逐条返回指定账单周期的按需计费明细，接口异常直接抛出"""
+    client = client_registry.get_bss_client(ak, sk)
+    for response, _elapsed in iter_bill_pages(ak, account_name, client, cycle):
+        for record in response.monthly_records or []:
+            bill_record = _bill_record(account_name, record)
+            bill_record["currency"] = response.currency
+            yield bill_record
+
+def query_bills(ak, sk, account_name, record_sink=None, cycle=None, deadline=None):
+    """查询华为云账号的按需计费账单信息
+
+    cycle 为账单周期（YYYY-MM），默认当前月份。deadline 为运行截止时间，超过后不再获取后续分页。
+    开启流式汇总时，明细逐页交给 record_sink(records, cycle) 处理（如写入数据库），
+    返回结果中只保留按项目、服务类型和区域汇总后的记录。
+    """
+    streaming = Config.BILL_STREAMING_AGGREGATION
+    try:
+        # 复用账号的BSS客户端
+        client = client_registry.get_bss_client(ak, sk)
+        
+        # 默认查询当前月份
+        current_month = cycle or datetime.now().strftime('%Y-%m')
         
         # 处理返回数据
         bills_info = {
             "records": [],
             "total_amount": 0,
-            "currency": response.currency
+            "currency": "CNY",
+            "cycle": current_month,
+            "pages": {
+                "count": 0,
+                "durations": []
+            },
+            "aggregated": streaming
         }
+        aggregator = BillAggregator() if streaming else None
         
-        for record in response.monthly_records:
-            # 只保留需要的字段
-            bill_record = {
-                "account_name": account_name,
-                "project_name": record.enterprise_project_name,
-                "service_type": record.cloud_service_type_name,
-                "resource_name": record.resource_name or record.product_spec_desc,
-                "region": record.region_name,
-                "amount": record.consume_amount
-            }
-            bills_info["records"].append(bill_record)
-            bills_info["total_amount"] += record.consume_amount
+        for page_index, (response, elapsed) in enumerate(iter_bill_pages(ak, account_name, client, current_month, deadline=deadline)):
+            if page_index == 0:
+                bills_info["currency"] = response.currency
+            bills_info["pages"]["count"] += 1
+            bills_info["pages"]["durations"].append(round(elapsed, 3))
+            
+            page_records = []
+            for record in response.monthly_records or []:
+                bill_record = _bill_record(account_name, record)
+                if streaming:
+                    aggregator.add(bill_record)
+                    page_records.append(bill_record)
+                else:
+                    bills_info["records"].append(bill_record)
+                    bills_info["total_amount"] += record.consume_amount
+            
+            # 流式模式下明细随页处理后即释放
+            if streaming and record_sink and page_records:
+                record_sink(page_records, current_month)
+        
+        if streaming:
+            bills_info["records"] = aggregator.records()
+            bills_info["total_amount"] = aggregator.total_amount
+            bills_info["record_count"] = aggregator.record_count
         
-        logger.info(f"账号 {account_name} 账单查询成功: {len(bills_info['records'])} 条记录")
+        durations = bills_info["pages"]["durations"]
+        logger.info(f"账号 {account_name} 账单分页获取完成: 共 {len(durations)} 页，各页耗时 {durations} 秒")
+        if streaming:
+            logger.info(f"账号 {account_name} 账单查询成功: {bills_info['record_count']} 条记录，汇总为 {len(bills_info['records'])} 条")
+        else:
+            logger.info(f"账号 {account_name} 账单查询成功: {len(bills_info['records'])} 条记录")
         
         return {
             "success": True,
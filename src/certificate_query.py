@@ -1,66 +1,128 @@
-from huaweicloudsdkcore.auth.credentials import GlobalCredentials
-from huaweicloudsdkscm.v3.region.scm_region import ScmRegion
 from huaweicloudsdkcore.exceptions import exceptions
 from huaweicloudsdkscm.v3 import *
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from src.config import Config
 from src.logger import logger
+from src.client_registry import client_registry
+from src.api_guard import call_api, check_deadline, DeadlineExceeded
+from src.circuit_breaker import CircuitOpenError
+from src.utils import CERTIFICATE_SERVICE_TYPE
 
-def query_certificates(ak, sk, account_name):
-    """查询华为云账号的SSL证书信息"""
-    try:
-        # 使用AK/SK创建认证凭证
-        credentials = GlobalCredentials(ak, sk)
-        client = ScmClient.new_builder() \
-            .with_credentials(credentials) \
-            .with_region(ScmRegion.value_of("cn-north-4")) \
-            .build()
+def _parse_certificate(cert, region):
+    """将SDK证书对象转换为统一的资源字典"""
+    # 计算剩余天数
+    expire_time = datetime.fromisoformat(cert.expire_time.split('.')[0])
+    remaining_days = (expire_time - datetime.now()).days
+    
+    return {
+        'name': cert.name,
+        'id': cert.id,
+        'service_type': CERTIFICATE_SERVICE_TYPE,
+        'region': region,
+        'expire_time': expire_time.strftime('%Y-%m-%dT%H:%M:%SZ'),  # 转换为标准格式
+        'project': cert.enterprise_project_id or 'default',
+        'remaining_days': remaining_days
+    }
 
-        # 创建请求对象并发送请求
-        request = ListCertificatesRequest()
-        response = client.list_certificates(request)
+def _query_region_certificates(ak, sk, account_name, region, page_size, deadline=None):
+    """分页查询单个区域下的全部有效证书，超过运行截止时间后抛出 DeadlineExceeded"""
+    client = client_registry.get_scm_client(ak, sk, region)
+    certificates = []
+    offset = 0
+    while True:
+        check_deadline(deadline)
+        request = ListCertificatesRequest(limit=page_size, offset=offset)
+        response = call_api(ak, account_name, 'list_certificates', client.list_certificates, request)
+        page = response.certificates or []
         
-        # 处理返回数据
-        certificates = []
-        for cert in response.certificates:
+        for cert in page:
             # 只处理有过期时间且状态不是EXPIRED的证书
             if cert.expire_time and cert.status != 'EXPIRED':
                 try:
-                    # 计算剩余天数
-                    expire_time = datetime.strptime(cert.expire_time.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                    remaining_days = (expire_time - datetime.now()).days
-                    
-                    cert_info = {
-                        'name': cert.name,
-                        'id': cert.id,
-                        'service_type': 'SSL证书',
-                        'region': 'cn-north-4',  # SSL证书是全局资源
-                        'expire_time': expire_time.strftime('%Y-%m-%dT%H:%M:%SZ'),  # 转换为标准格式
-                        'project': cert.enterprise_project_id or 'default',
-                        'remaining_days': remaining_days
-                    }
-                    certificates.append(cert_info)
+                    certificates.append(_parse_certificate(cert, region))
                 except Exception as e:
                     logger.error(f"处理证书 {cert.name} 时出错: {str(e)}")
                     continue
         
-        logger.info(f"账号 {account_name} SSL证书查询成功: {len(certificates)} 个有效证书")
-        
+        offset += len(page)
+        if len(page) < page_size or (response.total_count is not None and offset >= response.total_count):
+            break
+    
+    logger.debug(f"账号 {account_name} 区域 {region} 证书查询完成: {len(certificates)} 个有效证书")
+    return certificates
+
+def _region_error(error):
+    """区域查询失败的错误信息"""
+    if isinstance(error, exceptions.ClientRequestException):
+        return {
+            "status_code": error.status_code,
+            "request_id": error.request_id,
+            "error_code": error.error_code,
+            "error_msg": error.error_msg
+        }
+    return {"error_msg": str(error)}
+
+def query_certificates(ak, sk, account_name, deadline=None):
+    """查询华为云账号的SSL证书信息
+
+    各区域并发查询，部分区域失败时返回成功区域的证书，失败区域的错误记录在 region_errors 中；
+    全部区域失败时整体失败。
+    """
+    regions = Config.SCM_REGIONS
+    if not regions:
+        logger.warning(f"账号 {account_name} 未配置SSL证书查询区域，跳过证书查询")
         return {
             "success": True,
-            "data": certificates,
+            "data": [],
             "error": None
         }
-                
-    except exceptions.ClientRequestException as e:
-        error_msg = f"账号 {account_name} SSL证书查询失败: 状态码={e.status_code}, 错误码={e.error_code}, 错误信息={e.error_msg}"
-        logger.error(error_msg)
+
+    def query_region(region):
+        try:
+            return _query_region_certificates(ak, sk, account_name, region, Config.SCM_PAGE_SIZE, deadline), None
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"账号 {account_name} 区域 {region} SSL证书查询失败: {str(e)}")
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=len(regions), thread_name_prefix="scm-region") as executor:
+        region_results = list(executor.map(query_region, regions))
+
+    region_errors = {
+        region: error for region, (_, error) in zip(regions, region_results) if error is not None
+    }
+    if len(region_errors) == len(regions):
+        # 全部区域熔断时交由采集器标记为跳过
+        errors = list(region_errors.values())
+        if all(isinstance(error, CircuitOpenError) for error in errors):
+            raise errors[0]
         return {
             "success": False,
             "data": None,
-            "error": {
-                "status_code": e.status_code,
-                "request_id": e.request_id,
-                "error_code": e.error_code,
-                "error_msg": e.error_msg
-            }
-        } 
\ No newline at end of file
+            "error": {"region_errors": {region: _region_error(error) for region, error in region_errors.items()}}
+        }
+
+    # 按证书ID去重，保留配置中靠前区域的结果
+    certificates = []
+    seen_ids = set()
+    for region_certificates, _ in region_results:
+        for cert_info in region_certificates or []:
+            if cert_info['id'] in seen_ids:
+                continue
+            seen_ids.add(cert_info['id'])
+            certificates.append(cert_info)
+
+    if region_errors:
+        logger.warning(f"账号 {account_name} SSL证书部分区域查询失败: {', '.join(region_errors)}，"
+                       f"返回其余区域的 {len(certificates)} 个有效证书")
+    else:
+        logger.info(f"账号 {account_name} SSL证书查询成功: {len(certificates)} 个有效证书")
+
+    return {
+        "success": True,
+        "data": certificates,
+        "error": None,
+        "region_errors": {region: _region_error(error) for region, error in region_errors.items()}
+    }
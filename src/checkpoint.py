@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+from src.config import Config
+from src.logger import logger
+
+class BatchCheckpoint:
+    """记录批次内每个 (账号, 查询) 的执行状态，用于只重跑失败的查询
+
+    cycle 为批次查询的账单周期（YYYY-MM），重跑时沿用，跨月重跑不会查询到新的月份。
+    """
+
+    def __init__(self, batch_number, directory=None, cycle=None):
+        self.batch_number = batch_number
+        self.path = os.path.join(directory or Config.CHECKPOINT_DIR, f"{batch_number}.json")
+        # 采集批次号格式为 YYYYMMDDHHmmss，未指定时取批次开始的月份
+        if not cycle and batch_number.isdigit():
+            cycle = f"{batch_number[:4]}-{batch_number[4:6]}"
+        self.cycle = cycle
+        self.accounts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, batch_number, directory=None):
+        """读取批次检查点，不存在时返回None"""
+        checkpoint = cls(batch_number, directory)
+        if not os.path.exists(checkpoint.path):
+            return None
+        with open(checkpoint.path, 'r', encoding='utf-8') as file:
+            content = json.load(file)
+        checkpoint.accounts = content.get('accounts', {})
+        # 早期的检查点没有账单周期，沿用由批次号推算的月份
+        checkpoint.cycle = content.get('cycle') or checkpoint.cycle
+        return checkpoint
+
+    def record(self, account_name, query_name, status):
+        """记录查询状态: success / failed / skipped"""
+        with self._lock:
+            self.accounts.setdefault(account_name, {})[query_name] = status
+
+    @staticmethod
+    def query_status(result):
+        """查询结果对应的状态"""
+        if result.get("success"):
+            return "success"
+        if result.get("skipped"):
+            return "skipped"
+        return "failed"
+
+    def record_results(self, account_name, results):
+        """根据采集结果记录账号下各查询的状态"""
+        for query_name, result in results.items():
+            self.record(account_name, query_name, self.query_status(result))
+
+    def failed_pairs(self):
+        """返回未成功的查询，格式为 {账号: [查询名]}"""
+        with self._lock:
+            pending = {}
+            for account_name, queries in self.accounts.items():
+                failed = [name for name, status in queries.items() if status != "success"]
+                if failed:
+                    pending[account_name] = failed
+            return pending
+
+    def save(self):
+        """写入检查点文件"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._lock:
+            content = {"batch_number": self.batch_number, "cycle": self.cycle, "accounts": self.accounts}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(content, file, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存批次 {self.batch_number} 检查点失败: {str(e)}")
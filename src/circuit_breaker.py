@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import deque
+from src.config import Config
+from src.logger import logger
+
+class CircuitOpenError(Exception):
+    """熔断打开期间调用接口时抛出"""
+
+    def __init__(self, account_name, api_name, retry_after):
+        self.account_name = account_name
+        self.api_name = api_name
+        self.retry_after = retry_after
+        super().__init__(f"账号 {account_name} 接口 {api_name} 已熔断，{retry_after:.0f} 秒后恢复")
+
+class CircuitBreaker:
+    """按 (账号, 接口) 统计失败，窗口内失败达到阈值后在冷却期内直接拒绝调用"""
+
+    def __init__(self, failure_threshold=None, window=None, cooldown=None):
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.window = window or Config.CIRCUIT_WINDOW
+        self.cooldown = cooldown or Config.CIRCUIT_COOLDOWN
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state_locked(self, key):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = {"failures": deque(), "opened_until": 0, "trips": 0}
+        return state
+
+    def before_call(self, account_name, api_name):
+        """熔断打开时抛出 CircuitOpenError，冷却结束后放行试探请求"""
+        with self._lock:
+            state = self._state_locked((account_name, api_name))
+            remaining = state["opened_until"] - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(account_name, api_name, remaining)
+
+    def record_success(self, account_name, api_name):
+        with self._lock:
+            state = self._state_locked((account_name, api_name))
+            state["failures"].clear()
+
+    def record_failure(self, account_name, api_name):
+        with self._lock:
+            state = self._state_locked((account_name, api_name))
+            now = time.monotonic()
+            failures = state["failures"]
+            failures.append(now)
+            while failures and now - failures[0] > self.window:
+                failures.popleft()
+            if len(failures) < self.failure_threshold:
+                return
+            failures.clear()
+            state["opened_until"] = now + self.cooldown
+            state["trips"] += 1
+        logger.warning(f"账号 {account_name} 接口 {api_name} 在 {self.window} 秒内连续失败 {self.failure_threshold} 次，熔断 {self.cooldown} 秒")
+
+    def call(self, account_name, api_name, func, *args, **kwargs):
+        """在熔断保护下调用接口"""
+        self.before_call(account_name, api_name)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(account_name, api_name)
+            raise
+        self.record_success(account_name, api_name)
+        return result
+
+    def open_circuits(self):
+        """返回当前处于熔断状态的 (账号, 接口) 列表"""
+        now = time.monotonic()
+        with self._lock:
+            return [key for key, state in self._states.items() if state["opened_until"] > now]
+
+# 所有查询模块共享的熔断器
+circuit_breaker = CircuitBreaker()
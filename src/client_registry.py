@@ -0,0 +1,101 @@
+import threading
+import time
+from huaweicloudsdkcore.auth.credentials import GlobalCredentials
+from huaweicloudsdkcore.http.http_config import HttpConfig
+from huaweicloudsdkbss.v2 import BssClient
+from huaweicloudsdkbss.v2.region.bss_region import BssRegion
+from huaweicloudsdkscm.v3 import ScmClient
+from huaweicloudsdkscm.v3.region.scm_region import ScmRegion
+from src.config import Config
+from src.logger import logger
+from src.domain_cache import domain_id_cache
+
+# BSS接口统一使用的区域
+BSS_REGION = "cn-north-1"
+
+class ClientRegistry:
+    """按账号缓存华为云SDK客户端，复用认证信息和HTTP连接池"""
+
+    def __init__(self, idle_timeout=None):
+        self.idle_timeout = Config.CLIENT_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._clients = {}
+        self._build_locks = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def get_bss_client(self, ak, sk):
+        """获取账号的BSS客户端"""
+        return self._get_client(("bss", ak, BSS_REGION), lambda: self._build(BssClient, BssRegion, ak, sk, BSS_REGION))
+
+    def get_scm_client(self, ak, sk, region):
+        """获取账号在指定区域的SCM客户端"""
+        return self._get_client(("scm", ak, region), lambda: self._build(ScmClient, ScmRegion, ak, sk, region))
+
+    def _get_client(self, key, builder):
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._clients.get(key)
+            if entry:
+                entry["last_used"] = time.monotonic()
+                return entry["client"]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # 同一客户端只构建一次，不同账号之间互不阻塞
+        with build_lock:
+            with self._lock:
+                entry = self._clients.get(key)
+                if entry:
+                    entry["last_used"] = time.monotonic()
+                    return entry["client"]
+
+            client = builder()
+            with self._lock:
+                self._clients[key] = {"client": client, "last_used": time.monotonic()}
+            return client
+
+    def _build(self, client_class, region_class, ak, sk, region):
+        # 已缓存domain_id时直接传入，SDK无需再调用IAM解析
+        domain_id = domain_id_cache.get(ak)
+        credentials = GlobalCredentials(ak, sk, domain_id)
+        http_config = HttpConfig.get_default_config()
+        http_config.timeout = (Config.API_CONNECT_TIMEOUT, Config.API_READ_TIMEOUT)
+        client = client_class.new_builder() \
+            .with_http_config(http_config) \
+            .with_credentials(credentials) \
+            .with_region(region_class.value_of(region)) \
+            .build()
+        if not domain_id:
+            domain_id_cache.put(ak, getattr(credentials, 'domain_id', None))
+        logger.debug(f"已创建 {client_class.__name__} 客户端，区域: {region}")
+        return client
+
+    def _evict_idle_locked(self):
+        """清理长时间未使用的客户端，调用方需持有锁"""
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_timeout:
+            return
+        self._last_sweep = now
+
+        expired = [key for key, entry in self._clients.items() if now - entry["last_used"] > self.idle_timeout]
+        for key in expired:
+            del self._clients[key]
+            self._build_locks.pop(key, None)
+        if expired:
+            logger.info(f"已清理 {len(expired)} 个空闲客户端")
+
+    def evict_idle(self):
+        """立即清理空闲客户端"""
+        with self._lock:
+            self._last_sweep = float("-inf")
+            self._evict_idle_locked()
+
+    def clear(self):
+        """清空所有缓存的客户端"""
+        with self._lock:
+            self._clients.clear()
+            self._build_locks.clear()
+
+# 全局共享的客户端注册表
+client_registry = ClientRegistry()
@@ -0,0 +1,198 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from src.config import Config
+from src.logger import logger
+from src.circuit_breaker import CircuitOpenError
+from src.api_guard import DeadlineExceeded
+from src.resource_query import query_resources
+from src.balance_query import query_balance
+from src.bill_query import query_bills
+from src.stored_card_query import query_stored_cards
+from src.certificate_query import query_certificates
+
+# 每个账号需要执行的查询，顺序即提交顺序
+ACCOUNT_QUERIES = {
+    "resources": query_resources,
+    "balance": query_balance,
+    "bills": query_bills,
+    "stored_cards": query_stored_cards,
+    "certificates": query_certificates
+}
+
+# 分页查询在每页之前检查运行截止时间，已开始的查询超时后也会尽快结束
+PAGED_QUERIES = {"resources", "bills", "certificates"}
+
+def _skipped_result(reason):
+    """未执行或未在截止时间内完成的查询结果"""
+    return {
+        "success": False,
+        "data": None,
+        "error": reason,
+        "skipped": True
+    }
+
+def _run_query(account, query_name, query_func, semaphore, deadline, bill_record_sink=None, bill_cycle=None,
+               resource_sink=None):
+    """在账号并发限制内执行单个查询"""
+    kwargs = {}
+    if query_name == "resources" and resource_sink:
+        kwargs["resource_sink"] = partial(resource_sink, account["name"])
+    if query_name == "bills" and bill_record_sink:
+        kwargs["record_sink"] = partial(bill_record_sink, account["name"])
+    if query_name == "bills" and bill_cycle:
+        kwargs["cycle"] = bill_cycle
+    if query_name in PAGED_QUERIES and deadline:
+        kwargs["deadline"] = deadline
+
+    with semaphore:
+        # 已过运行截止时间的查询不再发起
+        if deadline and time.monotonic() >= deadline:
+            return _skipped_result("已超过运行截止时间")
+        try:
+            return query_func(account["ak"], account["sk"], account["name"], **kwargs)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"账号 {account['name']} {query_name} 查询已跳过: {str(e)}")
+            return _skipped_result(str(e))
+        except Exception as e:
+            logger.error(f"账号 {account['name']} {query_name} 查询发生未知错误: {str(e)}")
+            return {
+                "success": False,
+                "data": None,
+                "error": str(e)
+            }
+
+def _account_results(account_futures):
+    """汇总账号各查询的结果，未完成或被取消的查询标记为跳过"""
+    account_results = {}
+    for name, future in account_futures.items():
+        if future.done() and not future.cancelled():
+            account_results[name] = future.result()
+        else:
+            account_results[name] = _skipped_result("已超过运行截止时间")
+    return account_results
+
+def collect_accounts(accounts, max_workers=None, per_account_workers=None, bill_record_sink=None, run_deadline=None,
+                     queries_by_account=None, on_account_complete=None, bill_cycle=None, resource_sink=None):
+    """并发采集所有账号的数据，结果按账号配置顺序返回
+
+    bill_record_sink(account_name, records, cycle) 用于流式汇总模式下逐页接收账单明细。
+    bill_cycle 为查询的账单周期（YYYY-MM），默认当前月份。
+    resource_sink(account_name, resources) 用于逐页接收资源，资源查询结果中只保留到期提醒范围内的资源。
+    run_deadline 为整体运行截止秒数，到期未完成的查询标记为跳过，已完成的结果照常返回。
+    queries_by_account 为 {账号: [查询名]} 时只执行指定的查询，结果中只包含这些查询。
+    on_account_complete(account, results) 在账号的全部查询完成时立即调用（在工作线程中），
+    便于入库与其它账号的采集并行；已回调的账号在结果中标记 completed_early，
+    采集返回后才完成的账号不再回调。回调和 bill_record_sink、resource_sink 在采集返回前全部结束，
+    采集返回后仍在执行的查询不再调用它们，调用方可以在返回后关闭写入目标。
+    """
+    max_workers = max_workers or Config.COLLECT_MAX_WORKERS
+    per_account_workers = per_account_workers or Config.COLLECT_PER_ACCOUNT_WORKERS
+    run_deadline = Config.RUN_DEADLINE if run_deadline is None else run_deadline
+
+    logger.info(f"开始并发采集 {len(accounts)} 个账号，全局并发 {max_workers}，单账号并发 {per_account_workers}")
+    start_time = time.monotonic()
+    deadline = start_time + run_deadline if run_deadline > 0 else None
+
+    semaphores = [threading.BoundedSemaphore(per_account_workers) for _ in accounts]
+    futures = [{} for _ in accounts]
+
+    # 每个账号待执行的查询及未完成数量
+    planned = [
+        [name for name in ACCOUNT_QUERIES if queries_by_account is None or name in queries_by_account.get(account["name"], [])]
+        for account in accounts
+    ]
+    remaining = [len(names) for names in planned]
+    completed_early = [False for _ in accounts]
+    progress = threading.Condition()
+    collection_done = threading.Event()
+    # 正在执行的回调数，采集结束时等待它们写完，之后的回调不再执行
+    active_callbacks = [0]
+
+    def begin_callback():
+        with progress:
+            if collection_done.is_set():
+                return False
+            active_callbacks[0] += 1
+            return True
+
+    def end_callback():
+        with progress:
+            active_callbacks[0] -= 1
+            progress.notify_all()
+
+    def on_query_done(index, _future):
+        with progress:
+            remaining[index] -= 1
+            if remaining[index] or collection_done.is_set():
+                return
+            completed_early[index] = True
+            active_callbacks[0] += 1
+        try:
+            on_account_complete(accounts[index], _account_results(futures[index]))
+        except Exception as e:
+            logger.error(f"账号 {accounts[index]['name']} 采集完成回调失败: {str(e)}")
+        finally:
+            end_callback()
+
+    def guarded(sink, label):
+        # 采集结束后仍在执行的查询不再写入，避免写入已关闭的后台写库队列
+        if sink is None:
+            return None
+
+        def guarded_sink(account_name, records, *args):
+            if not begin_callback():
+                logger.warning(f"账号 {account_name} 采集已结束，丢弃 {len(records)} 条{label}")
+                return
+            try:
+                sink(account_name, records, *args)
+            finally:
+                end_callback()
+        return guarded_sink
+
+    guarded_bill_record_sink = guarded(bill_record_sink, "账单明细")
+    guarded_resource_sink = guarded(resource_sink, "资源")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="collector")
+    try:
+        # 按查询类型轮转提交，避免单个账号的任务占满工作线程
+        for query_name, query_func in ACCOUNT_QUERIES.items():
+            for index, account in enumerate(accounts):
+                if query_name not in planned[index]:
+                    continue
+                future = executor.submit(
+                    _run_query, account, query_name, query_func, semaphores[index], deadline,
+                    guarded_bill_record_sink, bill_cycle, guarded_resource_sink
+                )
+                futures[index][query_name] = future
+                if on_account_complete:
+                    future.add_done_callback(partial(on_query_done, index))
+
+        all_futures = [future for account_futures in futures for future in account_futures.values()]
+        wait(all_futures, timeout=deadline - time.monotonic() if deadline else None)
+    finally:
+        # 截止时间到达后取消未开始的查询，不再等待仍在执行的查询，它们受单次调用超时约束
+        for account_futures in futures:
+            for future in account_futures.values():
+                future.cancel()
+        executor.shutdown(wait=False)
+        with progress:
+            collection_done.set()
+            progress.wait_for(lambda: active_callbacks[0] == 0)
+
+    results = []
+    skipped = []
+    for index, (account, account_futures) in enumerate(zip(accounts, futures)):
+        account_results = _account_results(account_futures)
+        skipped.extend(f"{account['name']}/{name}" for name, result in account_results.items() if result.get("skipped"))
+        results.append({
+            "account": account,
+            "results": account_results,
+            "completed_early": completed_early[index]
+        })
+
+    logger.info(f"账号数据采集完成，耗时 {time.monotonic() - start_time:.2f} 秒")
+    if skipped:
+        logger.warning(f"共有 {len(skipped)} 个查询被跳过（超时或熔断）: {', '.join(skipped)}")
+    return results
@@ -8,11 +8,32 @@ load_dotenv()
 class Config:
     # 数据库配置
     ENABLE_DATABASE = os.getenv('ENABLE_DATABASE', 'false').lower() == 'true'
+    # 存储后端: mysql / sqlite，sqlite 适合单机部署，不支持分区和数据保留任务
+    DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'data/huaweicloud_monitor.db')
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = int(os.getenv('DB_PORT', '3306'))
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'huaweicloud_monitor')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    # 连接池耗尽时等待空闲连接的最长秒数
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+    # 资源和储值卡历史表只记录变化（新增、到期时间、剩余天数档位或余额变化）
+    HISTORY_CHANGE_ONLY = os.getenv('HISTORY_CHANGE_ONLY', 'true').lower() == 'true'
+    # 批量写入时每条INSERT语句包含的行数
+    DB_BULK_CHUNK_SIZE = int(os.getenv('DB_BULK_CHUNK_SIZE', '500'))
+    # 账单大批量导入使用 LOAD DATA LOCAL INFILE，需服务端开启 local_infile，未开启时自动退回分块写入
+    DB_LOCAL_INFILE = os.getenv('DB_LOCAL_INFILE', 'false').lower() == 'true'
+    # 后台异步写库：队列长度、每批行数和最长攒批秒数
+    DB_ASYNC_WRITER = os.getenv('DB_ASYNC_WRITER', 'false').lower() == 'true'
+    DB_WRITER_QUEUE_SIZE = int(os.getenv('DB_WRITER_QUEUE_SIZE', '10000'))
+    DB_WRITER_BATCH_SIZE = int(os.getenv('DB_WRITER_BATCH_SIZE', '1000'))
+    DB_WRITER_FLUSH_INTERVAL = float(os.getenv('DB_WRITER_FLUSH_INTERVAL', '2'))
+    # 历史表按月分区：提前创建的月分区数，资源/余额/储值卡历史保留天数，账单保留月数（0表示不删除）
+    PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+    DATA_RETENTION_DAYS = int(os.getenv('DATA_RETENTION_DAYS', '365'))
+    BILL_RETENTION_MONTHS = int(os.getenv('BILL_RETENTION_MONTHS', '24'))
 
     # 企业微信配置
     WEWORK_ENABLED = os.getenv('WEWORK_ENABLED', 'false').lower() == 'true'
@@ -34,8 +55,73 @@ class Config:
     SMTP_TO = os.getenv('SMTP_TO', '').split(',')
     EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'true').lower() == 'true'
 
+    # 并发采集配置
+    COLLECT_MAX_WORKERS = int(os.getenv('COLLECT_MAX_WORKERS', '10'))
+    COLLECT_PER_ACCOUNT_WORKERS = int(os.getenv('COLLECT_PER_ACCOUNT_WORKERS', '3'))
+    # 客户端空闲超过该秒数后释放，0表示不释放
+    CLIENT_IDLE_TIMEOUT = int(os.getenv('CLIENT_IDLE_TIMEOUT', '600'))
+
+    # 接口限流配置（每个AK每个接口的每秒请求数）
+    API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', '5'))
+    API_RATE_LIMIT_MIN = float(os.getenv('API_RATE_LIMIT_MIN', '0.5'))
+    API_RATE_LIMIT_MAX = float(os.getenv('API_RATE_LIMIT_MAX', '20'))
+    API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '5'))
+    API_RETRY_BASE_DELAY = float(os.getenv('API_RETRY_BASE_DELAY', '1'))
+
+    # 超时与熔断配置
+    API_CONNECT_TIMEOUT = int(os.getenv('API_CONNECT_TIMEOUT', '10'))
+    API_READ_TIMEOUT = int(os.getenv('API_READ_TIMEOUT', '60'))
+    # 整体运行截止秒数，0表示不限制
+    RUN_DEADLINE = int(os.getenv('RUN_DEADLINE', '0'))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', '60'))
+    CIRCUIT_COOLDOWN = int(os.getenv('CIRCUIT_COOLDOWN', '300'))
+
+    # 分页查询配置
+    RESOURCE_PAGE_SIZE = int(os.getenv('RESOURCE_PAGE_SIZE', '100'))
+    BILL_PAGE_SIZE = int(os.getenv('BILL_PAGE_SIZE', '1000'))
+    BILL_PAGE_CONCURRENCY = int(os.getenv('BILL_PAGE_CONCURRENCY', '4'))
+    # 账单流式汇总：明细直接写入数据库，内存中只保留汇总结果
+    BILL_STREAMING_AGGREGATION = os.getenv('BILL_STREAMING_AGGREGATION', 'false').lower() == 'true'
+
+    # SSL证书查询区域（逗号分隔）及每页条数
+    SCM_REGIONS = [region.strip() for region in os.getenv('SCM_REGIONS', 'cn-north-4').split(',') if region.strip()]
+    SCM_PAGE_SIZE = int(os.getenv('SCM_PAGE_SIZE', '50'))
+
+    # 本地缓存配置
+    CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+    # domain_id缓存有效期（秒），0表示不缓存
+    DOMAIN_ID_CACHE_TTL = int(os.getenv('DOMAIN_ID_CACHE_TTL', '604800'))
+    # 批次检查点目录
+    CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', 'checkpoints')
+
     # 资源告警配置
     RESOURCE_ALERT_DAYS = int(os.getenv('RESOURCE_ALERT_DAYS', '65'))
+    # 告警去重：机器人只提醒剩余天数进入新档位或到期时间变化的资源，状态保存在 cache/alert_state.json
+    ALERT_SUPPRESSION = os.getenv('ALERT_SUPPRESSION', 'true').lower() == 'true'
+    # 每隔多少天发送一次全部待提醒资源的汇总，0表示不发送
+    ALERT_DIGEST_DAYS = int(os.getenv('ALERT_DIGEST_DAYS', '0'))
+    # 剩余天数档位（逗号分隔），用于判断资源状态变化
+    REMAINING_DAYS_BUCKETS = [int(days) for days in os.getenv('REMAINING_DAYS_BUCKETS', '65,30,15,7,1').split(',') if days.strip()]
+
+    # 通知发送配置：并发数及 webhook 连接/读取超时（秒）
+    NOTIFY_MAX_WORKERS = int(os.getenv('NOTIFY_MAX_WORKERS', '8'))
+    WEBHOOK_CONNECT_TIMEOUT = float(os.getenv('WEBHOOK_CONNECT_TIMEOUT', '5'))
+    WEBHOOK_READ_TIMEOUT = float(os.getenv('WEBHOOK_READ_TIMEOUT', '15'))
+    # 每个机器人每分钟最多发送的消息数，及其中允许连续发送的条数
+    WEWORK_RATE_LIMIT = int(os.getenv('WEWORK_RATE_LIMIT', '20'))
+    YUNZHIJIA_RATE_LIMIT = int(os.getenv('YUNZHIJIA_RATE_LIMIT', '20'))
+    # 云之家单条消息最大字节数（UTF-8），企业微信固定为4096
+    YUNZHIJIA_MAX_BYTES = int(os.getenv('YUNZHIJIA_MAX_BYTES', '4096'))
+    NOTIFY_BURST = int(os.getenv('NOTIFY_BURST', '5'))
+    # 发送队列长度（批次数）、每个机器人的发送线程数、失败重试次数及首次重试等待秒数（之后按指数增长）
+    NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '200'))
+    NOTIFY_QUEUE_WORKERS = int(os.getenv('NOTIFY_QUEUE_WORKERS', '4'))
+    NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '3'))
+    NOTIFY_RETRY_BASE_DELAY = float(os.getenv('NOTIFY_RETRY_BASE_DELAY', '2'))
+    # 重试后仍失败的消息落盘保存的最大条数及有效期（秒），下次运行时重新投递
+    NOTIFY_SPOOL_MAX_MESSAGES = int(os.getenv('NOTIFY_SPOOL_MAX_MESSAGES', '500'))
+    NOTIFY_SPOOL_MAX_AGE = int(os.getenv('NOTIFY_SPOOL_MAX_AGE', '86400'))
 
     # 云之家配置
     YUNZHIJIA_ENABLED = os.getenv('YUNZHIJIA_ENABLED', 'false').lower() == 'true'
@@ -53,7 +139,9 @@ class Config:
         logger.info("=== 配置信息 ===")
         
         # 数据库配置日志
-        if cls.ENABLE_DATABASE:
+        if cls.ENABLE_DATABASE and cls.DB_BACKEND == 'sqlite':
+            logger.info(f"SQLite 数据库文件: {cls.SQLITE_PATH}")
+        elif cls.ENABLE_DATABASE:
             logger.info(f"数据库连接信息: {cls.DB_HOST}:{cls.DB_PORT}")
             logger.info(f"数据库名称: {cls.DB_NAME}")
         else:
@@ -77,6 +165,12 @@ class Config:
         else:
             logger.info("邮件通知未启用")
 
+        # 并发采集配置日志
+        logger.info(f"采集并发数: 全局 {cls.COLLECT_MAX_WORKERS}，单账号 {cls.COLLECT_PER_ACCOUNT_WORKERS}")
+
+        if cls.RUN_DEADLINE > 0:
+            logger.info(f"运行截止时间: {cls.RUN_DEADLINE} 秒")
+
         # 告警配置日志
         logger.info(f"资源告警天数: {cls.RESOURCE_ALERT_DAYS}")
 
@@ -94,7 +188,11 @@ class Config:
     @classmethod
     def validate_config(cls):
         """验证配置的有效性"""
-        if cls.ENABLE_DATABASE:
+        if cls.ENABLE_DATABASE and cls.DB_BACKEND == 'sqlite':
+            if not cls.SQLITE_PATH:
+                logger.error("SQLite 数据库文件路径未配置")
+                return False
+        elif cls.ENABLE_DATABASE:
             if not all([cls.DB_HOST, cls.DB_USER, cls.DB_PASSWORD, cls.DB_NAME]):
                 logger.error("数据库配置不完整")
                 return False
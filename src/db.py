@@ -1,221 +1,695 @@
-import mysql.connector
-from mysql.connector import pooling
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from src.config import Config
 from datetime import datetime
 from src.logger import logger
+from src.utils import remaining_days_bucket, CERTIFICATE_SERVICE_TYPE
+from src.db_backends import create_backend
+
+RESOURCE_INSERT_SQL = """INSERT INTO resources 
+                    (account_name, resource_name, resource_id, service_type, 
+                    region, expire_time, project_name, remaining_days, run_id) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+BILL_COLUMNS = ('account_name', 'project_name', 'service_type', 'region', 'resource_id', 'resource_name',
+                'line_key', 'amount', 'currency', 'cycle', 'run_id')
+
+# 账单按 (账号, 周期, 账单行) 更新，同一次运行内的多条明细累加，新的运行覆盖旧金额
+BILL_UPSERT_UPDATE = """ON DUPLICATE KEY UPDATE 
+                    amount = CASE WHEN run_id = VALUES(run_id) THEN amount + VALUES(amount) ELSE VALUES(amount) END, 
+                    currency = VALUES(currency), resource_name = VALUES(resource_name), 
+                    run_id = VALUES(run_id)"""
+
+BILL_UPSERT_SQL = f"""INSERT INTO account_bills 
+                    ({', '.join(BILL_COLUMNS)}) 
+                    VALUES ({', '.join(['%s'] * len(BILL_COLUMNS))})
+                    {BILL_UPSERT_UPDATE}"""
+
+# 流式分页明细暂存：同一次运行内按账单行累加，账单查询全部成功后再合并到账单表
+BILL_PENDING_UPSERT_SQL = f"""INSERT INTO account_bills_pending 
+                    ({', '.join(BILL_COLUMNS)}) 
+                    VALUES ({', '.join(['%s'] * len(BILL_COLUMNS))})
+                    ON DUPLICATE KEY UPDATE 
+                    amount = amount + VALUES(amount), currency = VALUES(currency), 
+                    resource_name = VALUES(resource_name)"""
+
+BILL_PENDING_SELECT_SQL = f"""SELECT {', '.join(BILL_COLUMNS)} FROM account_bills_pending 
+                    WHERE run_id = %s AND account_name = %s AND cycle = %s"""
+
+# 账单批量导入的临时表及合并语句
+BILL_STAGING_TABLE_SQL = """CREATE TEMPORARY TABLE account_bills_staging (
+                    account_name VARCHAR(100) NOT NULL,
+                    project_name VARCHAR(100) NOT NULL,
+                    service_type VARCHAR(100) NOT NULL,
+                    region VARCHAR(50) NOT NULL,
+                    resource_id VARCHAR(100) NOT NULL,
+                    resource_name VARCHAR(255) NOT NULL,
+                    line_key CHAR(40) NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    currency VARCHAR(10) NOT NULL,
+                    cycle VARCHAR(7) NOT NULL,
+                    run_id INT NOT NULL
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"""
+
+BILL_STAGING_LOAD_SQL = f"""LOAD DATA LOCAL INFILE %s INTO TABLE account_bills_staging 
+                    CHARACTER SET utf8mb4 
+                    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY '' 
+                    LINES TERMINATED BY '\\n' 
+                    ({', '.join(BILL_COLUMNS)})"""
+
+# 金额变化的账单行需在合并前与账单表比较
+BILL_STAGING_CHANGES_SQL = """INSERT INTO account_bill_changes 
+                    (account_name, cycle, line_key, project_name, service_type, region, resource_name, 
+                    old_amount, new_amount, run_id) 
+                    SELECT s.account_name, s.cycle, s.line_key, MAX(s.project_name), MAX(s.service_type), 
+                    MAX(s.region), MAX(s.resource_name), b.amount, 
+                    IF(b.run_id = s.run_id, b.amount, 0) + SUM(s.amount) AS new_amount, s.run_id 
+                    FROM account_bills_staging s 
+                    LEFT JOIN account_bills b 
+                    ON b.account_name = s.account_name AND b.cycle = s.cycle AND b.line_key = s.line_key 
+                    GROUP BY s.account_name, s.cycle, s.line_key, s.run_id, b.amount, b.run_id 
+                    HAVING b.amount IS NULL OR b.amount <> new_amount 
+                    ON DUPLICATE KEY UPDATE new_amount = VALUES(new_amount)"""
+
+BILL_STAGING_MERGE_SQL = f"""INSERT INTO account_bills 
+                    ({', '.join(BILL_COLUMNS)}) 
+                    SELECT account_name, MAX(project_name), MAX(service_type), MAX(region), MAX(resource_id), 
+                    MAX(resource_name), line_key, SUM(amount), MAX(currency), cycle, run_id 
+                    FROM account_bills_staging 
+                    GROUP BY account_name, cycle, line_key, run_id 
+                    {BILL_UPSERT_UPDATE}"""
+
+# 服务端或客户端禁用 LOCAL INFILE 时的错误码
+LOCAL_INFILE_DISABLED_ERRORS = {1148, 2068, 3948}
+
+BILL_CHANGE_UPSERT_SQL = """INSERT INTO account_bill_changes 
+                    (account_name, cycle, line_key, project_name, service_type, region, resource_name, 
+                    old_amount, new_amount, run_id) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE new_amount = VALUES(new_amount)"""
+
+STORED_CARD_INSERT_SQL = """INSERT INTO stored_cards 
+                    (account_name, card_id, card_name, face_value, balance, 
+                    effective_time, expire_time, run_id) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+RESOURCE_CURRENT_UPSERT_SQL = """INSERT INTO resources_current 
+                    (account_name, resource_name, resource_id, service_type, 
+                    region, expire_time, project_name, remaining_days, remaining_days_bucket, run_id) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE 
+                    resource_name = VALUES(resource_name), service_type = VALUES(service_type), 
+                    region = VALUES(region), expire_time = VALUES(expire_time), 
+                    project_name = VALUES(project_name), remaining_days = VALUES(remaining_days), 
+                    remaining_days_bucket = VALUES(remaining_days_bucket), run_id = VALUES(run_id)"""
+
+STORED_CARD_CURRENT_UPSERT_SQL = """INSERT INTO stored_cards_current 
+                    (account_name, card_id, card_name, face_value, balance, 
+                    effective_time, expire_time, run_id) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE 
+                    card_name = VALUES(card_name), face_value = VALUES(face_value), 
+                    balance = VALUES(balance), effective_time = VALUES(effective_time), 
+                    expire_time = VALUES(expire_time), run_id = VALUES(run_id)"""
+
+def bill_line_key(record):
+    """账单行标识：项目、服务类型、区域和资源（无资源ID时用资源名称）"""
+    resource = record.get('resource_id') or record.get('resource_name') or ''
+    parts = [record['project_name'], record['service_type'], record['region'], resource]
+    return hashlib.sha1('|'.join(str(part or '') for part in parts).encode('utf-8')).hexdigest()
 
 class Database:
-    def __init__(self):
-        # 创建数据库连接池
-        self.connection_pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name="mypool",
-            pool_size=5,
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD
-        )
-        self.create_database()
-        self.import_sql_files()
+    def __init__(self, backend=None):
+        # 存储后端由 DB_BACKEND 配置选择，默认 MySQL
+        self.backend = backend or create_backend()
+        self.backend.prepare()
+        self._local = threading.local()
+        self._run_ids = {}
+        self._run_ids_lock = threading.Lock()
+        self._local_infile_available = Config.DB_LOCAL_INFILE and self.backend.supports_local_infile
 
     def get_connection(self):
-        """获取数据库连接"""
-        connection = self.connection_pool.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(f"USE {Config.DB_NAME}")  # 每次获取连接时选择数据库
-        cursor.close()
-        return connection
+        """获取数据库连接，用完后调用 close() 归还"""
+        return self.backend.get_connection()
 
-    def create_database(self):
-        """创建数据库如果不存在"""
-        connection = self.get_connection()
-        cursor = connection.cursor()
-        try:
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {Config.DB_NAME} DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;")
-            logger.info(f"Database {Config.DB_NAME} checked/created.")
-        except Exception as e:
-            logger.error(f"创建数据库失败: {str(e)}")
-        finally:
-            cursor.close()
+    def _acquire(self):
+        """优先复用当前工作单元的连接"""
+        connection = getattr(self._local, 'connection', None)
+        return connection if connection is not None else self.get_connection()
+
+    def _release(self, connection):
+        """工作单元之外获取的连接用完即归还"""
+        if connection is not getattr(self._local, 'connection', None):
             connection.close()
 
-    def import_sql_files(self):
-        """导入SQL文件以创建表，检查表是否存在并自动导入缺失的表"""
+    @contextmanager
+    def unit_of_work(self):
+        """在当前线程内复用同一个连接，直到退出上下文"""
+        if getattr(self._local, 'connection', None) is not None:
+            yield self._local.connection
+            return
+
         connection = self.get_connection()
-        cursor = connection.cursor()
+        self._local.connection = connection
         try:
-            cursor.execute(f"USE {Config.DB_NAME};")
-            
-            # 定义所有需要的表及其对应的SQL文件
-            required_tables = {
-                'resources': 'sql/create_resources_table.sql',
-                'account_balances': 'sql/create_balances_table.sql',
-                'account_bills': 'sql/create_bills_table.sql',
-                'stored_cards': 'sql/create_stored_cards_table.sql'
-            }
-            
-            # 获取当前数据库中存在的表
-            cursor.execute("SHOW TABLES")
-            existing_tables = {table[0] for table in cursor.fetchall()}
-            
-            # 检查并创建缺失的表
-            for table_name, sql_file in required_tables.items():
-                if table_name not in existing_tables:
-                    logger.info(f"检测到缺失表: {table_name}，正在创建...")
-                    try:
-                        with open(sql_file, 'r', encoding='utf-8') as file:
-                            sql_script = file.read()
-                            for statement in sql_script.split(';'):
-                                if statement.strip():
-                                    cursor.execute(statement)
-                            logger.info(f"表 {table_name} 创建成功")
-                    except Exception as e:
-                        logger.error(f"创建表 {table_name} 失败: {str(e)}")
-                        raise
-                else:
-                    logger.info(f"表 {table_name} 已存在")
-            
-            connection.commit()
-            logger.info("数据库表检查和导入完成")
-            
-        except Exception as e:
-            logger.error(f"数据库表检查和导入失败: {str(e)}")
-            connection.rollback()
-            raise
+            yield connection
         finally:
-            cursor.close()
+            self._local.connection = None
             connection.close()
 
-    def save_resource(self, account_name, resource, batch_number):
-        """保存资源信息到数据库，保留历史记录"""
-        connection = self.get_connection()
-        cursor = connection.cursor()
-        try:
-            # 先检查数据完整性
-            required_fields = ['name', 'id', 'service_type', 'region', 'expire_time', 'project', 'remaining_days']
-            missing_fields = [field for field in required_fields if field not in resource or resource[field] is None]
-            if missing_fields:
-                raise ValueError(f"资源数据缺少必要字段: {missing_fields}")
+    def start_run(self, batch_number, resume_of=None):
+        """记录一次采集运行的开始，返回运行ID"""
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO collection_runs (batch_number, resume_of, status, started_at) VALUES (%s, %s, 'running', %s) "
+                "ON DUPLICATE KEY UPDATE status = 'running', finished_at = NULL",
+                (batch_number, resume_of, datetime.now())
+            )
+            run_id = self._select_run_id(cursor, batch_number)
+        with self._run_ids_lock:
+            self._run_ids[batch_number] = run_id
+        logger.info(f"采集运行 {batch_number} 开始，运行ID {run_id}")
+        return run_id
 
-            sql = """INSERT INTO resources 
-                    (account_name, resource_name, resource_id, service_type, 
-                    region, expire_time, project_name, remaining_days, batch_number) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-            
-            values = (
-                account_name,
-                resource['name'],
-                resource['id'],
-                resource['service_type'],
-                resource['region'],
-                resource['expire_time'].replace('T', ' ').replace('Z', ''),
-                resource['project'],
-                resource['remaining_days'],
-                batch_number
+    def finish_run(self, batch_number, status, account_outcomes):
+        """记录采集运行的结束状态和各账号的查询结果"""
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE collection_runs SET status = %s, account_outcomes = %s, finished_at = %s WHERE batch_number = %s",
+                (status, json.dumps(account_outcomes, ensure_ascii=False), datetime.now(), batch_number)
             )
-            
-            cursor.execute(sql, values)
-            connection.commit()
-            logger.info(f"保存资源信息成功: {account_name} - {resource['name']}")
-        except Exception as e:
-            logger.error(f"保存资源信息失败: {str(e)}")
-            connection.rollback()
-            raise
-        finally:
-            cursor.close()
-            connection.close()
+        logger.info(f"采集运行 {batch_number} 结束，状态 {status}")
+
+    @staticmethod
+    def _select_run_id(cursor, batch_number):
+        cursor.execute("SELECT id FROM collection_runs WHERE batch_number = %s", (batch_number,))
+        return cursor.fetchone()[0]
+
+    def get_run_id(self, batch_number):
+        """批次号对应的运行ID，未登记的批次自动登记"""
+        with self._run_ids_lock:
+            run_id = self._run_ids.get(batch_number)
+        if run_id is not None:
+            return run_id
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO collection_runs (batch_number, status, started_at) VALUES (%s, 'running', %s) "
+                "ON DUPLICATE KEY UPDATE batch_number = VALUES(batch_number)",
+                (batch_number, datetime.now())
+            )
+            run_id = self._select_run_id(cursor, batch_number)
+        with self._run_ids_lock:
+            self._run_ids[batch_number] = run_id
+        return run_id
+
+    def save_resource(self, account_name, resource, batch_number):
+        """保存资源信息到数据库，同时更新当前状态表"""
+        result = self.save_resources_bulk(account_name, [resource], batch_number)
+        if result["errors"]:
+            raise ValueError(result["errors"][0]["error"])
 
     def save_balance(self, account_name, balance, batch_number):
-        """保存余额信息到数据库，保留历史记录"""
-        connection = self.get_connection()
+        """保存余额信息到数据库，保留历史记录，返回写入结果"""
+        run_id = self.get_run_id(batch_number)
+        connection = self._acquire()
         cursor = connection.cursor()
         try:
             sql = """INSERT INTO account_balances 
-                    (account_name, total_amount, currency, batch_number) 
+                    (account_name, total_amount, currency, run_id) 
                     VALUES (%s, %s, %s, %s)"""
             
             values = (
                 account_name,
                 balance.get('total_amount', 0),
                 balance.get('currency', 'CNY'),
-                batch_number
+                run_id
             )
             
             cursor.execute(sql, values)
             connection.commit()
             logger.info(f"保存余额信息成功: {account_name} - {balance.get('total_amount', 0)} {balance.get('currency', 'CNY')}")
+            return {"saved": 1, "errors": []}
         except Exception as e:
             logger.error(f"保存余额信息失败: {str(e)}")
             connection.rollback()
+            return {"saved": 0, "errors": [{"item": None, "error": str(e)}]}
         finally:
             cursor.close()
-            connection.close()
+            self._release(connection)
 
     def save_bill(self, account_name, bill_record, cycle, batch_number):
-        """保存账单信息到数据库"""
-        connection = self.get_connection()
+        """保存账单信息到数据库，同一账单行只保留一条"""
+        self.save_bills_bulk(account_name, [bill_record], cycle, batch_number)
+
+    def save_stored_card(self, account_name, card, batch_number):
+        """保存储值卡信息到数据库，同时更新当前状态表"""
+        self.save_stored_cards_bulk(account_name, [card], batch_number)
+
+    @staticmethod
+    def _resource_values(account_name, resource, run_id):
+        """校验资源数据并转换为插入参数"""
+        required_fields = ['name', 'id', 'service_type', 'region', 'expire_time', 'project', 'remaining_days']
+        missing_fields = [field for field in required_fields if field not in resource or resource[field] is None]
+        if missing_fields:
+            raise ValueError(f"资源数据缺少必要字段: {missing_fields}")
+
+        return (
+            account_name,
+            resource['name'],
+            resource['id'],
+            resource['service_type'],
+            resource['region'],
+            resource['expire_time'].replace('T', ' ').replace('Z', ''),
+            resource['project'],
+            resource['remaining_days'],
+            run_id
+        )
+
+    @staticmethod
+    def _bill_values(account_name, bill_record, cycle, run_id):
+        """将账单记录转换为插入参数"""
+        return (
+            account_name,
+            bill_record['project_name'],
+            bill_record['service_type'],
+            bill_record['region'],
+            bill_record.get('resource_id') or '',
+            bill_record.get('resource_name') or '',
+            bill_line_key(bill_record),
+            bill_record['amount'],
+            bill_record.get('currency', 'CNY'),
+            cycle,
+            run_id
+        )
+
+    @staticmethod
+    def _stored_card_values(account_name, card, run_id):
+        """将储值卡信息转换为插入参数"""
+        return (
+            account_name,
+            card['card_id'],
+            card['card_name'],
+            card['face_value'],
+            card['balance'],
+            card['effective_time'].replace('T', ' ').replace('Z', ''),
+            card['expire_time'].replace('T', ' ').replace('Z', ''),
+            run_id
+        )
+
+    def _build_rows(self, items, to_values, describe):
+        """逐条转换参数，校验失败的记录单独收集，不影响其它记录"""
+        rows = []
+        errors = []
+        for item in items:
+            try:
+                rows.append(to_values(item))
+            except Exception as e:
+                errors.append({"item": describe(item), "error": str(e)})
+        return rows, errors
+
+    @contextmanager
+    def _transaction(self):
+        """在一个事务中执行，异常时回滚"""
+        connection = self._acquire()
         cursor = connection.cursor()
         try:
-            sql = """INSERT INTO account_bills 
-                    (account_name, project_name, service_type, region, amount, currency, cycle, batch_number) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-            
-            values = (
-                account_name,
-                bill_record['project_name'],
-                bill_record['service_type'],
-                bill_record['region'],
-                bill_record['amount'],
-                bill_record.get('currency', 'CNY'),
-                cycle,
-                batch_number
-            )
-            
-            cursor.execute(sql, values)
+            yield cursor
             connection.commit()
-            logger.info(f"保存账单信息成功: {account_name} - {bill_record['service_type']}")
-        except Exception as e:
-            logger.error(f"保存账单信息失败: {str(e)}")
+        except Exception:
             connection.rollback()
+            raise
         finally:
             cursor.close()
-            connection.close()
+            self._release(connection)
+
+    @staticmethod
+    def _executemany_chunked(cursor, sql, rows, chunk_size=None):
+        """按块执行批量语句，返回行数"""
+        chunk_size = chunk_size or Config.DB_BULK_CHUNK_SIZE
+        for start in range(0, len(rows), chunk_size):
+            cursor.executemany(sql, rows[start:start + chunk_size])
+        return len(rows)
+
+    def _insert_many(self, sql, rows):
+        """在一个事务中按块批量插入，返回插入行数"""
+        if not rows:
+            return 0
+        with self._transaction() as cursor:
+            return self._executemany_chunked(cursor, sql, rows)
+
+    def _save_bulk(self, label, account_name, items, to_values, describe, write):
+        """校验并转换记录后调用 write(rows) 写入，返回写入结果和校验失败的记录"""
+        rows, errors = self._build_rows(items, to_values, describe)
+        for error in errors:
+            logger.error(f"{label}数据校验失败: {account_name} - {error['item']}: {error['error']}")
 
-    def save_stored_card(self, account_name, card, batch_number):
-        """保存储值卡信息到数据库"""
-        connection = self.get_connection()
-        cursor = connection.cursor()
         try:
-            sql = """INSERT INTO stored_cards 
-                    (account_name, card_id, card_name, face_value, balance, 
-                    effective_time, expire_time, batch_number) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-            
-            values = (
-                account_name,
-                card['card_id'],
-                card['card_name'],
-                card['face_value'],
-                card['balance'],
-                card['effective_time'].replace('T', ' ').replace('Z', ''),
-                card['expire_time'].replace('T', ' ').replace('Z', ''),
-                batch_number
+            saved = write(rows)
+        except Exception as e:
+            logger.error(f"批量保存{label}失败: {account_name} - {str(e)}")
+            return {"saved": 0, "errors": errors + [{"item": None, "error": str(e)}]}
+
+        logger.info(f"批量保存{label}成功: {account_name} - {saved} 条，校验失败 {len(errors)} 条")
+        return {"saved": saved, "errors": errors}
+
+    @staticmethod
+    def _format_datetime(value):
+        """统一时间为 YYYY-MM-DD HH:MM:SS 字符串便于比较"""
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return str(value)[:19]
+
+    def _write_resources(self, account_name, rows):
+        """更新资源当前状态表，历史表只写入新增或跟踪字段变化的资源"""
+        if not rows:
+            return 0
+        # 当前状态表额外保存剩余天数档位
+        current_rows = [row[:8] + (remaining_days_bucket(row[7]),) + row[8:] for row in rows]
+
+        with self._transaction() as cursor:
+            history_rows = rows
+            if Config.HISTORY_CHANGE_ONLY:
+                cursor.execute(
+                    "SELECT resource_id, expire_time, remaining_days_bucket FROM resources_current WHERE account_name = %s",
+                    (account_name,)
+                )
+                previous = {
+                    resource_id: (self._format_datetime(expire_time), bucket)
+                    for resource_id, expire_time, bucket in cursor.fetchall()
+                }
+                history_rows = [
+                    row for row, current_row in zip(rows, current_rows)
+                    if previous.get(row[2]) != (self._format_datetime(row[5]), current_row[8])
+                ]
+
+            self._executemany_chunked(cursor, RESOURCE_INSERT_SQL, history_rows)
+            self._executemany_chunked(cursor, RESOURCE_CURRENT_UPSERT_SQL, current_rows)
+
+        logger.info(f"资源状态更新: {account_name} - {len(rows)} 条，写入历史 {len(history_rows)} 条")
+        return len(rows)
+
+    def _write_stored_cards(self, account_name, rows):
+        """更新储值卡当前状态表，历史表只写入新增或余额、到期时间变化的储值卡"""
+        if not rows:
+            return 0
+
+        with self._transaction() as cursor:
+            history_rows = rows
+            if Config.HISTORY_CHANGE_ONLY:
+                cursor.execute(
+                    "SELECT card_id, balance, expire_time FROM stored_cards_current WHERE account_name = %s",
+                    (account_name,)
+                )
+                previous = {
+                    card_id: (round(float(balance), 2), self._format_datetime(expire_time))
+                    for card_id, balance, expire_time in cursor.fetchall()
+                }
+                history_rows = [
+                    row for row in rows
+                    if previous.get(row[1]) != (round(float(row[4]), 2), self._format_datetime(row[6]))
+                ]
+
+            self._executemany_chunked(cursor, STORED_CARD_INSERT_SQL, history_rows)
+            self._executemany_chunked(cursor, STORED_CARD_CURRENT_UPSERT_SQL, rows)
+
+        logger.info(f"储值卡状态更新: {account_name} - {len(rows)} 条，写入历史 {len(history_rows)} 条")
+        return len(rows)
+
+    @staticmethod
+    def _merge_bill_lines(rows):
+        """同一账单行的多条明细合并为一行"""
+        lines = {}
+        for row in rows:
+            line = lines.get(row[6])
+            if line is None:
+                lines[row[6]] = list(row)
+            else:
+                line[7] += row[7]
+        return [tuple(line) for line in lines.values()]
+
+    def _upsert_bill_lines(self, cursor, account_name, cycle, run_id, line_rows):
+        """在当前事务中更新账单表，金额变化的账单行记录到 account_bill_changes，返回变化的行数"""
+        previous = {}
+        line_keys = [line[6] for line in line_rows]
+        chunk_size = Config.DB_BULK_CHUNK_SIZE
+        for start in range(0, len(line_keys), chunk_size):
+            chunk = line_keys[start:start + chunk_size]
+            cursor.execute(
+                "SELECT line_key, amount, run_id FROM account_bills "
+                f"WHERE account_name = %s AND cycle = %s AND line_key IN ({', '.join(['%s'] * len(chunk))})",
+                [account_name, cycle] + chunk
             )
-            
-            cursor.execute(sql, values)
-            connection.commit()
-            logger.info(f"保存储值卡信息成功: {account_name} - {card['card_name']}")
+            for line_key, amount, previous_run in cursor.fetchall():
+                previous[line_key] = (float(amount), previous_run)
+
+        changes = []
+        for line in line_rows:
+            # MySQL 读出的金额为 Decimal，统一转为 float 后再累加和比较
+            amount = float(line[7])
+            old = previous.get(line[6])
+            if old is None:
+                old_amount, new_amount = None, amount
+            elif old[1] == run_id:
+                # 本次运行前几页已写入过该账单行
+                old_amount, new_amount = old[0], old[0] + amount
+            else:
+                old_amount, new_amount = old[0], amount
+            if old_amount is None or round(old_amount, 2) != round(new_amount, 2):
+                changes.append((account_name, cycle, line[6], line[1], line[2], line[3], line[5],
+                                old_amount, new_amount, run_id))
+
+        self._executemany_chunked(cursor, BILL_UPSERT_SQL, line_rows)
+        self._executemany_chunked(cursor, BILL_CHANGE_UPSERT_SQL, changes)
+        return len(changes)
+
+    def _write_bills(self, account_name, cycle, run_id, rows):
+        """按账单行更新账单表，金额变化的账单行记录到 account_bill_changes"""
+        if not rows:
+            return 0
+
+        line_rows = self._merge_bill_lines(rows)
+        with self._transaction() as cursor:
+            changed = self._upsert_bill_lines(cursor, account_name, cycle, run_id, line_rows)
+
+        logger.info(f"账单更新: {account_name} {cycle} - {len(line_rows)} 个账单行，变化 {changed} 个")
+        return len(rows)
+
+    def _stage_bills(self, rows):
+        """流式分页明细按账单行累加到暂存表"""
+        if not rows:
+            return 0
+        with self._transaction() as cursor:
+            self._executemany_chunked(cursor, BILL_PENDING_UPSERT_SQL, self._merge_bill_lines(rows))
+        return len(rows)
+
+    def save_resources_bulk(self, account_name, resources, batch_number):
+        """批量保存账号的资源信息，单个事务内更新当前状态表和历史表"""
+        run_id = self.get_run_id(batch_number)
+        return self._save_bulk(
+            "资源信息", account_name, resources,
+            lambda resource: self._resource_values(account_name, resource, run_id),
+            lambda resource: resource.get('name', ''),
+            lambda rows: self._write_resources(account_name, rows)
+        )
+
+    def _prune_current(self, label, account_name, sql, params):
+        """删除当前状态表中本次运行未再出现的行"""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(sql, params)
+                deleted = cursor.rowcount
         except Exception as e:
-            logger.error(f"保存储值卡信息失败: {str(e)}")
-            connection.rollback()
-        finally:
-            cursor.close()
-            connection.close()
+            logger.error(f"清理{label}当前状态失败: {account_name} - {str(e)}")
+            return {"saved": 0, "errors": [{"item": None, "error": str(e)}]}
 
-    def close(self):
-        """关闭数据库连接池"""
+        if deleted:
+            logger.info(f"清理{label}当前状态: {account_name} - 删除本次运行未再出现的 {deleted} 条")
+        return {"saved": 0, "errors": []}
+
+    def prune_resources_current(self, account_name, batch_number, certificates=False):
+        """删除资源当前状态表中本次运行未再出现的资源（已释放或已删除），只在查询成功且写入成功后调用
+
+        资源和SSL证书由不同的查询获取，certificates 为 True 时只处理SSL证书，否则只处理其它资源。
+        """
+        run_id = self.get_run_id(batch_number)
+        operator = '=' if certificates else '<>'
+        return self._prune_current(
+            "SSL证书" if certificates else "资源", account_name,
+            f"DELETE FROM resources_current WHERE account_name = %s AND run_id < %s AND service_type {operator} %s",
+            (account_name, run_id, CERTIFICATE_SERVICE_TYPE)
+        )
+
+    def prune_stored_cards_current(self, account_name, batch_number):
+        """删除储值卡当前状态表中本次运行未再出现的储值卡，只在查询成功且写入成功后调用"""
+        run_id = self.get_run_id(batch_number)
+        return self._prune_current(
+            "储值卡", account_name,
+            "DELETE FROM stored_cards_current WHERE account_name = %s AND run_id < %s",
+            (account_name, run_id)
+        )
+
+    def save_bills_bulk(self, account_name, bill_records, cycle, batch_number):
+        """批量保存账号的账单信息，每个账单行每个周期只保留一行
+
+        同一次运行内多次写入时金额累加，新的运行写入时覆盖原金额。
+        """
+        run_id = self.get_run_id(batch_number)
+        return self._save_bulk(
+            "账单信息", account_name, bill_records,
+            lambda record: self._bill_values(account_name, record, cycle, run_id),
+            lambda record: record.get('service_type', ''),
+            lambda rows: self._write_bills(account_name, cycle, run_id, rows)
+        )
+
+    def stage_bills_bulk(self, account_name, bill_records, cycle, batch_number):
+        """流式汇总模式下暂存一页账单明细，账单查询成功后由 commit_staged_bills 合并到账单表
+
+        分页中途失败时只需丢弃暂存行，账单表中上次完整的金额不受影响。
+        """
+        run_id = self.get_run_id(batch_number)
+        return self._save_bulk(
+            "账单暂存", account_name, bill_records,
+            lambda record: self._bill_values(account_name, record, cycle, run_id),
+            lambda record: record.get('service_type', ''),
+            self._stage_bills
+        )
+
+    def commit_staged_bills(self, account_name, cycle, batch_number):
+        """在一个事务中把本次运行暂存的账单行合并到账单表，并清空账号的暂存行"""
+        run_id = self.get_run_id(batch_number)
         try:
-            self.connection_pool._remove_connections()
-            logger.info("数据库连接池已关闭")
+            with self._transaction() as cursor:
+                cursor.execute(BILL_PENDING_SELECT_SQL, (run_id, account_name, cycle))
+                line_rows = [tuple(row) for row in cursor.fetchall()]
+                changed = self._upsert_bill_lines(cursor, account_name, cycle, run_id, line_rows)
+                # 同时清理更早运行中因进程中断而遗留的暂存行
+                cursor.execute("DELETE FROM account_bills_pending WHERE account_name = %s AND run_id <= %s",
+                               (account_name, run_id))
         except Exception as e:
-            logger.error(f"关闭数据库连接池失败: {str(e)}") 
\ No newline at end of file
+            logger.error(f"合并暂存账单失败: {account_name} {cycle} - {str(e)}")
+            return {"saved": 0, "errors": [{"item": None, "error": str(e)}]}
+
+        logger.info(f"账单更新: {account_name} {cycle} - 合并暂存的 {len(line_rows)} 个账单行，变化 {changed} 个")
+        return {"saved": len(line_rows), "errors": []}
+
+    def discard_staged_bills(self, account_name, batch_number):
+        """账单查询失败时删除本次运行暂存的账单行，账单表保留上次完整的金额"""
+        run_id = self.get_run_id(batch_number)
+        try:
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM account_bills_pending WHERE account_name = %s AND run_id = %s",
+                               (account_name, run_id))
+                discarded = cursor.rowcount
+        except Exception as e:
+            logger.error(f"删除暂存账单失败: {account_name} - {str(e)}")
+            return {"saved": 0, "errors": [{"item": None, "error": str(e)}]}
+
+        if discarded:
+            logger.warning(f"账号 {account_name} 账单查询未完成，丢弃本次运行暂存的 {discarded} 个账单行")
+        return {"saved": 0, "errors": []}
+
+    def load_bills(self, account_name, bill_records, cycle, batch_number):
+        """大批量导入账单，bill_records 可以是生成器
+
+        明细逐条写入临时CSV文件，LOAD DATA LOCAL INFILE 导入临时表后用一条语句合并到账单表。
+        未开启 DB_LOCAL_INFILE 或服务端禁用 LOCAL INFILE 时退回分块批量写入。
+        """
+        if not self._local_infile_available:
+            return self._save_bills_chunked(account_name, bill_records, cycle, batch_number)
+
+        run_id = self.get_run_id(batch_number)
+        errors = []
+        row_count = 0
+        file = tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False)
+        path = file.name
+        try:
+            # 生成器在读取过程中抛出异常时也要删除临时文件
+            with file:
+                writer = csv.writer(file, lineterminator='\n')
+                for record in bill_records:
+                    try:
+                        writer.writerow(self._bill_values(account_name, record, cycle, run_id))
+                        row_count += 1
+                    except Exception as e:
+                        errors.append({"item": record.get('service_type', ''), "error": str(e)})
+
+            for error in errors:
+                logger.error(f"账单信息数据校验失败: {account_name} - {error['item']}: {error['error']}")
+            if not row_count:
+                return {"saved": 0, "errors": errors}
+            try:
+                self._load_bill_file(path)
+            except Exception as e:
+                if getattr(e, 'errno', None) not in LOCAL_INFILE_DISABLED_ERRORS:
+                    logger.error(f"批量导入账单信息失败: {account_name} {cycle} - {str(e)}")
+                    return {"saved": 0, "errors": errors + [{"item": None, "error": str(e)}]}
+                self._local_infile_available = False
+                logger.warning(f"数据库未开启 LOCAL INFILE，改为分块批量写入: {str(e)}")
+                with open(path, 'r', newline='', encoding='utf-8') as saved_file:
+                    records = (self._bill_record_from_row(row) for row in csv.reader(saved_file))
+                    result = self._save_bills_chunked(account_name, records, cycle, batch_number)
+                return {"saved": result["saved"], "errors": errors + result["errors"]}
+        finally:
+            os.remove(path)
+
+        logger.info(f"批量导入账单信息成功: {account_name} {cycle} - {row_count} 条，校验失败 {len(errors)} 条")
+        return {"saved": row_count, "errors": errors}
+
+    def _load_bill_file(self, path):
+        """CSV导入临时表后合并到账单表，并记录金额变化的账单行"""
+        with self._transaction() as cursor:
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS account_bills_staging")
+            cursor.execute(BILL_STAGING_TABLE_SQL)
+            try:
+                cursor.execute(BILL_STAGING_LOAD_SQL, (path,))
+                cursor.execute(BILL_STAGING_CHANGES_SQL)
+                cursor.execute(BILL_STAGING_MERGE_SQL)
+            finally:
+                cursor.execute("DROP TEMPORARY TABLE IF EXISTS account_bills_staging")
+
+    @staticmethod
+    def _bill_record_from_row(row):
+        """CSV行还原为账单记录"""
+        record = dict(zip(BILL_COLUMNS, row))
+        record['amount'] = float(record['amount'])
+        return record
+
+    def _save_bills_chunked(self, account_name, bill_records, cycle, batch_number):
+        """分块调用批量写入，避免一次性读入全部明细"""
+        saved = 0
+        errors = []
+        chunk = []
+        chunk_size = Config.DB_BULK_CHUNK_SIZE * 10
+        for record in bill_records:
+            chunk.append(record)
+            if len(chunk) < chunk_size:
+                continue
+            result = self.save_bills_bulk(account_name, chunk, cycle, batch_number)
+            saved += result["saved"]
+            errors.extend(result["errors"])
+            chunk = []
+        if chunk:
+            result = self.save_bills_bulk(account_name, chunk, cycle, batch_number)
+            saved += result["saved"]
+            errors.extend(result["errors"])
+        return {"saved": saved, "errors": errors}
+
+    def save_stored_cards_bulk(self, account_name, cards, batch_number):
+        """批量保存账号的储值卡信息，单个事务内更新当前状态表和历史表"""
+        run_id = self.get_run_id(batch_number)
+        return self._save_bulk(
+            "储值卡信息", account_name, cards,
+            lambda card: self._stored_card_values(account_name, card, run_id),
+            lambda card: card.get('card_name', ''),
+            lambda rows: self._write_stored_cards(account_name, rows)
+        )
+
+    def close(self):
+        """关闭数据库连接"""
+        self.backend.close()
@@ -0,0 +1,381 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import mysql.connector
+from datetime import datetime
+from functools import lru_cache
+from mysql.connector import errorcode, pooling
+from src.config import Config
+from src.logger import logger
+
+# 表结构版本，表结构变化时递增，用于跳过已校验过的库的启动检查
+SCHEMA_VERSION = 6
+
+# 已有库的升级脚本，文件名以目标版本号开头，如 003_xxx.sql
+MIGRATIONS_DIR = 'sql/migrations'
+
+# MySQL 需要的表及其对应的SQL文件
+REQUIRED_TABLES = {
+    'collection_runs': 'sql/create_collection_runs_table.sql',
+    'resources': 'sql/create_resources_table.sql',
+    'account_balances': 'sql/create_balances_table.sql',
+    'account_bills': 'sql/create_bills_table.sql',
+    'account_bill_changes': 'sql/create_bill_changes_table.sql',
+    'account_bills_pending': 'sql/create_bills_pending_table.sql',
+    'stored_cards': 'sql/create_stored_cards_table.sql',
+    'resources_current': 'sql/create_resources_current_table.sql',
+    'stored_cards_current': 'sql/create_stored_cards_current_table.sql',
+    'daily_account_rollups': 'sql/create_daily_account_rollups_table.sql',
+    'monthly_bill_rollups': 'sql/create_monthly_bill_rollups_table.sql',
+    'schema_version': 'sql/create_schema_version_table.sql'
+}
+
+# SQLite 表结构，所有表都用 CREATE ... IF NOT EXISTS，每次启动执行
+SQLITE_SCHEMA_FILE = 'sql/sqlite/schema.sql'
+
+# SQLite 的 ON CONFLICT 需要指定冲突的唯一键
+SQLITE_UPSERT_KEYS = {
+    'collection_runs': ('batch_number',),
+    'account_bills': ('account_name', 'cycle', 'line_key'),
+    'account_bill_changes': ('run_id', 'account_name', 'cycle', 'line_key'),
+    'account_bills_pending': ('run_id', 'account_name', 'cycle', 'line_key'),
+    'resources_current': ('account_name', 'resource_id'),
+    'stored_cards_current': ('account_name', 'card_id'),
+    'schema_version': ('id',)
+}
+
+_INSERT_TABLE_PATTERN = re.compile(r'INSERT INTO (\w+)')
+_VALUES_FUNCTION_PATTERN = re.compile(r'VALUES\((\w+)\)')
+
+# SQLite 按本地时间字符串保存时间，与 MySQL 的 DATETIME 一致
+sqlite3.register_adapter(datetime, lambda value: value.strftime('%Y-%m-%d %H:%M:%S'))
+
+class StorageBackend:
+    """存储后端接口：负责连接管理和表结构初始化
+
+    Database 中的SQL按 MySQL 语法编写，其它后端在执行前转换为自己的方言。
+    get_connection 返回的连接提供 cursor()/commit()/rollback()/close()，close 表示用完归还。
+    """
+
+    name = None
+    # 是否支持按月分区（数据保留任务依赖）和 LOAD DATA LOCAL INFILE（账单批量导入依赖）
+    supports_partitions = False
+    supports_local_infile = False
+
+    def prepare(self):
+        """建库建表，启动时调用一次"""
+        raise NotImplementedError
+
+    def get_connection(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+class MySQLBackend(StorageBackend):
+    """MySQL 后端：连接池、表结构版本缓存和升级脚本"""
+
+    name = 'mysql'
+    supports_partitions = True
+    supports_local_infile = True
+
+    def __init__(self):
+        self.connection_pool = None
+        self._schema_cache_path = os.path.join(Config.CACHE_DIR, 'schema_version.json')
+        self._schema_cache_key = f"{Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}"
+
+    def prepare(self):
+        # 本地记录的表结构版本与代码一致时跳过建库建表检查
+        if self._cached_schema_version() == SCHEMA_VERSION:
+            logger.info(f"表结构版本 {SCHEMA_VERSION} 已校验，跳过表检查")
+        else:
+            self.verify_schema()
+
+        try:
+            self.connection_pool = self._create_pool()
+        except mysql.connector.Error as e:
+            if e.errno != errorcode.ER_BAD_DB_ERROR:
+                raise
+            # 本地缓存已过期（数据库被删除），重新建库建表
+            logger.warning(f"数据库 {Config.DB_NAME} 不存在，重新校验表结构")
+            self.verify_schema()
+            self.connection_pool = self._create_pool()
+
+    def _create_pool(self):
+        """创建直接连接目标库的连接池"""
+        return mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="mypool",
+            pool_size=Config.DB_POOL_SIZE,
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            allow_local_infile=Config.DB_LOCAL_INFILE
+        )
+
+    def get_connection(self):
+        """获取数据库连接，连接池耗尽时等待其它线程归还，超过 DB_POOL_TIMEOUT 秒仍无空闲连接则抛出 PoolError"""
+        deadline = time.monotonic() + Config.DB_POOL_TIMEOUT
+        while True:
+            try:
+                return self.connection_pool.get_connection()
+            except pooling.PoolError:
+                if time.monotonic() >= deadline:
+                    raise pooling.PoolError(f"等待数据库连接超过 {Config.DB_POOL_TIMEOUT} 秒，连接池已耗尽")
+                time.sleep(0.05)
+
+    def _cached_schema_version(self):
+        """读取本地缓存的表结构版本"""
+        try:
+            with open(self._schema_cache_path, 'r', encoding='utf-8') as file:
+                return json.load(file).get(self._schema_cache_key)
+        except Exception:
+            return None
+
+    def _save_schema_cache(self, version):
+        """记录已校验的表结构版本"""
+        cache = {}
+        try:
+            with open(self._schema_cache_path, 'r', encoding='utf-8') as file:
+                cache = json.load(file)
+        except Exception:
+            pass
+        cache[self._schema_cache_key] = version
+        try:
+            directory = os.path.dirname(self._schema_cache_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self._schema_cache_path, 'w', encoding='utf-8') as file:
+                json.dump(cache, file)
+        except Exception as e:
+            logger.warning(f"写入表结构版本缓存失败: {str(e)}")
+
+    def verify_schema(self):
+        """创建数据库和缺失的表，并记录表结构版本"""
+        connection = mysql.connector.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD
+        )
+        cursor = connection.cursor()
+        try:
+            self.create_database(cursor)
+            cursor.execute(f"USE {Config.DB_NAME}")
+            current_version = self._database_version(cursor)
+            # 已有的库先按版本执行升级脚本，新建的库直接创建最新结构
+            if current_version is not None:
+                self.apply_migrations(connection, cursor, current_version)
+            self.import_sql_files(cursor)
+            self._set_database_version(cursor, SCHEMA_VERSION)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+        self._save_schema_cache(SCHEMA_VERSION)
+
+    @staticmethod
+    def _database_version(cursor):
+        """读取库中记录的表结构版本，空库返回None，没有版本记录的已有库视为版本1"""
+        cursor.execute("SHOW TABLES")
+        existing_tables = {table[0] for table in cursor.fetchall()}
+        if 'schema_version' in existing_tables:
+            cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+        return 1 if existing_tables else None
+
+    @staticmethod
+    def _set_database_version(cursor, version):
+        cursor.execute(
+            "INSERT INTO schema_version (id, version) VALUES (1, %s) "
+            "ON DUPLICATE KEY UPDATE version = VALUES(version)",
+            (version,)
+        )
+
+    @staticmethod
+    def _execute_script(cursor, sql_file):
+        """逐条执行SQL文件中的语句"""
+        with open(sql_file, 'r', encoding='utf-8') as file:
+            sql_script = file.read()
+        for statement in sql_script.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+
+    def apply_migrations(self, connection, cursor, current_version):
+        """按版本顺序执行高于当前版本的升级脚本，每个脚本完成后记录版本"""
+        if not os.path.isdir(MIGRATIONS_DIR):
+            return
+        self._execute_script(cursor, REQUIRED_TABLES['schema_version'])
+        for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+            if not file_name.endswith('.sql'):
+                continue
+            version = int(file_name.split('_', 1)[0])
+            if version <= current_version or version > SCHEMA_VERSION:
+                continue
+            logger.info(f"执行表结构升级: {file_name}")
+            try:
+                self._execute_script(cursor, os.path.join(MIGRATIONS_DIR, file_name))
+                self._set_database_version(cursor, version)
+                connection.commit()
+            except Exception as e:
+                logger.error(f"表结构升级 {file_name} 失败: {str(e)}")
+                raise
+            logger.info(f"表结构已升级到版本 {version}")
+
+    def create_database(self, cursor):
+        """创建数据库如果不存在"""
+        try:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {Config.DB_NAME} DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;")
+            logger.info(f"Database {Config.DB_NAME} checked/created.")
+        except Exception as e:
+            logger.error(f"创建数据库失败: {str(e)}")
+
+    def import_sql_files(self, cursor):
+        """导入SQL文件以创建表，检查表是否存在并自动导入缺失的表"""
+        try:
+            # 获取当前数据库中存在的表
+            cursor.execute("SHOW TABLES")
+            existing_tables = {table[0] for table in cursor.fetchall()}
+            
+            # 检查并创建缺失的表
+            for table_name, sql_file in REQUIRED_TABLES.items():
+                if table_name not in existing_tables:
+                    logger.info(f"检测到缺失表: {table_name}，正在创建...")
+                    try:
+                        self._execute_script(cursor, sql_file)
+                        logger.info(f"表 {table_name} 创建成功")
+                    except Exception as e:
+                        logger.error(f"创建表 {table_name} 失败: {str(e)}")
+                        raise
+                else:
+                    logger.info(f"表 {table_name} 已存在")
+            
+            logger.info("数据库表检查和导入完成")
+            
+        except Exception as e:
+            logger.error(f"数据库表检查和导入失败: {str(e)}")
+            raise
+
+    def close(self):
+        """关闭数据库连接池"""
+        try:
+            self.connection_pool._remove_connections()
+            logger.info("数据库连接池已关闭")
+        except Exception as e:
+            logger.error(f"关闭数据库连接池失败: {str(e)}")
+
+@lru_cache(maxsize=None)
+def translate_sql(sql):
+    """将 MySQL 语句转换为 SQLite 语法：%s 占位符和 ON DUPLICATE KEY UPDATE"""
+    sql = sql.replace('%s', '?')
+    if 'ON DUPLICATE KEY UPDATE' not in sql:
+        return sql
+    table = _INSERT_TABLE_PATTERN.search(sql).group(1)
+    head, assignments = sql.split('ON DUPLICATE KEY UPDATE', 1)
+    assignments = _VALUES_FUNCTION_PATTERN.sub(r'excluded.\1', assignments)
+    return f"{head}ON CONFLICT ({', '.join(SQLITE_UPSERT_KEYS[table])}) DO UPDATE SET{assignments}"
+
+class _SQLiteCursor:
+    """执行前转换SQL语法的游标"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate_sql(sql), params or ())
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(translate_sql(sql), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _SQLiteConnection:
+    """线程内复用的 SQLite 连接，close 只表示用完，不真正关闭"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return _SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        pass
+
+class SQLiteBackend(StorageBackend):
+    """SQLite 后端：单文件数据库，WAL 模式，每个线程一个连接，适合单机部署"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path or Config.SQLITE_PATH
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # 每个连接只在创建它的线程中使用，关闭时由主线程统一关闭
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def prepare(self):
+        """创建数据库文件和缺失的表"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        connection = self._connect()
+        with open(SQLITE_SCHEMA_FILE, 'r', encoding='utf-8') as file:
+            connection.executescript(file.read())
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.commit()
+        self._local.connection = connection
+        logger.info(f"SQLite 数据库 {self.path} 表检查完成")
+
+    def get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return _SQLiteConnection(connection)
+
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.error(f"关闭 SQLite 连接失败: {str(e)}")
+        logger.info("SQLite 数据库连接已关闭")
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend
+}
+
+def create_backend(name=None):
+    """按配置创建存储后端"""
+    name = (name or Config.DB_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的存储后端: {name}，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
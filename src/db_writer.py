@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from src.config import Config
+from src.logger import logger
+
+# 队列结束标记
+_STOP = object()
+
+class AsyncDBWriter:
+    """后台批量写库，与接口采集并行
+
+    提供与 Database 相同的 save_* 方法，调用时只把记录放入有界队列，
+    队列满时调用方阻塞等待（背压）。后台线程按条数或时间间隔攒批后调用
+    Database 的批量写入方法。
+    """
+
+    def __init__(self, db, queue_size=None, batch_size=None, flush_interval=None):
+        self.db = db
+        self.batch_size = batch_size or Config.DB_WRITER_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.DB_WRITER_FLUSH_INTERVAL
+        self._queue = queue.Queue(maxsize=queue_size or Config.DB_WRITER_QUEUE_SIZE)
+        self._buffer = defaultdict(list)
+        self._buffered = 0
+        self._stats = defaultdict(lambda: {"rows": 0, "errors": 0, "flushes": 0, "latencies": []})
+        self._closed = False
+        # 写入失败的 (表, 账号)，用于跳过依赖这些写入的后续操作
+        self._failed = set()
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def _put(self, table, key, rows):
+        # 与 close 互斥：关闭后不再入队，避免记录在结束标记之后被静默丢弃或 put 永久阻塞
+        with self._close_lock:
+            if self._closed:
+                logger.error(f"后台写库已关闭，丢弃 {table} {len(rows)} 条记录: {key}")
+                return
+            for row in rows:
+                self._queue.put((table, key, row))
+
+    def save_resources_bulk(self, account_name, resources, batch_number):
+        """异步保存资源信息"""
+        self._put('resources', (account_name, batch_number), resources)
+
+    def save_balance(self, account_name, balance, batch_number):
+        """异步保存余额信息"""
+        self._put('account_balances', (account_name, batch_number), [balance])
+
+    def save_bills_bulk(self, account_name, bill_records, cycle, batch_number):
+        """异步保存账单信息"""
+        self._put('account_bills', (account_name, cycle, batch_number), bill_records)
+
+    def stage_bills_bulk(self, account_name, bill_records, cycle, batch_number):
+        """异步暂存流式账单明细"""
+        self._put('account_bills_pending', (account_name, cycle, batch_number), bill_records)
+
+    def commit_staged_bills(self, account_name, cycle, batch_number):
+        """暂存明细写入后，异步合并到账单表"""
+        self._put('account_bills_commit', (account_name, cycle, batch_number), [True])
+
+    def discard_staged_bills(self, account_name, batch_number):
+        """暂存明细写入后，异步删除本次运行的暂存行"""
+        self._put('account_bills_discard', (account_name, batch_number), [True])
+
+    def save_stored_cards_bulk(self, account_name, cards, batch_number):
+        """异步保存储值卡信息"""
+        self._put('stored_cards', (account_name, batch_number), cards)
+
+    def prune_resources_current(self, account_name, batch_number, certificates=False):
+        """资源写入后，异步清理本次运行未再出现的资源"""
+        self._put('resources_current_prune', (account_name, batch_number, certificates), [True])
+
+    def prune_stored_cards_current(self, account_name, batch_number):
+        """储值卡写入后，异步清理本次运行未再出现的储值卡"""
+        self._put('stored_cards_current_prune', (account_name, batch_number), [True])
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush()
+                return
+            if item is not None:
+                table, key, row = item
+                self._buffer[(table, key)].append(row)
+                self._buffered += 1
+
+            if self._buffered >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _write(self, table, key, rows):
+        if table == 'resources':
+            account_name, batch_number = key
+            return self.db.save_resources_bulk(account_name, rows, batch_number)
+        if table == 'account_bills':
+            account_name, cycle, batch_number = key
+            return self.db.save_bills_bulk(account_name, rows, cycle, batch_number)
+        if table == 'account_bills_pending':
+            account_name, cycle, batch_number = key
+            return self.db.stage_bills_bulk(account_name, rows, cycle, batch_number)
+        # 缓冲区按首次入队的顺序写入，合并和丢弃排在同一账号已入队的暂存明细之后
+        if table == 'account_bills_commit':
+            account_name, cycle, batch_number = key
+            if ('account_bills_pending', account_name) in self._failed:
+                # 部分分页暂存失败，合并会得到不完整的金额
+                logger.error(f"账号 {account_name} 账单明细暂存失败，丢弃本次运行的暂存行")
+                self.db.discard_staged_bills(account_name, batch_number)
+                return {"saved": 0, "errors": [{"item": None, "error": "账单明细暂存失败"}]}
+            return self.db.commit_staged_bills(account_name, cycle, batch_number)
+        if table == 'account_bills_discard':
+            account_name, batch_number = key
+            return self.db.discard_staged_bills(account_name, batch_number)
+        if table == 'stored_cards':
+            account_name, batch_number = key
+            return self.db.save_stored_cards_bulk(account_name, rows, batch_number)
+        # 当前状态的写入失败时不清理，避免删除未能刷新的行
+        if table == 'resources_current_prune':
+            account_name, batch_number, certificates = key
+            if ('resources', account_name) in self._failed:
+                logger.warning(f"账号 {account_name} 资源写入失败，跳过清理资源当前状态")
+                return {"saved": 0, "errors": []}
+            return self.db.prune_resources_current(account_name, batch_number, certificates)
+        if table == 'stored_cards_current_prune':
+            account_name, batch_number = key
+            if ('stored_cards', account_name) in self._failed:
+                logger.warning(f"账号 {account_name} 储值卡写入失败，跳过清理储值卡当前状态")
+                return {"saved": 0, "errors": []}
+            return self.db.prune_stored_cards_current(account_name, batch_number)
+
+        account_name, batch_number = key
+        results = [self.db.save_balance(account_name, balance, batch_number) for balance in rows]
+        return {
+            "saved": sum(result["saved"] for result in results),
+            "errors": [error for result in results for error in result["errors"]]
+        }
+
+    def _flush(self):
+        """把缓冲区中的记录按表和账号分组写入数据库"""
+        if not self._buffered:
+            return
+        buffer = self._buffer
+        self._buffer = defaultdict(list)
+        self._buffered = 0
+
+        try:
+            with self.db.unit_of_work():
+                for (table, key), rows in buffer.items():
+                    self._write_group(table, key, rows)
+        except Exception as e:
+            # 获取连接失败时丢弃本批数据，后台线程继续消费队列，避免调用方永久阻塞
+            logger.error(f"后台写入获取数据库连接失败: {str(e)}")
+            self._failed.update((table, key[0]) for table, key in buffer)
+
+    def _write_group(self, table, key, rows):
+        start_time = time.monotonic()
+        try:
+            result = self._write(table, key, rows)
+        except Exception as e:
+            logger.error(f"后台写入 {table} 失败: {str(e)}")
+            result = {"saved": 0, "errors": rows}
+            self._failed.add((table, key[0]))
+        else:
+            # 校验失败的单条记录（item 不为空）不影响其它记录，只有整体写入失败才记录
+            if any(error.get("item") is None for error in result["errors"]):
+                self._failed.add((table, key[0]))
+        stats = self._stats[table]
+        stats["rows"] += result["saved"]
+        stats["errors"] += len(result["errors"])
+        stats["flushes"] += 1
+        stats["latencies"].append(time.monotonic() - start_time)
+
+    def failed_writes(self):
+        """写入失败的表，格式为 {账号: {表}}，close 之后调用"""
+        failed = {}
+        for table, account_name in self._failed:
+            failed.setdefault(account_name, set()).add(table)
+        return failed
+
+    def queue_depth(self):
+        """当前队列中等待写入的记录数"""
+        return self._queue.qsize()
+
+    def close(self):
+        """写完队列中剩余的记录后停止后台线程，并输出写入统计，关闭后的写入会被丢弃并记录错误"""
+        with self._close_lock:
+            if self._closed:
+                return dict(self._stats)
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+        for table, stats in self._stats.items():
+            latencies = stats["latencies"]
+            logger.info(f"后台写入 {table}: {stats['rows']} 行，失败 {stats['errors']} 行，{stats['flushes']} 次写入，"
+                        f"平均耗时 {sum(latencies) / len(latencies):.3f} 秒，最大耗时 {max(latencies):.3f} 秒")
+        return dict(self._stats)
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from src.config import Config
+from src.logger import logger
+
+class DomainIdCache:
+    """按AK哈希在本地持久化缓存账号的domain_id，避免每次运行都调用IAM解析"""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.path.join(Config.CACHE_DIR, 'domain_ids.json')
+        self.ttl = Config.DOMAIN_ID_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def _key(ak):
+        # 只保存AK的哈希值，缓存文件中不出现明文AK
+        return hashlib.sha256(ak.encode('utf-8')).hexdigest()
+
+    def _load_locked(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self._entries = json.load(file)
+        except Exception as e:
+            logger.warning(f"读取domain_id缓存失败，将重新解析: {str(e)}")
+
+    def _save_locked(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._entries, file)
+        os.replace(temp_path, self.path)
+
+    def get(self, ak):
+        """获取未过期的domain_id，没有则返回None"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            self._load_locked()
+            entry = self._entries.get(self._key(ak))
+        if not entry or time.time() - entry.get('resolved_at', 0) > self.ttl:
+            return None
+        return entry.get('domain_id')
+
+    def put(self, ak, domain_id):
+        """写入domain_id缓存"""
+        if self.ttl <= 0 or not domain_id:
+            return
+        with self._lock:
+            self._load_locked()
+            self._entries[self._key(ak)] = {
+                'domain_id': domain_id,
+                'resolved_at': time.time()
+            }
+            try:
+                self._save_locked()
+            except Exception as e:
+                logger.warning(f"写入domain_id缓存失败: {str(e)}")
+
+# 全局共享的domain_id缓存
+domain_id_cache = DomainIdCache()
@@ -8,6 +8,13 @@ from src.logger import logger
 
 load_dotenv()
 
+# 告警等级对应的资源样式
+LEVEL_CLASSES = {
+    'high': "warning",
+    'medium': "info",
+    'low': "medium"
+}
+
 class EmailNotification:
     def __init__(self):
         self.smtp_server = os.getenv('SMTP_SERVER')
@@ -17,10 +24,9 @@ class EmailNotification:
         self.smtp_from = os.getenv('SMTP_FROM')
         self.smtp_to = os.getenv('SMTP_TO', '').split(',')
         self.enabled = os.getenv('SMTP_ENABLED', 'false').lower() == 'true'
-        self.alert_days = int(os.getenv('RESOURCE_ALERT_DAYS', '65'))
 
-    def format_all_accounts_message(self, accounts_data):
-        """格式化所有账号的资源、余额和账单信息为HTML邮件内容"""
+    def format_all_accounts_message(self, report):
+        """格式化所有账号的资源、余额和账单信息为HTML邮件内容，report 由 alert_view.build_report 生成"""
         html = f"""
         <html>
         <head>
@@ -130,114 +136,76 @@ class EmailNotification:
         # 1. 余额汇总
         html += "<h2>💳 账户余额汇总</h2>"
         html += "<div class='balance'>"
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            balance = account_data.get('balance')
-            stored_cards = account_data.get('stored_cards')
+        for account in report['accounts']:
+            balance = account['balance']
+            stored_cards = account['stored_cards']
             
             if balance or stored_cards:
-                html += f"<h3>{account_name}</h3>"
+                html += f"<h3>{account['account_name']}</h3>"
                 if balance:
                     html += f"<p><strong>现金余额：</strong>{balance['total_amount']} {balance['currency']}</p>"
                 
-                if stored_cards and stored_cards.get('cards'):
-                    for card in stored_cards['cards']:
-                        html += f"""
-                        <div class='stored-card'>
-                            <p><strong>{card['card_name']}</strong></p>
-                            <p>余额：{card['balance']} CNY</p>
-                            <p>面值：{card['face_value']} CNY</p>
-                            <p>有效期至：{card['expire_time'].replace('T', ' ').replace('Z', '')}</p>
-                        </div>
-                        """
+                for card in stored_cards:
+                    html += f"""
+                    <div class='stored-card'>
+                        <p><strong>{card['card_name']}</strong></p>
+                        <p>余额：{card['balance']} CNY</p>
+                        <p>面值：{card['face_value']} CNY</p>
+                        <p>有效期至：{card['expire_display']}</p>
+                    </div>
+                    """
         html += "</div>"
         
         # 2. 账单汇总
         has_bills = False
         html += "<h2>💰 按需计费账单汇总</h2>"
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            bills = account_data.get('bills')
-            if bills and bills.get('records'):
+        for account in report['accounts']:
+            bill = account['bill']
+            if bill:
                 has_bills = True
                 html += f"<div class='bill'>"
-                html += f"<h3>账号：{account_name}</h3>"
-                html += f"<p><strong>总金额：</strong>{bills['total_amount']} {bills['currency']}</p>"
-                
-                # 按项目分组展示
-                projects = {}
-                for record in bills['records']:
-                    project = record['project_name'] or 'default'
-                    if project not in projects:
-                        projects[project] = []
-                    projects[project].append(record)
+                html += f"<h3>账号：{account['account_name']}</h3>"
+                html += f"<p><strong>总金额：</strong>{bill['total_amount']} {bill['currency']}</p>"
                 
-                for project, records in projects.items():
+                for project, records in bill['projects']:
                     html += f"<div class='bill-project'>"
                     html += f"<h4>项目：{project}</h4>"
                     for record in records:
                         html += f"<div class='bill-record'>"
                         html += f"<p><strong>服务类型：</strong>{record['service_type']}</p>"
                         html += f"<p><strong>区域：</strong>{record['region']}</p>"
-                        html += f"<p><strong>金额：</strong>{record['amount']} {bills['currency']}</p>"
+                        html += f"<p><strong>金额：</strong>{record['amount']} {bill['currency']}</p>"
                         html += "</div>"
                     html += "</div>"
                 html += "</div>"
         
-        # 3. 资源到期提醒
+        # 3. 资源到期提醒，只展示有到期资源的账号
         has_alert = False
         html += "<h2>⚠️ 资源到期提醒</h2>"
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            account_has_alert = False
-            account_html = f"<div class='account'>"
-            account_html += f"<h2>账号：{account_name}</h2>"
+        for account in report['accounts']:
+            if not account['services']:
+                continue
+            has_alert = True
+            html += f"<div class='account'>"
+            html += f"<h2>账号：{account['account_name']}</h2>"
+            html += "<h3>资源信息</h3>"
             
-            # 添加资源信息
-            if account_data.get('resources'):
-                account_html += "<h3>资源信息</h3>"
-                resources_html = ""
-                
-                for service_type, resources in account_data['resources'].items():
-                    service_html = f"<div class='service'>"
-                    service_html += f"<h4>{service_type}</h4>"
-                    service_has_resources = False
-                    
-                    for resource in resources:
-                        expire_time = resource['expire_time'].replace('T', ' ').replace('Z', '')
-                        remaining_days = resource['remaining_days']
-                        
-                        if remaining_days <= self.alert_days:
-                            has_alert = True
-                            account_has_alert = True
-                            service_has_resources = True
-                            
-                            if remaining_days <= 15:
-                                resource_class = "warning"
-                            elif remaining_days <= 30:
-                                resource_class = "info"
-                            else:
-                                resource_class = "medium"
-                                
-                            service_html += f"""
-                            <div class='resource {resource_class}'>
-                                <p><strong>名称：</strong>{resource['name']}</p>
-                                <p><strong>区域：</strong>{resource['region']}</p>
-                                <p><strong>到期时间：</strong>{expire_time}</p>
-                                <p><strong>剩余天数：</strong><span class='days'>{remaining_days}天</span></p>
-                            """
-                            if resource['project']:
-                                service_html += f"<p><strong>企业项目：</strong>{resource['project']}</p>"
-                            service_html += "</div>"
-                    
-                    service_html += "</div>"
-                    if service_has_resources:
-                        resources_html += service_html
-                
-                # 只有当账号有告警资源时才添加到HTML中
-                if account_has_alert:
-                    account_html += resources_html
-                    html += account_html + "</div>"
+            for service_type, resources in account['services']:
+                html += f"<div class='service'>"
+                html += f"<h4>{service_type}</h4>"
+                for resource in resources:
+                    html += f"""
+                    <div class='resource {LEVEL_CLASSES[resource['level']]}'>
+                        <p><strong>名称：</strong>{resource['name']}</p>
+                        <p><strong>区域：</strong>{resource['region']}</p>
+                        <p><strong>到期时间：</strong>{resource['expire_display']}</p>
+                        <p><strong>剩余天数：</strong><span class='days'>{resource['remaining_days']}天</span></p>
+                    """
+                    if resource['project']:
+                        html += f"<p><strong>企业项目：</strong>{resource['project']}</p>"
+                    html += "</div>"
+                html += "</div>"
+            html += "</div>"
         
         html += """
             </body>
@@ -0,0 +1,45 @@
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from src.config import Config
+
+class WebhookSessions:
+    """按 webhook 主机复用 requests.Session，保持长连接，避免每条消息重新建立TLS连接"""
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.pool_size = pool_size or Config.NOTIFY_MAX_WORKERS
+        self.timeout = (
+            connect_timeout or Config.WEBHOOK_CONNECT_TIMEOUT,
+            read_timeout or Config.WEBHOOK_READ_TIMEOUT
+        )
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _get_session(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # 连接池大小与通知并发数一致，并发发送时不丢弃连接
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def post(self, url, **kwargs):
+        """发送POST请求，未指定 timeout 时使用默认的连接/读取超时"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self._get_session(url).post(url, **kwargs)
+
+    def close(self):
+        """关闭所有会话"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+# 全局共享的 webhook 会话
+webhook_sessions = WebhookSessions()
@@ -0,0 +1,132 @@
+import re
+
+# 企业微信 markdown 消息内容上限（UTF-8字节）
+WEWORK_MAX_BYTES = 4096
+
+# 段落边界：空行，或标题行之前
+_BLOCK_BOUNDARY = re.compile(r'\n(?:\s*\n)+|\n(?=#)')
+
+def utf8_len(text):
+    """文本按UTF-8编码后的字节数"""
+    return len(text.encode('utf-8'))
+
+def _split_bytes(text, max_bytes):
+    """按字节数切分单行超长文本，不切断多字节字符"""
+    chunks = []
+    encoded = text.encode('utf-8')
+    while encoded:
+        cut = min(max_bytes, len(encoded))
+        # UTF-8 后续字节形如 10xxxxxx，向前退到字符起点
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return chunks
+
+def _split_block(block, max_bytes):
+    """超长段落按行切分，单行仍超长时按字节切分"""
+    pieces = []
+    for line in block.split('\n'):
+        if utf8_len(line) <= max_bytes:
+            pieces.append(line)
+        else:
+            pieces.extend(_split_bytes(line, max_bytes))
+    return _join_greedy(pieces, max_bytes, '\n')
+
+def _join_greedy(pieces, max_bytes, separator):
+    """按顺序把片段合并为不超过 max_bytes 的消息"""
+    messages = []
+    current = None
+    for piece in pieces:
+        if current is not None and utf8_len(current) + utf8_len(separator) + utf8_len(piece) <= max_bytes:
+            current = f"{current}{separator}{piece}"
+            continue
+        if current is not None:
+            messages.append(current)
+        current = piece
+    if current is not None:
+        messages.append(current)
+    return messages
+
+def split_message(content, max_bytes=WEWORK_MAX_BYTES):
+    """在段落（资源、标题）边界处把长消息拆为多条，每条不超过 max_bytes 字节"""
+    if not content:
+        return []
+    if utf8_len(content) <= max_bytes:
+        return [content]
+
+    blocks = []
+    for block in _BLOCK_BOUNDARY.split(content):
+        if not block.strip():
+            continue
+        if utf8_len(block) <= max_bytes:
+            blocks.append(block)
+        else:
+            blocks.extend(_split_block(block, max_bytes))
+    return _join_greedy(blocks, max_bytes, '\n\n')
+
+def join_section(heading, groups, separator='\n\n'):
+    """拼接分组段落: heading 为段落标题，groups 为 [(分组标题, [条目])]，条目之间用 separator 分隔"""
+    blocks = [
+        f"{group_heading}\n{separator.join(items)}" if group_heading else separator.join(items)
+        for group_heading, items in groups if items
+    ]
+    return f"{heading}\n{separator.join(blocks)}"
+
+def split_section(heading, groups, max_bytes=WEWORK_MAX_BYTES, separator='\n\n'):
+    """把一个分组段落（如一个账号的到期资源）拆为不超过 max_bytes 的若干部分
+
+    只在条目之间拆分，单个条目不会被切开（单个条目本身超长时才按字节切分）；
+    每个续写部分都重复段落标题和当前分组标题，保证每条消息可以单独阅读。
+    """
+    parts = []
+    current = []
+    for group_heading, items in groups:
+        for item in items:
+            if current and current[-1][0] == group_heading:
+                candidate = current[:-1] + [(group_heading, current[-1][1] + [item])]
+            else:
+                candidate = current + [(group_heading, [item])]
+            if not current or utf8_len(join_section(heading, candidate, separator)) <= max_bytes:
+                current = candidate
+                continue
+            parts.append(join_section(heading, current, separator))
+            current = [(group_heading, [item])]
+    if current:
+        parts.append(join_section(heading, current, separator))
+
+    # 单个条目加上标题仍超长时才按字节切分
+    return [piece for part in parts for piece in ([part] if utf8_len(part) <= max_bytes else split_message(part, max_bytes))]
+
+def pack_section_batches(sections, max_bytes=WEWORK_MAX_BYTES, header=None, separator='\n\n'):
+    """把多个段落按顺序合并到尽量少的消息中，并按段落划分为可以并行发送的批次
+
+    sections 为 [[段落部分]]，通常由 split_section 生成；按原有顺序依次装入当前消息，
+    装不下时开始新消息，同一段落的各部分保持连续和原有顺序。
+    header 为每条消息开头的标题。
+    返回 [[消息]]：同一段落跨越多条消息时这些消息在同一批次中，批次内需按顺序发送，
+    不同批次之间没有顺序要求。
+    """
+    prefix = f"{header}{separator}" if header else ""
+    batches = []
+    current = None
+    for parts in sections:
+        for index, part in enumerate(parts or []):
+            if current is not None and utf8_len(prefix + current + separator + part) <= max_bytes:
+                current = f"{current}{separator}{part}"
+                continue
+            if current is not None:
+                batches[-1].append(prefix + current)
+                # 段落从下一条消息开头开始时，新消息可以单独成批
+                if index == 0:
+                    batches.append([])
+            elif not batches:
+                batches.append([])
+            current = part
+    if current is not None:
+        batches[-1].append(prefix + current)
+    return [batch for batch in batches if batch]
+
+def pack_sections(sections, max_bytes=WEWORK_MAX_BYTES, header=None, separator='\n\n'):
+    """把多个段落按顺序合并到尽量少的消息中，返回全部消息（见 pack_section_batches）"""
+    return [message for batch in pack_section_batches(sections, max_bytes, header, separator) for message in batch]
@@ -1,19 +1,30 @@
-import os
-import json
-import requests
-from datetime import datetime
 from dotenv import load_dotenv
 from src.config import Config
 from src.logger import logger
+from src.http_session import webhook_sessions
+from src.notification_queue import notification_batch_tasks
+from src.message_packer import WEWORK_MAX_BYTES, utf8_len, split_message, join_section, split_section, pack_section_batches
+
+# 资源到期提醒标题，合并发送时每条消息只出现一次
+RESOURCE_MESSAGE_TITLE = "## 📢 华为云资源到期提醒"
+
+# 告警等级对应的字体颜色
+LEVEL_COLORS = {
+    'high': "warning",  # 橙红色
+    'medium': "info",  # 绿色
+    'low': "comment"  # 灰色
+}
 
 load_dotenv()
 
 
 class WeworkBot:
-    def __init__(self, name, webhook_url=None, enabled=True):
+    def __init__(self, name, webhook_url=None, enabled=True, rate_per_minute=None):
         self.name = name
         self.webhook_url = webhook_url or Config.WECHAT_BOT1_WEBHOOK
         self.enabled = enabled
+        # 企业微信机器人每分钟最多发送的消息数
+        self.rate_per_minute = rate_per_minute or Config.WEWORK_RATE_LIMIT
 
     def send_message(self, message, message_type='通知', **kwargs):
         """发送消息到企业微信机器人"""
@@ -21,11 +32,12 @@ class WeworkBot:
             return False
 
         try:
-            response = requests.post(
+            response = webhook_sessions.post(
                 self.webhook_url,
                 json={"msgtype": "markdown", "markdown": {"content": message}}
             )
-            if response.status_code == 200:
+            # 被限流等错误时企业微信同样返回200，需检查 errcode
+            if response.status_code == 200 and response.json().get('errcode', 0) == 0:
                 logger.info(f"企业微信{message_type}消息发送成功 (机器人: {self.name})")
                 return True
             else:
@@ -37,11 +49,12 @@ class WeworkBot:
 
 
 class WeworkNotification:
+    channel = '企业微信'
+
     def __init__(self):
         self.enabled = Config.WEWORK_ENABLED
         self.send_to_all = Config.WEWORK_SEND_TO_ALL
         self.default_bot = Config.WEWORK_DEFAULT_BOT
-        self.alert_days = Config.RESOURCE_ALERT_DAYS
         
         # 初始化机器人
         self.bots = {}
@@ -74,156 +87,148 @@ class WeworkNotification:
 
         success = False
         for bot in bots_to_use:
-            try:
-                response = requests.post(
-                    bot.webhook_url,
-                    json={"msgtype": "markdown", "markdown": {"content": message}}
-                )
-                if response.status_code == 200:
-                    logger.info(f"企业微信消息发送成功 (机器人: {bot.name})")
-                    success = True
-                else:
-                    logger.error(f"企业微信消息发送失败 (机器人: {bot.name}): {response.text}")
-            except Exception as e:
-                logger.error(f"企业微信消息发送异常 (机器人: {bot.name}): {str(e)}")
+            if bot.send_message(message):
+                success = True
 
         return success
 
-    def format_balance_message(self, accounts_data):
-        """格式化所有账号的余额信息为markdown消息"""
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def format_balance_message(self, report):
+        """格式化所有账号的余额信息为markdown消息，report 由 alert_view.build_report 生成"""
         message = [
             f"## 💰 华为云账户余额汇总",
-            f"生成时间：{current_time}\n"
+            f"生成时间：{report['generated_at']}\n"
         ]
         
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            balance = account_data.get('balance')
-            stored_cards = account_data.get('stored_cards')
+        for account in report['accounts']:
+            balance = account['balance']
+            stored_cards = account['stored_cards']
             
             if balance or stored_cards:
-                message.append(f"### 账号：{account_name}")
+                message.append(f"### 账号：{account['account_name']}")
                 if balance:
                     message.append(f"> **现金余额**：{balance['total_amount']} {balance['currency']}")
                 
-                if stored_cards and stored_cards.get('cards'):
-                    for card in stored_cards['cards']:
-                        message.append(f"> - {card['card_name']}：余额 {card['balance']} CNY (面值 {card['face_value']} CNY，有效期至 {card['expire_time'].replace('T', ' ').replace('Z', '')})")
+                for card in stored_cards:
+                    message.append(f"> - {card['card_name']}：余额 {card['balance']} CNY (面值 {card['face_value']} CNY，有效期至 {card['expire_display']})")
                 message.append("")
         
         return "\n".join(message)
 
-    def format_resource_message(self, account_name, services):
+    def format_resource_message(self, account):
         """格式化单个账号的资源信息为markdown消息"""
-        message = [
-            f"## 📢 华为云资源到期提醒",
-            f"### 账号：<font color='info'>{account_name}</font>"
-        ]
-        
-        has_alert = False
-        for service_type, resources in services.items():
-            service_resources = []
+        section = self.format_resource_section(account)
+        if not section:
+            return None
+        return f"{RESOURCE_MESSAGE_TITLE}\n{section}"
+
+    def format_resource_section(self, account):
+        """格式化单个账号的到期资源为markdown段落（不含标题），没有需提醒的资源时返回None"""
+        if not account['services']:
+            return None
+        return join_section(*self._resource_groups(account))
+
+    def resource_section_parts(self, account, max_bytes):
+        """单个账号的到期资源按资源边界拆为不超过 max_bytes 的段落，每部分都带账号和服务类型标题"""
+        if not account['services']:
+            return []
+        return split_section(*self._resource_groups(account), max_bytes)
+
+    def resource_messages(self, accounts):
+        """各账号的到期资源按顺序合并为尽量少的消息，每条消息不超过4096字节"""
+        return [message for batch in self.resource_message_batches(accounts) for message in batch]
+
+    def resource_message_batches(self, accounts):
+        """各账号的到期资源合并后的消息按账号划分批次，同一账号跨多条消息时在同一批次中"""
+        capacity = WEWORK_MAX_BYTES - utf8_len(f"{RESOURCE_MESSAGE_TITLE}\n\n")
+        sections = [self.resource_section_parts(account, capacity) for account in accounts]
+        return pack_section_batches(sections, WEWORK_MAX_BYTES, header=RESOURCE_MESSAGE_TITLE)
+
+    def _resource_groups(self, account):
+        """账号标题及按服务类型分组的资源条目"""
+        heading = f"### 账号：<font color='info'>{account['account_name']}</font>"
+        groups = []
+        for service_type, resources in account['services']:
+            items = []
             for resource in resources:
-                expire_time = resource['expire_time'].replace('T', ' ').replace('Z', '')
-                remaining_days = resource['remaining_days']
+                resource_info = [
+                    f"**名称**：{resource['name']}",
+                    f"**区域**：{resource['region']}",
+                    f"**到期时间**：{resource['expire_display']}",
+                    f"**剩余天数**：<font color='{LEVEL_COLORS[resource['level']]}'>{resource['remaining_days']}天</font>"
+                ]
                 
-                if remaining_days <= self.alert_days:
-                    has_alert = True
-                    if remaining_days <= 15:
-                        days_color = "warning"  # 橙红色
-                    elif remaining_days <= 30:
-                        days_color = "info"  # 绿色
-                    else:
-                        days_color = "comment"    # 灰色
-                           
-                    resource_info = [
-                        f"**名称**：{resource['name']}",
-                        f"**区域**：{resource['region']}",
-                        f"**到期时间**：{expire_time}",
-                        f"**剩余天数**：<font color='{days_color}'>{remaining_days}天</font>"
-                    ]
+                if resource['project']:
+                    resource_info.append(f"**企业项目**：{resource['project']}")
                     
-                    if resource['project']:
-                        resource_info.append(f"**企业项目**：{resource['project']}")
-                        
-                    service_resources.append("> " + "\n> ".join(resource_info) + "\n")
-            
-            if service_resources:
-                message.append(f"### {service_type}")
-                message.extend(service_resources)
-        
-        if not has_alert:
-            message.append(f"\n> 没有 {self.alert_days} 天内到期的资源")
-            return None
-        
-        return "\n".join(message) 
+                items.append("> " + "\n> ".join(resource_info))
+            groups.append((f"### {service_type}", items))
+        return heading, groups
 
-    def send_long_message(self, content, account_index=None, max_length=4096):
-        """将长消息分段发送"""
+    def send_long_message(self, content, bot_name=None, max_bytes=WEWORK_MAX_BYTES):
+        """将长消息在段落边界处按UTF-8字节数分段发送"""
         if not self.enabled:
-            print("企业微信通知未启用")
+            logger.info("企业微信通知未启用")
             return False
 
         if not content:
             return False
 
-        # 分段发送消息
-        parts = [content[i:i+max_length] for i in range(0, len(content), max_length)]
-        for part in parts:
-            self.send_message(part, account_index) 
+        success = True
+        for part in split_message(content, max_bytes):
+            success = self.send_message(part, bot_name) and success
+        return success
 
-    def send_balance_notification(self, accounts_data):
+    def send_balance_notification(self, report):
         """发送余额信息通知"""
-        balance_message = self.format_balance_message(accounts_data)
-        if balance_message:
+        for balance_message in split_message(self.format_balance_message(report)):
             for bot in self.bots.values():
                 bot.send_message(balance_message, message_type='余额')
 
-    def send_resource_notification(self, account_name, resources):
-        """发送资源信息通知"""
-        resource_message = self.format_resource_message(account_name, resources)
-        if resource_message:
+    def send_resource_notification(self, account):
+        """发送单个账号的资源信息通知"""
+        for resource_message in self.resource_messages([account]):
             for bot in self.bots.values():
-                bot.send_message(resource_message, message_type='资源') 
+                bot.send_message(resource_message, message_type='资源')
 
-    def format_bill_message(self, accounts_data):
+    def format_bill_message(self, report):
         """格式化所有账号的账单信息为markdown消息"""
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         message = [
             f"## 💰 华为云按需计费账单汇总",
-            f"生成时间：{current_time}\n"
+            f"生成时间：{report['generated_at']}\n"
         ]
         
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            bills = account_data.get('bills')
-            if bills and bills.get('records'):
-                message.append(f"### 账号：{account_name}")
-                message.append(f"> **总金额**：{bills['total_amount']} {bills['currency']}\n")
-                
-                # 按项目分组展示
-                projects = {}
-                for record in bills['records']:
-                    project = record['project_name'] or 'default'
-                    if project not in projects:
-                        projects[project] = []
-                    projects[project].append(record)
+        for account in report['accounts']:
+            bill = account['bill']
+            if bill:
+                message.append(f"### 账号：{account['account_name']}")
+                message.append(f"> **总金额**：{bill['total_amount']} {bill['currency']}\n")
                 
-                for project, records in projects.items():
+                for project, records in bill['projects']:
                     message.append(f"#### 项目：{project}")
                     for record in records:
                         message.extend([
                             f"> **服务类型**：{record['service_type']}",
                             f"> **区域**：{record['region']}",
-                            f"> **金额**：{record['amount']} {bills['currency']}\n"
+                            f"> **金额**：{record['amount']} {bill['currency']}\n"
                         ])
         
         return "\n".join(message)
 
-    def send_bill_notification(self, accounts_data):
+    def send_bill_notification(self, report):
         """发送账单信息通知"""
-        bill_message = self.format_bill_message(accounts_data)
-        if bill_message:
+        for bill_message in split_message(self.format_bill_message(report)):
             for bot in self.bots.values():
-                bot.send_message(bill_message, message_type='账单') 
\ No newline at end of file
+                bot.send_message(bill_message, message_type='账单')
+
+    def notification_tasks(self, report):
+        """生成余额、账单和资源通知的发送任务，每个任务按顺序向一个机器人发送一批消息
+
+        超过4096字节的消息在段落边界处拆分，各账号的资源提醒合并到尽量少的消息中。
+        余额、账单和各账号的资源提醒分别成批，不同批次并行发送。
+        """
+        batches = (
+            [[('余额', message) for message in split_message(self.format_balance_message(report))],
+             [('账单', message) for message in split_message(self.format_bill_message(report))]] +
+            [[('资源', message) for message in batch] for batch in self.resource_message_batches(report['accounts'])]
+        )
+        return notification_batch_tasks('企业微信', self.channel, self.bots.values(), batches)
@@ -0,0 +1,28 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.config import Config
+from src.logger import logger
+
+def dispatch_notifications(tasks, max_workers=None):
+    """并发执行通知发送任务，返回成功的任务数
+
+    tasks 为 [(描述, 无参函数)]，每个任务向一个机器人按顺序发送一批消息（或发送一封邮件），
+    不同渠道、机器人和批次之间互不等待，同一机器人的发送速率由其发送队列限制。
+    """
+    if not tasks:
+        return 0
+    max_workers = max_workers or Config.NOTIFY_MAX_WORKERS
+    start_time = time.monotonic()
+
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix="notify") as executor:
+        futures = {executor.submit(send): description for description, send in tasks}
+        for future in as_completed(futures):
+            try:
+                if future.result() is not False:
+                    succeeded += 1
+            except Exception as e:
+                logger.error(f"{futures[future]}发送异常: {str(e)}")
+
+    logger.info(f"通知发送完成: {succeeded}/{len(tasks)} 个任务成功，耗时 {time.monotonic() - start_time:.2f} 秒")
+    return succeeded
@@ -0,0 +1,285 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from functools import partial
+from src.config import Config
+from src.logger import logger
+from src.rate_limiter import TokenBucket
+
+# 队列结束标记
+_STOP = object()
+
+class NotificationSpool:
+    """发送失败的消息落盘（JSONL），下次运行时重新投递"""
+
+    def __init__(self, path=None, max_messages=None, max_age=None):
+        self.path = path or os.path.join(Config.CACHE_DIR, 'notification_spool.jsonl')
+        self.max_messages = Config.NOTIFY_SPOOL_MAX_MESSAGES if max_messages is None else max_messages
+        self.max_age = Config.NOTIFY_SPOOL_MAX_AGE if max_age is None else max_age
+        self._lock = threading.Lock()
+
+    def _count_locked(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return sum(1 for line in file if line.strip())
+
+    def append(self, channel, bot_name, message, message_type):
+        """写入一条消息，超过容量时返回False"""
+        entry = {
+            "channel": channel,
+            "bot": bot_name,
+            "message": message,
+            "message_type": message_type,
+            "spooled_at": time.time()
+        }
+        with self._lock:
+            try:
+                if self._count_locked() >= self.max_messages:
+                    return False
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                return True
+            except Exception as e:
+                logger.error(f"写入通知重试队列文件失败: {str(e)}")
+                return False
+
+    def drain(self):
+        """取出全部未过期的消息并清空文件"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            temp_path = f"{self.path}.draining"
+            os.replace(self.path, temp_path)
+            entries = []
+            expired = 0
+            with open(temp_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if self.max_age > 0 and time.time() - entry.get("spooled_at", 0) > self.max_age:
+                        expired += 1
+                        continue
+                    entries.append(entry)
+            os.remove(temp_path)
+        if expired:
+            logger.warning(f"通知重试队列中有 {expired} 条消息超过 {self.max_age} 秒，已丢弃")
+        return entries
+
+class _Delivery:
+    """一条待发送的消息，发送完成或落盘后通知等待方"""
+
+    def __init__(self, message, message_type):
+        self.message = message
+        self.message_type = message_type
+        self.delivered = False
+        self.done = threading.Event()
+
+class OutboundQueue:
+    """单个机器人的发送队列：令牌桶限速，失败按指数退避重试，仍失败的消息落盘
+
+    令牌桶容量为 burst，补充速率为 (rate_per_minute - burst) / 60，
+    任意60秒内发送的消息数不超过 rate_per_minute。
+    队列中的每一项是一批消息，由一个发送线程按顺序发送；多个发送线程共用令牌桶，
+    不同批次（如不同账号的消息）并行发送，某一批次重试等待时不阻塞其它批次。
+    """
+
+    def __init__(self, channel, bot, spool, rate_per_minute, burst=None, queue_size=None,
+                 max_retries=None, base_delay=None, workers=None):
+        self.channel = channel
+        self.bot = bot
+        self.spool = spool
+        burst = max(1, min(burst or Config.NOTIFY_BURST, rate_per_minute - 1))
+        self._bucket = TokenBucket(max(1, rate_per_minute - burst) / 60, capacity=burst)
+        self.max_retries = Config.NOTIFY_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay or Config.NOTIFY_RETRY_BASE_DELAY
+        self.max_delay = 60
+        self._queue = queue.Queue(maxsize=queue_size or Config.NOTIFY_QUEUE_SIZE)
+        self._stats = {"sent": 0, "retries": 0, "spooled": 0, "dropped": 0}
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"notify-{channel}-{bot.name}-{index}", daemon=True)
+            for index in range(max(1, workers or Config.NOTIFY_QUEUE_WORKERS))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def submit(self, message, message_type='通知'):
+        """放入发送队列，队列已满时直接落盘"""
+        return self.submit_batch([(message, message_type)])[0]
+
+    def submit_batch(self, messages):
+        """把一批消息作为一项放入发送队列，批次内按顺序发送，队列已满时整批落盘"""
+        deliveries = [_Delivery(message, message_type) for message, message_type in messages]
+        try:
+            self._queue.put_nowait(deliveries)
+        except queue.Full:
+            logger.warning(f"{self.channel}机器人 {self.bot.name} 发送队列已满")
+            for delivery in deliveries:
+                self._spool(delivery)
+        return deliveries
+
+    def send(self, message, message_type='通知'):
+        """放入发送队列并等待结果，返回是否发送成功"""
+        delivery = self.submit(message, message_type)
+        delivery.done.wait()
+        return delivery.delivered
+
+    def send_all(self, messages):
+        """作为一批放入发送队列并等待全部结果，messages 为 [(消息, 消息类型)]，全部发送成功时返回True
+
+        同一批次由一个发送线程按顺序发送，多段消息按原有顺序到达。
+        """
+        deliveries = self.submit_batch(messages)
+        for delivery in deliveries:
+            delivery.done.wait()
+        return all(delivery.delivered for delivery in deliveries)
+
+    def _spool(self, delivery):
+        if self.spool.append(self.channel, self.bot.name, delivery.message, delivery.message_type):
+            self._count("spooled")
+        else:
+            self._count("dropped")
+            logger.error(f"{self.channel}机器人 {self.bot.name} {delivery.message_type}消息已丢弃: 重试队列文件已满或不可写")
+        delivery.done.set()
+
+    def _run(self):
+        while True:
+            deliveries = self._queue.get()
+            if deliveries is _STOP:
+                return
+            for delivery in deliveries:
+                self._deliver(delivery)
+
+    def _deliver(self, delivery):
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            try:
+                delivered = self.bot.send_message(delivery.message, message_type=delivery.message_type)
+            except Exception as e:
+                logger.error(f"{self.channel}机器人 {self.bot.name} 发送异常: {str(e)}")
+                delivered = False
+            if delivered:
+                self._count("sent")
+                delivery.delivered = True
+                delivery.done.set()
+                return
+            if attempt >= self.max_retries:
+                self._spool(delivery)
+                return
+            attempt += 1
+            self._count("retries")
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            logger.warning(f"{self.channel}机器人 {self.bot.name} {delivery.message_type}消息发送失败，"
+                           f"{delay:.2f} 秒后第 {attempt} 次重试")
+            time.sleep(delay)
+
+    def depth(self):
+        """队列中等待发送的消息数"""
+        with self._queue.mutex:
+            return sum(len(deliveries) for deliveries in self._queue.queue if deliveries is not _STOP)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, depth=self.depth())
+
+    def close(self):
+        """发送完队列中剩余的消息后停止后台线程"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+class NotificationOutbox:
+    """管理各机器人的发送队列，以及发送失败消息的落盘与重新投递"""
+
+    def __init__(self, spool=None):
+        self.spool = spool or NotificationSpool()
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def queue_for(self, channel, bot):
+        """获取机器人的发送队列，不存在时按机器人的每分钟限额创建"""
+        key = (channel, bot.name)
+        with self._lock:
+            outbound = self._queues.get(key)
+            if outbound is None:
+                outbound = self._queues[key] = OutboundQueue(channel, bot, self.spool, bot.rate_per_minute)
+            return outbound
+
+    def send(self, channel, bot, message, message_type='通知'):
+        """通过机器人的发送队列发送消息，等待发送成功或落盘"""
+        return self.queue_for(channel, bot).send(message, message_type)
+
+    def send_all(self, channel, bot, messages):
+        """通过机器人的发送队列按顺序发送一批消息，messages 为 [(消息, 消息类型)]"""
+        return self.queue_for(channel, bot).send_all(messages)
+
+    def redeliver_spooled(self, bots):
+        """把上次运行落盘的消息重新放入发送队列，bots 为 {(渠道, 机器人名称): 机器人}"""
+        entries = self.spool.drain()
+        if not entries:
+            return 0
+        requeued = 0
+        for entry in entries:
+            bot = bots.get((entry["channel"], entry["bot"]))
+            if bot is None:
+                logger.warning(f"{entry['channel']}机器人 {entry['bot']} 已不在配置中，丢弃 1 条待重发消息")
+                continue
+            self.queue_for(entry["channel"], bot).submit(entry["message"], entry["message_type"])
+            requeued += 1
+        logger.info(f"重新投递上次发送失败的通知 {requeued} 条")
+        return requeued
+
+    def stats(self):
+        """返回各机器人队列的深度、发送、重试、落盘和丢弃数"""
+        with self._lock:
+            return {f"{channel}/{bot_name}": outbound.stats() for (channel, bot_name), outbound in self._queues.items()}
+
+    def close(self):
+        """等待所有队列发送完成，并输出统计"""
+        with self._lock:
+            queues, self._queues = self._queues, {}
+        for outbound in queues.values():
+            outbound.close()
+        for (channel, bot_name), outbound in queues.items():
+            stats = outbound.stats()
+            name = f"{channel}/{bot_name}"
+            logger.info(f"通知队列 {name}: 发送 {stats['sent']} 条，重试 {stats['retries']} 次，"
+                        f"落盘 {stats['spooled']} 条，丢弃 {stats['dropped']} 条，剩余 {stats['depth']} 条")
+
+# 全局共享的通知发送队列
+notification_outbox = NotificationOutbox()
+
+def notification_batch_tasks(label, channel, bots, batches):
+    """生成通知发送任务，每个 (机器人, 批次) 一个任务
+
+    batches 为 [[(消息类型, 消息)]]，批次内的消息按顺序进入机器人的发送队列，
+    不同批次由发送队列的多个线程并行发送，共用机器人的每分钟限额。
+    """
+    bots = list(bots)
+    tasks = []
+    for batch in batches:
+        messages = [(message, message_type) for message_type, message in batch if message]
+        if not messages:
+            continue
+        for bot in bots:
+            tasks.append((f"{label}{messages[0][1]}消息 {len(messages)} 条 (机器人: {bot.name})",
+                          partial(notification_outbox.send_all, channel, bot, messages)))
+    return tasks
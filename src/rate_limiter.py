@@ -0,0 +1,146 @@
+import hashlib
+import random
+import threading
+import time
+from huaweicloudsdkcore.exceptions import exceptions
+from src.config import Config
+from src.logger import logger
+
+# 被限流时华为云返回的状态码和错误码
+THROTTLE_STATUS_CODES = {429}
+THROTTLE_ERROR_CODES = {'APIGW.0308'}
+
+class TokenBucket:
+    """令牌桶，rate为每秒补充的令牌数"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate):
+        """调整令牌补充速率"""
+        with self._lock:
+            self._refill_locked()
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self):
+        """获取一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                self._refill_locked()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveRateLimiter:
+    """按 (AK, 接口名) 限流，被限流时降速并带抖动重试，成功后逐步恢复速率"""
+
+    def __init__(self, initial_rate=None, min_rate=None, max_rate=None, max_retries=None, base_delay=None):
+        self.initial_rate = initial_rate or Config.API_RATE_LIMIT
+        self.min_rate = min_rate or Config.API_RATE_LIMIT_MIN
+        self.max_rate = max_rate or Config.API_RATE_LIMIT_MAX
+        self.max_retries = Config.API_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay or Config.API_RETRY_BASE_DELAY
+        self.max_delay = 30
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, ak, api_name):
+        key = (ak, api_name)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = {
+                    "ak_hash": hashlib.sha256(ak.encode('utf-8')).hexdigest()[:8],
+                    "api": api_name,
+                    "bucket": TokenBucket(self.initial_rate),
+                    "calls": 0,
+                    "retries": 0,
+                    "throttled": 0
+                }
+            return state
+
+    @staticmethod
+    def is_throttled(error):
+        """判断异常是否为接口限流"""
+        return error.status_code in THROTTLE_STATUS_CODES or error.error_code in THROTTLE_ERROR_CODES
+
+    def _on_throttled(self, state):
+        # 乘性降速
+        bucket = state["bucket"]
+        with self._lock:
+            state["throttled"] += 1
+            new_rate = max(self.min_rate, bucket.rate / 2)
+        bucket.set_rate(new_rate)
+
+    def _on_success(self, state):
+        # 加性恢复
+        bucket = state["bucket"]
+        with self._lock:
+            state["calls"] += 1
+            if bucket.rate >= self.max_rate:
+                return
+            new_rate = min(self.max_rate, bucket.rate + 0.1)
+        bucket.set_rate(new_rate)
+
+    def call(self, ak, api_name, func, *args, **kwargs):
+        """在限流内调用接口，被限流时按指数退避加抖动重试"""
+        state = self._state(ak, api_name)
+        attempt = 0
+        while True:
+            state["bucket"].acquire()
+            try:
+                result = func(*args, **kwargs)
+            except exceptions.ClientRequestException as e:
+                if not self.is_throttled(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._on_throttled(state)
+                with self._lock:
+                    state["retries"] += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"接口 {api_name} 被限流，{delay:.2f} 秒后第 {attempt} 次重试，当前速率 {state['bucket'].rate:.2f}/秒")
+                time.sleep(delay)
+                continue
+            self._on_success(state)
+            return result
+
+    def stats(self):
+        """返回各 (AK, 接口) 的当前速率和重试统计，AK以哈希前缀表示"""
+        with self._lock:
+            return [
+                {
+                    "ak": state["ak_hash"],
+                    "api": state["api"],
+                    "rate": round(state["bucket"].rate, 2),
+                    "calls": state["calls"],
+                    "retries": state["retries"],
+                    "throttled": state["throttled"]
+                }
+                for state in self._states.values()
+            ]
+
+    def log_stats(self):
+        """输出限流统计到日志"""
+        stats = self.stats()
+        throttled = [item for item in stats if item["throttled"]]
+        logger.info(f"接口限流统计: {len(stats)} 个接口通道，{sum(item['calls'] for item in stats)} 次成功调用，"
+                    f"{sum(item['retries'] for item in stats)} 次重试")
+        for item in throttled:
+            logger.info(f"  AK {item['ak']} {item['api']}: 当前速率 {item['rate']}/秒，限流 {item['throttled']} 次，重试 {item['retries']} 次")
+
+# 所有查询模块共享的限流器
+rate_limiter = AdaptiveRateLimiter()
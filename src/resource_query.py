@@ -1,10 +1,13 @@
-from huaweicloudsdkcore.auth.credentials import GlobalCredentials
-from huaweicloudsdkbss.v2.region.bss_region import BssRegion
 from huaweicloudsdkcore.exceptions import exceptions
 from huaweicloudsdkbss.v2 import *
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from src.config import Config
 from src.logger import logger
+from src.client_registry import client_registry
+from src.api_guard import call_api, check_deadline, DeadlineExceeded
+from src.circuit_breaker import CircuitOpenError
 import json
 
 def calculate_remaining_days(expire_time):
@@ -19,40 +22,78 @@ def calculate_remaining_days(expire_time):
     remaining_days = (expire_date - today).days
     return remaining_days
 
-def query_resources(ak, sk, account_name):
-    """查询华为云账号下的资源信息"""
+def _fetch_resource_page(ak, account_name, client, offset, limit):
+    """查询一页有效资源"""
+    request = ListPayPerUseCustomerResourcesRequest()
+    request.body = QueryResourcesReq(
+        offset=offset,
+        limit=limit,
+        status_list=[2],  # 仅查询有效资源
+        only_main_resource=1
+    )
+    return call_api(ak, account_name, 'list_pay_per_use_customer_resources', client.list_pay_per_use_customer_resources, request)
+
+def _normalize_resource(resource):
+    """将SDK资源对象转换为统一的资源字典"""
+    return {
+        "name": resource.resource_name or "未命名",
+        "id": resource.resource_id,
+        "service_type": resource.service_type_name,
+        "project": resource.enterprise_project.name if resource.enterprise_project else "无项目",
+        "region": resource.region_code,
+        "expire_time": resource.expire_time,
+        "remaining_days": calculate_remaining_days(resource.expire_time)
+    }
+
+def iter_resource_batches(ak, sk, account_name, page_size=None, deadline=None):
+    """逐页获取账号下的资源，处理当前页时预取下一页，每次返回一页资源
+
+    deadline 为运行截止时间（time.monotonic()），超过后不再请求后续分页，抛出 DeadlineExceeded。
+    """
+    page_size = page_size or Config.RESOURCE_PAGE_SIZE
+    client = client_registry.get_bss_client(ak, sk)
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resource-prefetch")
     try:
-        # 使用AK/SK创建认证凭证
-        credentials = GlobalCredentials(ak, sk)
-        client = BssClient.new_builder() \
-            .with_credentials(credentials) \
-            .with_region(BssRegion.value_of("cn-north-1")) \
-            .build()
+        offset = 0
+        page_count = 0
+        future = executor.submit(_fetch_resource_page, ak, account_name, client, offset, page_size)
+        while future is not None:
+            response = future.result()
+            page = response.data or []
+            page_count += 1
+            offset += len(page)
 
-        # 创建请求对象并发送请求
-        request = ListPayPerUseCustomerResourcesRequest()
-        request.body = QueryResourcesReq(
-            limit=100,
-            status_list=[2],  # 仅查询有效资源
-            only_main_resource=1
-        )
-        response = client.list_pay_per_use_customer_resources(request)
-        
+            # 还有下一页时先发起请求，与当前页的处理并行
+            has_more = len(page) == page_size and (response.total_count is None or offset < response.total_count)
+            if has_more:
+                check_deadline(deadline)
+            future = executor.submit(_fetch_resource_page, ak, account_name, client, offset, page_size) if has_more else None
+
+            logger.debug(f"账号 {account_name} 资源第 {page_count} 页获取完成: {len(page)} 条")
+            yield [_normalize_resource(resource) for resource in page]
+    finally:
+        # 超过截止时间或提前结束时不等待已发起的预取
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def query_resources(ak, sk, account_name, resource_sink=None, deadline=None):
+    """查询华为云账号下的资源信息
+
+    指定 resource_sink 时每页资源交给 resource_sink(resources) 处理（如写入数据库），
+    返回结果中只保留到期提醒范围（RESOURCE_ALERT_DAYS）内的资源，内存占用不随账号资源总数增长；
+    否则返回全部资源。结果按服务类型分组。
+    """
+    try:
         # 按服务类型分组资源
         services = defaultdict(list)
         resource_count = 0
-        for resource in response.data:
-            resource_count += 1
-            resource_info = {
-                "name": resource.resource_name or "未命名",
-                "id": resource.resource_id,
-                "service_type": resource.service_type_name,
-                "project": resource.enterprise_project.name if resource.enterprise_project else "无项目",
-                "region": resource.region_code,
-                "expire_time": resource.expire_time,
-                "remaining_days": calculate_remaining_days(resource.expire_time)
-            }
-            services[resource.service_type_name].append(resource_info)
+        for batch in iter_resource_batches(ak, sk, account_name, deadline=deadline):
+            resource_count += len(batch)
+            if resource_sink:
+                resource_sink(batch)
+                batch = [resource for resource in batch if resource["remaining_days"] <= Config.RESOURCE_ALERT_DAYS]
+            for resource_info in batch:
+                services[resource_info["service_type"]].append(resource_info)
         
         logger.info(f"账号 {account_name} 资源查询成功，共 {resource_count} 个资源，{len(services)} 种服务")
         
@@ -60,7 +101,9 @@ def query_resources(ak, sk, account_name):
         return {
             "success": True,
             "data": services,
-            "error": None
+            "error": None,
+            # 全部资源已在查询过程中交给 resource_sink
+            "streamed": resource_sink is not None
         }
                 
     except exceptions.ClientRequestException as e:
@@ -76,6 +119,8 @@ def query_resources(ak, sk, account_name):
                 "error_msg": e.error_msg
             }
         }
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
     except Exception as e:
         error_msg = f"账号 {account_name} 资源查询发生未知错误: {str(e)}"
         logger.error(error_msg)
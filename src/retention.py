@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta
+from src.config import Config
+from src.logger import logger
+
+# 按月分区的历史表及其分区列，账单表按账单周期分区
+PARTITIONED_TABLES = {
+    'resources': 'created_at',
+    'account_balances': 'created_at',
+    'stored_cards': 'created_at',
+    'account_bills': 'cycle'
+}
+
+# 删除分区前把分区数据汇总到日/月汇总表，重复执行结果不变
+ROLLUP_SQL = {
+    'resources': """INSERT INTO daily_account_rollups
+                    (account_name, day, resource_changes, min_remaining_days)
+                    SELECT account_name, DATE(created_at), COUNT(DISTINCT resource_id), MIN(remaining_days)
+                    FROM resources PARTITION ({partition})
+                    GROUP BY account_name, DATE(created_at)
+                    ON DUPLICATE KEY UPDATE
+                    resource_changes = VALUES(resource_changes), min_remaining_days = VALUES(min_remaining_days)""",
+    'account_balances': """INSERT INTO daily_account_rollups
+                    (account_name, day, run_count, balance_min, balance_max, balance_avg)
+                    SELECT account_name, DATE(created_at), COUNT(DISTINCT run_id),
+                    MIN(total_amount), MAX(total_amount), AVG(total_amount)
+                    FROM account_balances PARTITION ({partition})
+                    GROUP BY account_name, DATE(created_at)
+                    ON DUPLICATE KEY UPDATE
+                    run_count = VALUES(run_count), balance_min = VALUES(balance_min),
+                    balance_max = VALUES(balance_max), balance_avg = VALUES(balance_avg)""",
+    'stored_cards': """INSERT INTO daily_account_rollups
+                    (account_name, day, stored_card_changes, stored_card_balance_min)
+                    SELECT account_name, DATE(created_at), COUNT(DISTINCT card_id), MIN(balance)
+                    FROM stored_cards PARTITION ({partition})
+                    GROUP BY account_name, DATE(created_at)
+                    ON DUPLICATE KEY UPDATE
+                    stored_card_changes = VALUES(stored_card_changes),
+                    stored_card_balance_min = VALUES(stored_card_balance_min)""",
+    'account_bills': """INSERT INTO monthly_bill_rollups
+                    (account_name, cycle, project_name, service_type, amount, line_count, currency)
+                    SELECT account_name, cycle, project_name, service_type, SUM(amount), COUNT(*), MAX(currency)
+                    FROM account_bills PARTITION ({partition})
+                    GROUP BY account_name, cycle, project_name, service_type
+                    ON DUPLICATE KEY UPDATE
+                    amount = VALUES(amount), line_count = VALUES(line_count), currency = VALUES(currency)"""
+}
+
+def _shift_month(year, month, months):
+    """返回 (year, month) 之后第 months 个月"""
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+def _partition_name(year, month):
+    return f"p{year:04d}{month:02d}"
+
+def _partition_bound(column, year, month):
+    """月分区的上界，即下个月的起点"""
+    next_year, next_month = _shift_month(year, month, 1)
+    if column == 'cycle':
+        return f"('{next_year:04d}-{next_month:02d}')"
+    return f"(UNIX_TIMESTAMP('{next_year:04d}-{next_month:02d}-01 00:00:00'))"
+
+def _partitions(cursor, table):
+    """返回表的分区名列表，未分区的表返回空列表"""
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (Config.DB_NAME, table)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _monthly_partitions(partitions):
+    """从分区名中解析月份分区 [(year, month)]"""
+    return [(int(name[1:5]), int(name[5:7])) for name in partitions if name != 'p_future']
+
+def _earliest_month(cursor, table, column):
+    """表中最早数据所在的月份，空表返回None"""
+    cursor.execute(f"SELECT MIN({column}) FROM {table}")
+    value = cursor.fetchone()[0]
+    if value is None:
+        return None
+    if column == 'cycle':
+        return int(value[:4]), int(value[5:7])
+    return value.year, value.month
+
+def ensure_partitions(db, months_ahead=None):
+    """从 p_future 中拆分出直到未来若干个月的月分区"""
+    if not db.backend.supports_partitions:
+        logger.info(f"{db.backend.name} 存储不支持分区，跳过分区维护")
+        return
+
+    months_ahead = Config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    now = datetime.now()
+    current_month = (now.year, now.month)
+    last_month = _shift_month(now.year, now.month, months_ahead)
+
+    connection = db.get_connection()
+    cursor = connection.cursor()
+    try:
+        for table, column in PARTITIONED_TABLES.items():
+            partitions = _partitions(cursor, table)
+            if 'p_future' not in partitions:
+                logger.warning(f"表 {table} 未按月分区，跳过分区维护")
+                continue
+
+            existing = _monthly_partitions(partitions)
+            if existing:
+                month = _shift_month(*existing[-1], 1)
+            else:
+                # 首次拆分时从已有数据的最早月份开始
+                month = min(_earliest_month(cursor, table, column) or current_month, current_month)
+
+            new_months = []
+            while month <= last_month:
+                new_months.append(month)
+                month = _shift_month(*month, 1)
+            if not new_months:
+                continue
+
+            definitions = ", ".join(
+                f"PARTITION {_partition_name(year, month)} VALUES LESS THAN {_partition_bound(column, year, month)}"
+                for year, month in new_months
+            )
+            maxvalue = "(MAXVALUE)" if column == 'cycle' else "MAXVALUE"
+            cursor.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION p_future INTO "
+                f"({definitions}, PARTITION p_future VALUES LESS THAN {maxvalue})"
+            )
+            logger.info(f"表 {table} 新增分区: {', '.join(_partition_name(*month) for month in new_months)}")
+    finally:
+        cursor.close()
+        connection.close()
+
+def apply_retention(db, retention_days=None, bill_retention_months=None):
+    """将整月过期的分区汇总到日/月汇总表后删除分区，返回删除的分区列表
+
+    资源、余额、储值卡历史按 retention_days 保留，汇总到 daily_account_rollups；
+    账单按账单周期保留 bill_retention_months 个月，汇总到 monthly_bill_rollups。
+    """
+    if not db.backend.supports_partitions:
+        logger.info(f"{db.backend.name} 存储不支持分区，跳过数据保留任务")
+        return []
+
+    retention_days = Config.DATA_RETENTION_DAYS if retention_days is None else retention_days
+    bill_retention_months = Config.BILL_RETENTION_MONTHS if bill_retention_months is None else bill_retention_months
+    now = datetime.now()
+    cutoff_date = now - timedelta(days=retention_days)
+    cutoffs = {
+        'created_at': (cutoff_date.year, cutoff_date.month) if retention_days > 0 else None,
+        'cycle': _shift_month(now.year, now.month, -bill_retention_months) if bill_retention_months > 0 else None
+    }
+
+    dropped = []
+    connection = db.get_connection()
+    cursor = connection.cursor()
+    try:
+        for table, column in PARTITIONED_TABLES.items():
+            cutoff = cutoffs[column]
+            if cutoff is None:
+                continue
+            for year, month in _monthly_partitions(_partitions(cursor, table)):
+                if (year, month) >= cutoff:
+                    break
+                partition = _partition_name(year, month)
+                cursor.execute(ROLLUP_SQL[table].format(partition=partition))
+                connection.commit()
+                cursor.execute(f"ALTER TABLE {table} DROP PARTITION {partition}")
+                dropped.append(f"{table}.{partition}")
+                logger.info(f"表 {table} 分区 {partition} 已汇总并删除")
+    except Exception as e:
+        connection.rollback()
+        logger.error(f"数据保留任务失败: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+    logger.info(f"数据保留任务完成，删除 {len(dropped)} 个分区")
+    return dropped
@@ -1,6 +1,17 @@
 from datetime import datetime
+from src.config import Config
+
+# SSL证书与资源一起保存在资源表中，由证书查询单独获取
+CERTIFICATE_SERVICE_TYPE = 'SSL证书'
 
 def calculate_remaining_days(expire_time):
     expire_date = datetime.strptime(expire_time.split('T')[0], '%Y-%m-%d')
     remaining_days = (expire_date - datetime.now()).days
-    return remaining_days 
\ No newline at end of file
+    return remaining_days 
+
+def remaining_days_bucket(remaining_days, buckets=None):
+    """返回剩余天数所在的告警档位（不小于剩余天数的最小档位），超出所有档位时返回None"""
+    for bucket in sorted(buckets or Config.REMAINING_DAYS_BUCKETS):
+        if remaining_days <= bucket:
+            return bucket
+    return None
@@ -1,14 +1,16 @@
-import os
-import requests
 from src.config import Config
 from src.logger import logger
-from datetime import datetime
+from src.http_session import webhook_sessions
+from src.notification_queue import notification_batch_tasks
+from src.message_packer import split_message, join_section, split_section, pack_section_batches
 
 class YunzhijiaBot:
-    def __init__(self, name, webhook_url=None, enabled=True):
+    def __init__(self, name, webhook_url=None, enabled=True, rate_per_minute=None):
         self.name = name
         self.webhook_url = webhook_url
         self.enabled = enabled
+        # 云之家机器人每分钟最多发送的消息数
+        self.rate_per_minute = rate_per_minute or Config.YUNZHIJIA_RATE_LIMIT
 
     def send_message(self, message, message_type='通知'):
         """发送消息到云之家机器人"""
@@ -21,7 +23,7 @@ class YunzhijiaBot:
                 "content": message
             }
             
-            response = requests.post(
+            response = webhook_sessions.post(
                 self.webhook_url,
                 json=payload
             )
@@ -37,11 +39,12 @@ class YunzhijiaBot:
             return False
 
 class YunzhijiaNotification:
+    channel = '云之家'
+
     def __init__(self):
         self.enabled = Config.YUNZHIJIA_ENABLED
         self.send_to_all = Config.YUNZHIJIA_SEND_TO_ALL
         self.default_bot = Config.YUNZHIJIA_DEFAULT_BOT
-        self.alert_days = Config.RESOURCE_ALERT_DAYS
         
         # 初始化机器人
         self.bots = {}
@@ -62,141 +65,136 @@ class YunzhijiaNotification:
             logger.warning("没有可用的云之家机器人")
             return False
 
-        # 确定要使用的机器人
-        if bot_name and bot_name in self.bots:
-            bots_to_use = [self.bots[bot_name]]
-        elif self.send_to_all:
-            bots_to_use = list(self.bots.values())
-        elif self.default_bot in self.bots:
-            bots_to_use = [self.bots[self.default_bot]]
-        else:
-            bots_to_use = [next(iter(self.bots.values()))]
-
         success = False
-        for bot in bots_to_use:
+        for bot in self._select_bots(bot_name):
             if bot.send_message(message):
                 success = True
 
         return success
 
-    def format_balance_message(self, accounts_data):
-        """格式化所有账号的余额信息为文本消息"""
+    def _select_bots(self, bot_name=None):
+        """确定要使用的机器人"""
+        if bot_name and bot_name in self.bots:
+            return [self.bots[bot_name]]
+        if self.send_to_all:
+            return list(self.bots.values())
+        if self.default_bot in self.bots:
+            return [self.bots[self.default_bot]]
+        return [next(iter(self.bots.values()))]
+
+    def format_balance_message(self, report):
+        """格式化所有账号的余额信息为文本消息，report 由 alert_view.build_report 生成"""
         message = ["华为云账户余额汇总"]
         
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            balance = account_data.get('balance')
-            stored_cards = account_data.get('stored_cards')
+        for account in report['accounts']:
+            balance = account['balance']
+            stored_cards = account['stored_cards']
             
             if balance or stored_cards:
                 message.extend([
                     "",
-                    f"======= {account_name} ======="
+                    f"======= {account['account_name']} ======="
                 ])
                 if balance:
                     message.append(f"现金余额: {balance['total_amount']} {balance['currency']}")
                 
-                if stored_cards and stored_cards.get('cards'):
-                    for card in stored_cards['cards']:
-                        message.append(f"- {card['card_name']}")
-                        message.append(f"  余额: {card['balance']} CNY")
-                        message.append(f"  面值: {card['face_value']} CNY")
-                        message.append(f"  有效期至: {card['expire_time'].replace('T', ' ').replace('Z', '')}")
+                for card in stored_cards:
+                    message.append(f"- {card['card_name']}")
+                    message.append(f"  余额: {card['balance']} CNY")
+                    message.append(f"  面值: {card['face_value']} CNY")
+                    message.append(f"  有效期至: {card['expire_display']}")
         
         return "\n".join(message)
 
-    def format_resource_message(self, account_name, services):
-        """格式化单个账号的资源信息为文本消息"""
-        message = [f"华为云 {account_name} 资源到期提醒"]
-        
-        has_alert = False
-        first_service = True
-        for service_type, resources in services.items():
-            service_resources = []
+    def format_resource_message(self, account):
+        """格式化单个账号的到期资源为文本消息，没有需提醒的资源时返回None"""
+        if not account['services']:
+            return None
+        return join_section(*self._resource_groups(account))
+
+    def resource_message_parts(self, account, max_bytes):
+        """单个账号的到期资源按资源边界拆为不超过 max_bytes 的消息，每部分都带账号和服务类型标题"""
+        if not account['services']:
+            return []
+        return split_section(*self._resource_groups(account), max_bytes)
+
+    def _resource_groups(self, account):
+        """账号标题及按服务类型分组的资源条目，资源之间以空行分隔"""
+        heading = f"华为云 {account['account_name']} 资源到期提醒\n"
+        groups = []
+        for service_type, resources in account['services']:
+            items = []
             for resource in resources:
-                remaining_days = resource['remaining_days']
+                resource_info = [
+                    f"名称: {resource['name']}",
+                    f"区域: {resource['region']}",
+                    f"到期时间: {resource['expire_display']}",
+                    f"剩余天数: {resource['remaining_days']}天"
+                ]
                 
-                if remaining_days <= self.alert_days:
-                    has_alert = True
-                    if not service_resources:  # 只在该服务类型的第一个资源前添加标题
-                        if first_service:
-                            service_resources.append(f"\n======= {service_type} =======")
-                            first_service = False
-                        else:
-                            service_resources.append(f"======= {service_type} =======")
-                    
-                    expire_time = resource['expire_time'].replace('T', ' ').replace('Z', '')
-                    resource_info = [
-                        f"名称: {resource['name']}",
-                        f"区域: {resource['region']}",
-                        f"到期时间: {expire_time}",
-                        f"剩余天数: {remaining_days}天"
-                    ]
-                    
-                    if resource['project'] and resource['project'] != '无项目':
-                        resource_info.append(f"企业项目: {resource['project']}")
-                    
-                    service_resources.append("\n".join(resource_info))
-            
-            if service_resources:
-                message.extend(service_resources)
-                if service_type != list(services.keys())[-1]:  # 如果不是最后一个服务类型，添加空行
-                    message.append("")
-        
-        if not has_alert:
-            return None
-        
-        return "\n".join(message).rstrip()  # 移除最后的空行
+                if resource['project'] and resource['project'] != '无项目':
+                    resource_info.append(f"企业项目: {resource['project']}")
+                
+                items.append("\n".join(resource_info))
+            groups.append((f"======= {service_type} =======", items))
+        return heading, groups
 
-    def send_balance_notification(self, accounts_data):
+    def send_balance_notification(self, report):
         """发送汇总的余额信息通知"""
-        balance_message = self.format_balance_message(accounts_data)
-        if balance_message:
-            self.send_message(balance_message)  # 只发送一条汇总消息
+        for balance_message in split_message(self.format_balance_message(report), Config.YUNZHIJIA_MAX_BYTES):
+            self.send_message(balance_message)  # 汇总消息，超长时分段发送
 
-    def send_resource_notification(self, account_name, resources):
+    def send_resource_notification(self, account):
         """每个账号单独发送资源信息通知"""
-        resource_message = self.format_resource_message(account_name, resources)
-        if resource_message:
-            self.send_message(resource_message)  # 每个账号发送一条消息
+        for part in self.resource_message_parts(account, Config.YUNZHIJIA_MAX_BYTES):
+            self.send_message(part)  # 每个账号发送一条消息，超长时按资源边界分段发送
 
-    def format_bill_message(self, accounts_data):
+    def format_bill_message(self, report):
         """格式化所有账号的账单信息为文本消息"""
         message = ["华为云按需计费账单汇总"]
         
-        for account_data in accounts_data:
-            account_name = account_data['account_name']
-            bills = account_data.get('bills')
-            if bills and bills.get('records'):
+        for account in report['accounts']:
+            bill = account['bill']
+            if bill:
                 message.extend([
                     "",
-                    f"======= {account_name} =======",
-                    f"总金额: {bills['total_amount']} {bills['currency']}"
+                    f"======= {account['account_name']} =======",
+                    f"总金额: {bill['total_amount']} {bill['currency']}"
                 ])
                 
-                # 按项目分组展示
-                projects = {}
-                for record in bills['records']:
-                    project = record['project_name'] or 'default'
-                    if project not in projects:
-                        projects[project] = []
-                    projects[project].append(record)
-                
-                for project, records in projects.items():
+                for project, records in bill['projects']:
                     message.append(f"\n项目: {project}")
                     for record in records:
                         record_info = [
                             f"服务类型: {record['service_type']}",
                             f"区域: {record['region']}",
-                            f"金额: {record['amount']} {bills['currency']}"
+                            f"金额: {record['amount']} {bill['currency']}"
                         ]
                         message.append("\n".join(record_info))
                     message.append("")  # 添加空行分隔不同项目
         
         return "\n".join(message).rstrip()
 
-    def send_bill_notification(self, accounts_data):
+    def send_bill_notification(self, report):
         """发送账单信息通知"""
-        bill_message = self.format_bill_message(accounts_data)
-        if bill_message:
-            self.send_message(bill_message) 
\ No newline at end of file
+        for bill_message in split_message(self.format_bill_message(report), Config.YUNZHIJIA_MAX_BYTES):
+            self.send_message(bill_message)
+
+    def notification_tasks(self, report):
+        """生成余额、账单和资源通知的发送任务，每个任务按顺序向一个机器人发送一批消息
+
+        超长消息在段落边界处拆分，各账号的资源提醒合并到尽量少的消息中。
+        余额、账单和各账号的资源提醒分别成批，不同批次并行发送。
+        """
+        if not self.bots:
+            logger.warning("没有可用的云之家机器人")
+            return []
+
+        max_bytes = Config.YUNZHIJIA_MAX_BYTES
+        resource_sections = [self.resource_message_parts(account, max_bytes) for account in report['accounts']]
+        batches = (
+            [[('余额', message) for message in split_message(self.format_balance_message(report), max_bytes)],
+             [('账单', message) for message in split_message(self.format_bill_message(report), max_bytes)]] +
+            [[('资源', message) for message in batch] for batch in pack_section_batches(resource_sections, max_bytes)]
+        )
+        return notification_batch_tasks('云之家', self.channel, self._select_bots(), batches)
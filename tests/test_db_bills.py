@@ -0,0 +1,120 @@
+import os
+import sqlite3
+from decimal import Decimal
+import pytest
+from src.db import Database, bill_line_key
+from src.db_backends import SQLiteBackend
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _record(amount, resource_id='r1'):
+    return {
+        "project_name": "default",
+        "service_type": "云服务器",
+        "region": "cn-north-4",
+        "resource_id": resource_id,
+        "resource_name": f"ecs-{resource_id}",
+        "amount": amount,
+        "currency": "CNY"
+    }
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # 表结构文件按仓库根目录的相对路径读取
+    monkeypatch.chdir(ROOT_DIR)
+    database = Database(SQLiteBackend(str(tmp_path / 'test.db')))
+    database.path = str(tmp_path / 'test.db')
+    yield database
+    database.backend.close()
+
+def _bills(db):
+    with sqlite3.connect(db.path) as connection:
+        return dict(connection.execute("SELECT line_key, amount FROM account_bills"))
+
+def _changes(db, batch_number):
+    with sqlite3.connect(db.path) as connection:
+        return connection.execute(
+            "SELECT line_key, old_amount, new_amount FROM account_bill_changes WHERE run_id = ?",
+            (db.get_run_id(batch_number),)
+        ).fetchall()
+
+def _pending_count(db):
+    with sqlite3.connect(db.path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM account_bills_pending").fetchone()[0]
+
+def test_commit_staged_bills_accumulates_within_same_run(db):
+    """同一次运行已写入的账单行，合并暂存行时累加"""
+    db.start_run('20260101000000')
+    db.save_bills_bulk('a', [_record(1.5)], '2026-01', '20260101000000')
+    db.stage_bills_bulk('a', [_record(2.0)], '2026-01', '20260101000000')
+    db.stage_bills_bulk('a', [_record(0.5)], '2026-01', '20260101000000')
+
+    result = db.commit_staged_bills('a', '2026-01', '20260101000000')
+
+    line_key = bill_line_key(_record(0))
+    assert result == {"saved": 1, "errors": []}
+    assert _bills(db) == {line_key: 4.0}
+    assert _changes(db, '20260101000000') == [(line_key, None, 4.0)]
+    assert _pending_count(db) == 0
+
+def test_commit_staged_bills_replaces_previous_run(db):
+    """新的运行合并暂存行时覆盖上次的金额，金额未变化的账单行不记录变化"""
+    db.start_run('20260101000000')
+    db.save_bills_bulk('a', [_record(3.0), _record(1.0, 'r2')], '2026-01', '20260101000000')
+
+    db.start_run('20260102000000')
+    db.stage_bills_bulk('a', [_record(2.0), _record(1.0, 'r2')], '2026-01', '20260102000000')
+    db.stage_bills_bulk('a', [_record(2.0)], '2026-01', '20260102000000')
+    db.commit_staged_bills('a', '2026-01', '20260102000000')
+
+    line_key = bill_line_key(_record(0))
+    assert _bills(db) == {line_key: 4.0, bill_line_key(_record(0, 'r2')): 1.0}
+    assert _changes(db, '20260102000000') == [(line_key, 3.0, 4.0)]
+
+def test_discard_staged_bills_keeps_previous_amounts(db):
+    """账单查询失败时丢弃暂存行，账单表保留上次完整的金额"""
+    db.start_run('20260101000000')
+    db.save_bills_bulk('a', [_record(3.0)], '2026-01', '20260101000000')
+
+    db.start_run('20260102000000')
+    db.stage_bills_bulk('a', [_record(1.0)], '2026-01', '20260102000000')
+    db.discard_staged_bills('a', '20260102000000')
+
+    assert _bills(db) == {bill_line_key(_record(0)): 3.0}
+    assert _pending_count(db) == 0
+
+class _DecimalCursor:
+    """模拟 MySQL 游标：读出的金额为 Decimal"""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchall(self):
+        return self.existing
+
+    def executemany(self, sql, rows):
+        self.executed.append((sql, rows))
+
+@pytest.mark.parametrize("previous_run, expected_changes", [
+    (7, [(2.0, 4.0)]),  # 同一次运行累加为 4.00
+    (6, []),  # 新的运行金额未变化，不记录变化
+])
+def test_upsert_bill_lines_handles_decimal_amounts(db, previous_run, expected_changes):
+    """暂存表读出的 Decimal 金额与已有金额按同一类型累加和比较"""
+    line_key = bill_line_key(_record(0))
+    row = db._bill_values('a', _record(Decimal('2.00')), '2026-01', 7)
+    cursor = _DecimalCursor([(line_key, Decimal('2.00'), previous_run)])
+
+    changed = db._upsert_bill_lines(cursor, 'a', '2026-01', 7, [row])
+
+    changes = [
+        (change[7], change[8])
+        for sql, rows in cursor.executed if 'account_bill_changes' in sql
+        for change in rows
+    ]
+    assert changed == len(expected_changes)
+    assert changes == expected_changes
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import pytest
+from src.db import Database
+from src.db_backends import SQLiteBackend
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _resource(resource_id, service_type='云服务器'):
+    return {
+        "name": f"res-{resource_id}",
+        "id": resource_id,
+        "service_type": service_type,
+        "region": "cn-north-4",
+        "expire_time": "2026-12-31T00:00:00Z",
+        "project": "default",
+        "remaining_days": 40
+    }
+
+def _card(card_id):
+    return {
+        "card_id": card_id,
+        "card_name": f"card-{card_id}",
+        "face_value": 100.0,
+        "balance": 50.0,
+        "effective_time": "2026-01-01T00:00:00Z",
+        "expire_time": "2026-12-31T00:00:00Z"
+    }
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # 表结构文件按仓库根目录的相对路径读取
+    monkeypatch.chdir(ROOT_DIR)
+    database = Database(SQLiteBackend(str(tmp_path / 'test.db')))
+    database.path = str(tmp_path / 'test.db')
+    yield database
+    database.backend.close()
+
+def _ids(db, sql):
+    with sqlite3.connect(db.path) as connection:
+        return sorted(row[0] for row in connection.execute(sql))
+
+def test_prune_resources_current_removes_released_resources(db):
+    """查询成功后删除本次运行未再出现的资源，SSL证书由证书查询单独清理"""
+    db.start_run('20260101000000')
+    db.save_resources_bulk('a', [_resource('r1'), _resource('r2'), _resource('c1', 'SSL证书')], '20260101000000')
+    db.save_resources_bulk('b', [_resource('r3')], '20260101000000')
+
+    db.start_run('20260102000000')
+    db.save_resources_bulk('a', [_resource('r1')], '20260102000000')
+    db.prune_resources_current('a', '20260102000000')
+
+    assert _ids(db, "SELECT resource_id FROM resources_current") == ['c1', 'r1', 'r3']
+
+    db.prune_resources_current('a', '20260102000000', certificates=True)
+    assert _ids(db, "SELECT resource_id FROM resources_current") == ['r1', 'r3']
+
+def test_prune_stored_cards_current_removes_missing_cards(db):
+    """查询成功后删除本次运行未再出现的储值卡，其它账号不受影响"""
+    db.start_run('20260101000000')
+    db.save_stored_cards_bulk('a', [_card('k1'), _card('k2')], '20260101000000')
+    db.save_stored_cards_bulk('b', [_card('k3')], '20260101000000')
+
+    db.start_run('20260102000000')
+    db.save_stored_cards_bulk('a', [_card('k2')], '20260102000000')
+    db.prune_stored_cards_current('a', '20260102000000')
+
+    assert _ids(db, "SELECT card_id FROM stored_cards_current") == ['k2', 'k3']